@@ -0,0 +1,575 @@
+# batch_api.py
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs
+
+from credentials import load_api_key
+from failures import CANCELLED, RETRY_BACKOFF_SECONDS, retries_allowed
+from listing_schema import ListingRecord
+from results_db import ResultsDatabase
+from results_store import normalize_records
+from structured_logging import configure_logging, process_log_file
+from url_canonical import ListingDeduplicator
+from url_ingest import IngestReport, validate_urls
+from worker_pools import WORKER_MODE, close_thread_drivers, make_worker_pool, max_in_flight
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+API_HOST = os.environ.get("LISTINGLENS_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("LISTINGLENS_API_PORT", "8502"))
+# "client=key" or "client=key=daily_quota" entries, comma separated. Unset: no auth, one shared "default" client.
+API_KEYS = os.environ.get("LISTINGLENS_API_KEYS", "")
+API_DAILY_QUOTA = int(os.environ.get("LISTINGLENS_API_DAILY_QUOTA", "10000"))  # Unique listings per client per rolling 24h
+# The API only shares browsers, AI cache and near-duplicate index with the Streamlit page through the queue backend
+# (LISTINGLENS_WORKER_MODE=queue for both). Thread/process modes build a second, private pool, so they need this opt-in
+# and are only for hosts where the API runs without the UI.
+API_STANDALONE = os.environ.get("LISTINGLENS_API_STANDALONE", "0") == "1"
+API_MAX_ACTIVE_BATCHES = int(os.environ.get("LISTINGLENS_API_MAX_ACTIVE_BATCHES", "20"))  # Running batches per client
+QUOTA_WINDOW_SECONDS = 24 * 3600
+BATCH_MAX_URLS = 50000
+REQUEST_MAX_BYTES = 16 * 1024 * 1024
+BATCH_RETENTION_SECONDS = 3600  # Finished batches (and their results) stay readable this long
+STREAM_KEEPALIVE_SECONDS = 15
+DISPATCH_IDLE_SECONDS = 1.0
+
+
+def _parse_api_keys(spec):
+    clients = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, key, *quota = entry.split("=")
+        clients[key] = (name, int(quota[0]) if quota else API_DAILY_QUOTA)
+    return clients
+
+
+API_CLIENTS = _parse_api_keys(API_KEYS)
+
+
+def _cancelled_by_client(url):
+    return ListingRecord.failed(url, "Cancelled by the client.", CANCELLED)
+
+
+def _iso(timestamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp)) if timestamp else None
+
+
+class ClientQuotas:
+    """Unique listings accepted per client over a rolling QUOTA_WINDOW_SECONDS window (kept in memory)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage = collections.defaultdict(collections.deque)  # client -> (timestamp, count)
+
+    def _used(self, client, now):
+        usage = self._usage[client]
+        while usage and usage[0][0] <= now - QUOTA_WINDOW_SECONDS:
+            usage.popleft()
+        return sum(count for _, count in usage)
+
+    def reserve(self, client, limit, count):
+        """Returns (accepted, remaining, retry_after_seconds)."""
+        now = time.time()
+        with self._lock:
+            used = self._used(client, now)
+            if used + count > limit:
+                usage = self._usage[client]
+                retry_after = int(usage[0][0] + QUOTA_WINDOW_SECONDS - now) + 1 if usage else QUOTA_WINDOW_SECONDS
+                return False, limit - used, retry_after
+            self._usage[client].append((now, count))
+            return True, limit - used - count, 0
+
+    def remaining(self, client, limit):
+        with self._lock:
+            return limit - self._used(client, time.time())
+
+
+class Batch:
+    """One submitted list of URLs: its queue of listings still to run and the results in completion order."""
+
+    def __init__(self, client, loop):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.created = time.time()
+        self.finished = None
+        self.state = "running"
+        self.deduplicator = ListingDeduplicator()
+        self.ingest_report = IngestReport()
+        self.pending = collections.deque()  # (key, attempt, not_before) still to submit; retries go to the back
+        self.in_flight = set()
+        self.listings = 0
+        self.unresolved = 0
+        self.retried_keys = set()
+        self.cancel_event = threading.Event()
+        self.results = []  # normalized result rows; a row's index + 1 is its SSE event id
+        self.succeeded = 0
+        self._loop = loop
+        self._waiters = []
+
+    def admit(self, urls):
+        for url in validate_urls(urls, self.ingest_report):
+            key = self.deduplicator.admit(url)
+            if key is not None:
+                self.pending.append((key, 0, 0.0))
+                self.listings += 1
+                self.unresolved += 1
+
+    def status(self):
+        return {
+            "batch_id": self.id,
+            "client": self.client,
+            "state": self.state,
+            "created": _iso(self.created),
+            "finished": _iso(self.finished),
+            "inputs": self.ingest_report.valid_count,
+            "unique_listings": self.listings,
+            "duplicates": self.deduplicator.duplicate_count,
+            "invalid": self.ingest_report.invalid_count,
+            "completed": len(self.results),
+            "succeeded": self.succeeded,
+            "failed": len(self.results) - self.succeeded,
+            "pending": self.ingest_report.valid_count - len(self.results),
+            "retried": len(self.retried_keys),
+        }
+
+    def wake(self):
+        """Runs on the event loop: releases every stream waiting for new results."""
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def notify(self):
+        """Thread-safe: schedules wake() on the event loop."""
+        try:
+            self._loop.call_soon_threadsafe(self.wake)
+        except RuntimeError:
+            pass  # Loop already closed during shutdown
+
+    async def wait(self, seen, timeout, disconnected):
+        """Waits for more than `seen` results, the end of the batch or the client leaving; False if `timeout` passed first."""
+        if len(self.results) > seen or self.finished:
+            return True
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        done, _ = await asyncio.wait([waiter, disconnected], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        return bool(done)
+
+
+class BatchService:
+    """Runs every API batch on one worker pool built exactly like the Streamlit page's.
+
+    In queue mode that pool is the page's own queue workers; other modes need LISTINGLENS_API_STANDALONE.
+    A dispatcher thread keeps at most `max_in_flight` listings submitted, taking one from each batch in
+    turn so a huge batch can't starve small ones. Transient failures go back to the end of their batch
+    and are retried after the same backoff as in the UI.
+    """
+
+    def __init__(self, pipeline, api_key, loop):
+        self.pipeline = pipeline
+        self.loop = loop
+        self.window = max_in_flight(pipeline.MAX_CONCURRENT_WORKERS)
+        self.executor = make_worker_pool(pipeline.MAX_CONCURRENT_WORKERS, api_key)
+        self.results_db = ResultsDatabase()
+        self.quotas = ClientQuotas()
+        self.batches = {}
+        self._rotation = collections.deque()  # IDs of batches with listings still to submit
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="api-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    # --- Submission ---
+    def submit(self, client, quota, urls):
+        """Queues a batch; returns (batch, None) or (None, (http_status, error_body, headers))."""
+        batch = Batch(client, self.loop)
+        batch.admit(urls)
+        if not batch.unresolved:
+            return None, (400, {"error": "No valid http(s) URLs in the request.", "invalid": batch.ingest_report.summary()}, [])
+        with self._condition:
+            self._evict_expired()
+            active = sum(1 for other in self.batches.values() if other.client == client and other.state == "running")
+            if active >= API_MAX_ACTIVE_BATCHES:
+                return None, (429, {"error": f"Client already has {active} running batches (limit {API_MAX_ACTIVE_BATCHES})."}, [])
+            accepted, remaining, retry_after = self.quotas.reserve(client, quota, batch.unresolved)
+            if not accepted:
+                return None, (429, {
+                    "error": f"Batch of {batch.unresolved} unique listings exceeds the remaining quota of {remaining} for the last 24h.",
+                    "remaining": remaining,
+                }, [(b"retry-after", str(retry_after).encode())])
+            self.batches[batch.id] = batch
+            self._rotation.append(batch.id)
+            self._condition.notify()
+        logger.info("API batch %s from %s: %s unique listing(s), %s duplicate(s), %s invalid.", batch.id, client,
+                    batch.unresolved, batch.deduplicator.duplicate_count, batch.ingest_report.invalid_count)
+        return batch, None
+
+    def _evict_expired(self):
+        cutoff = time.time() - BATCH_RETENTION_SECONDS
+        for batch_id in [batch_id for batch_id, batch in self.batches.items() if batch.finished and batch.finished < cutoff]:
+            del self.batches[batch_id]
+
+    # --- Dispatch ---
+    def _next_task(self, now):
+        """Round-robins over batches; returns (batch, key, attempt) or (None, seconds until a retry is due)."""
+        next_due = DISPATCH_IDLE_SECONDS
+        for _ in range(len(self._rotation)):
+            batch = self.batches.get(self._rotation[0])
+            if batch is None or not batch.pending:
+                self._rotation.popleft()
+                continue
+            self._rotation.rotate(-1)
+            key, attempt, not_before = batch.pending[0]
+            if not_before <= now:
+                batch.pending.popleft()
+                return batch, key, attempt
+            next_due = min(next_due, not_before - now)
+        return None, next_due
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopping:
+                        return
+                    if self._in_flight < self.window:
+                        task = self._next_task(time.monotonic())
+                        if task[0] is not None:
+                            break
+                        self._condition.wait(task[1])
+                    else:
+                        self._condition.wait(DISPATCH_IDLE_SECONDS)
+                self._in_flight += 1
+            batch, key, attempt = task
+            url = batch.deduplicator.primary_url(key)
+            fn = self.pipeline.process_url if attempt == 0 else self.pipeline.process_url_retry
+            # Only in-process threads can watch the batch's cancel event; other pools get their futures cancelled.
+            args = (url, self.pipeline.ARCHIVE_DIR, batch.cancel_event) if WORKER_MODE == "thread" else (url,)
+            try:
+                if batch.cancel_event.is_set():  # Cancelled after this listing was taken off the queue
+                    future = concurrent.futures.Future()
+                    future.cancel()
+                else:
+                    future = self.executor.submit(fn, *args)
+            except Exception as e:
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+            with self._condition:
+                batch.in_flight.add(future)
+            future.add_done_callback(functools.partial(self._task_done, batch, key, attempt))
+
+    def _task_done(self, batch, key, attempt, future):
+        url = batch.deduplicator.primary_url(key)
+        try:
+            record = future.result()
+        except concurrent.futures.CancelledError:
+            record = _cancelled_by_client(url)
+        except Exception as exc:
+            logger.error("Critical exception processing %s: %s", url, exc, exc_info=True)
+            record = ListingRecord.failed(url, f"Critical processing error: {exc}")
+        if record.error_class == CANCELLED and batch.cancel_event.is_set():
+            # The pipeline's own cancel message is worded for hedged attempts.
+            record = _cancelled_by_client(url)
+        with self._condition:
+            self._in_flight -= 1
+            batch.in_flight.discard(future)
+            retry = record.error and not batch.cancel_event.is_set() and attempt < retries_allowed(record.error_class)
+            if retry:
+                not_before = time.monotonic() + RETRY_BACKOFF_SECONDS.get(record.error_class, 0)
+                batch.pending.append((key, attempt + 1, not_before))
+                batch.retried_keys.add(key)
+                if batch.id not in self._rotation:
+                    self._rotation.append(batch.id)
+            self._condition.notify()
+        if not retry:
+            self._publish(batch, batch.deduplicator.complete(key, record))
+
+    def _publish(self, batch, records):
+        try:
+            normalized = normalize_records(records)
+            self.results_db.add_batch(normalized, batch.id)
+            rows = normalized.to_pylist()
+        except Exception as e:
+            logger.error("Could not normalize or store results of batch %s: %s", batch.id, e, exc_info=True)
+            rows = [record.to_dict() for record in records]
+        with self._condition:
+            batch.results.extend(rows)
+            batch.succeeded += sum(1 for record in records if not record.error)
+            batch.unresolved -= 1
+            if not batch.unresolved:
+                batch.state = "cancelled" if batch.cancel_event.is_set() else "completed"
+                batch.finished = time.time()
+                logger.info("API batch %s %s: %s of %s succeeded.", batch.id, batch.state, batch.succeeded, len(batch.results))
+        batch.notify()
+
+    # --- Control ---
+    def cancel(self, batch):
+        """Stops a running batch: queued listings resolve as cancelled and running ones are interrupted."""
+        with self._condition:
+            if batch.state != "running":
+                return False
+            batch.cancel_event.set()
+            dropped, batch.pending = list(batch.pending), collections.deque()
+            futures = list(batch.in_flight)
+        for future in futures:
+            future.cancel()
+        for key, _, _ in dropped:
+            url = batch.deduplicator.primary_url(key)
+            self._publish(batch, batch.deduplicator.complete(key, _cancelled_by_client(url)))
+        logger.info("API batch %s cancelled by %s; %s queued listing(s) dropped.", batch.id, batch.client, len(dropped))
+        return True
+
+    def client_batches(self, client):
+        with self._condition:
+            return [batch for batch in self.batches.values() if batch.client == client]
+
+    def health(self):
+        with self._condition:
+            running = sum(1 for batch in self.batches.values() if batch.state == "running")
+            return {"status": "ok", "worker_mode": WORKER_MODE, "workers": self.pipeline.MAX_CONCURRENT_WORKERS,
+                    "in_flight": self._in_flight, "running_batches": running}
+
+    def close(self):
+        with self._condition:
+            self._stopping = True
+            batches = list(self.batches.values())
+            self._condition.notify_all()
+        for batch in batches:
+            self.cancel(batch)
+        self.executor.shutdown(wait=False)
+        close_thread_drivers(self.pipeline)
+        self.results_db.close()
+
+
+# --- ASGI application ---
+_service = None
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _client_for(scope):
+    """(client name, daily quota) for the request's API key, or None if it's missing or unknown."""
+    if not API_CLIENTS:
+        return "default", API_DAILY_QUOTA
+    key = _header(scope, b"x-api-key")
+    authorization = _header(scope, b"authorization") or ""
+    if key is None and authorization.lower().startswith("bearer "):
+        key = authorization[7:].strip()
+    return API_CLIENTS.get(key)
+
+
+async def _read_body(receive, limit=REQUEST_MAX_BYTES):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        size += len(chunks[-1])
+        if size > limit:
+            raise ValueError(f"Request body larger than {limit} bytes.")
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status, body, headers=()):
+    payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode()), *headers
+    ]})
+    await send({"type": "http.response.body", "body": payload})
+
+
+def _parse_urls(body, content_type):
+    """URLs from a JSON object {"urls": [...]} or JSON list, otherwise from plain text with one URL per line."""
+    text = body.decode("utf-8-sig")
+    if content_type.startswith("application/json"):
+        data = json.loads(text)
+        urls = data.get("urls") if isinstance(data, dict) else data
+        if not isinstance(urls, list):
+            raise ValueError('Expected a JSON list of URLs or an object with a "urls" list.')
+        return [str(url) for url in urls]
+    return text.splitlines()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _stream_results(scope, receive, send, batch, query):
+    """Streams the batch's results as they complete, as NDJSON (default) or server-sent events.
+
+    Both formats start at `?offset=N` (SSE also honours Last-Event-ID), so a dropped stream can resume.
+    Blank NDJSON lines and SSE comments are keep-alives.
+    """
+    use_sse = "text/event-stream" in (_header(scope, b"accept") or "") or query.get("format", [""])[0] == "sse"
+    last_event_id = _header(scope, b"last-event-id")
+    try:
+        seen = max(0, int(last_event_id if use_sse and last_event_id else query.get("offset", ["0"])[0]))
+    except ValueError:
+        await _send_json(send, 400, {"error": "offset and Last-Event-ID must be integers."})
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream" if use_sse else b"application/x-ndjson"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]})
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        while not disconnected.done():
+            rows = batch.results[seen:]
+            if rows:
+                if use_sse:
+                    chunk = "".join(f"id: {seen + index + 1}\nevent: result\ndata: {json.dumps(row, ensure_ascii=False)}\n\n"
+                                    for index, row in enumerate(rows))
+                else:
+                    chunk = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+                seen += len(rows)
+                await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+                continue
+            if batch.finished:
+                break
+            if not await batch.wait(seen, STREAM_KEEPALIVE_SECONDS, disconnected):
+                await send({"type": "http.response.body", "body": b": keep-alive\n\n" if use_sse else b"\n", "more_body": True})
+        if not disconnected.done() and use_sse:
+            await send({"type": "http.response.body", "body": f"event: done\ndata: {json.dumps(batch.status())}\n\n".encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+
+
+async def _lifespan(receive, send):
+    global _service
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # No-op when main() already configured it; covers `uvicorn batch_api:app`.
+            configure_logging(log_file=process_log_file("api"))
+            try:
+                if WORKER_MODE != "queue" and not API_STANDALONE:
+                    raise RuntimeError(
+                        f"{WORKER_MODE} mode would start browsers alongside the UI's own pool. Set LISTINGLENS_WORKER_MODE=queue "
+                        "for the API and the UI so both share the queue workers, or LISTINGLENS_API_STANDALONE=1 if the UI "
+                        "does not run on this host."
+                    )
+                api_key = load_api_key()
+                if not api_key:
+                    raise RuntimeError("GOOGLE_API_KEY not set in the environment or Streamlit secrets.")
+                import pipeline
+                pipeline.configure_gemini(api_key)
+                pipeline.get_chrome_options()
+                _service = BatchService(pipeline, api_key, asyncio.get_running_loop())
+            except Exception as e:
+                logger.error("Batch API failed to start: %s", e, exc_info=True)
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            logger.info("Batch API ready: %s worker(s) in %s mode, %s API key(s) configured.",
+                        pipeline.MAX_CONCURRENT_WORKERS, WORKER_MODE, len(API_CLIENTS) or 'no')
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _service is not None:
+                await asyncio.get_running_loop().run_in_executor(None, _service.close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point.
+
+    POST   /batches                 submit URLs (JSON {"urls": [...]} or text, one per line) -> 202 + status
+    GET    /batches                 the calling client's batches
+    GET    /batches/{id}            status and counts
+    GET    /batches/{id}/results    results as each listing finishes (NDJSON, or SSE with Accept: text/event-stream)
+    DELETE /batches/{id}            cancel
+    GET    /quota                   remaining listings in the client's rolling 24h quota
+    GET    /health
+    """
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    method, parts = scope["method"], [part for part in scope["path"].split("/") if part]
+    if _service is None:
+        await _send_json(send, 503, {"error": "Service is starting up."})
+        return
+    if parts == ["health"]:
+        await _send_json(send, 200, _service.health())
+        return
+    client = _client_for(scope)
+    if client is None:
+        await _send_json(send, 401, {"error": "Missing or unknown API key."}, [(b"www-authenticate", b"Bearer")])
+        return
+    client_name, quota = client
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+
+    if parts == ["quota"] and method == "GET":
+        await _send_json(send, 200, {"client": client_name, "daily_quota": quota,
+                                     "remaining": _service.quotas.remaining(client_name, quota)})
+    elif parts == ["batches"] and method == "POST":
+        try:
+            body = await _read_body(receive)
+            if body is None:
+                return
+            urls = _parse_urls(body, _header(scope, b"content-type") or "")
+        except (ValueError, UnicodeDecodeError) as e:
+            await _send_json(send, 400, {"error": str(e)})
+            return
+        if len(urls) > BATCH_MAX_URLS:
+            await _send_json(send, 413, {"error": f"At most {BATCH_MAX_URLS} URLs per batch."})
+            return
+        batch, error = await asyncio.get_running_loop().run_in_executor(None, _service.submit, client_name, quota, urls)
+        if error is not None:
+            await _send_json(send, *error)
+            return
+        status = batch.status()
+        status["results_url"] = f"/batches/{batch.id}/results"
+        await _send_json(send, 202, status, [(b"location", f"/batches/{batch.id}".encode())])
+    elif parts == ["batches"] and method == "GET":
+        await _send_json(send, 200, [batch.status() for batch in _service.client_batches(client_name)])
+    elif len(parts) in (2, 3) and parts[0] == "batches":
+        batch = _service.batches.get(parts[1])
+        if batch is None or batch.client != client_name:
+            await _send_json(send, 404, {"error": "No such batch."})
+        elif len(parts) == 3 and parts[2] == "results" and method == "GET":
+            await _stream_results(scope, receive, send, batch, query)
+        elif len(parts) == 2 and method == "GET":
+            await _send_json(send, 200, batch.status())
+        elif len(parts) == 2 and method == "DELETE":
+            cancelled = await asyncio.get_running_loop().run_in_executor(None, _service.cancel, batch)
+            await _send_json(send, 202 if cancelled else 409, batch.status())
+        else:
+            await _send_json(send, 405, {"error": "Method not allowed."})
+    else:
+        await _send_json(send, 404, {"error": "Not found."})
+
+
+def main(argv=None):
+    configure_logging(log_file=process_log_file("api"))
+    parser = argparse.ArgumentParser(description="Serve the ListingLens batch extraction API.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args(argv)
+    import uvicorn
+    # log_config=None keeps uvicorn's loggers on the queue/JSON-lines setup configured above.
+    uvicorn.run(app, host=args.host, port=args.port, log_config=None, lifespan="on")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+# browser_identity.py
+
+# --- Constants ---
+# Shared by the browsers and the plain-HTTP harvester, which must not pay for importing selenium.
+CHROME_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36"
@@ -0,0 +1,204 @@
+# browser_watchdog.py
+import logging
+import os
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+MAX_PAGES_PER_DRIVER = 20          # Recycle a browser after it has served this many pages
+DRIVER_RSS_RECYCLE_MB = 900        # Recycle after the current page when the browser tree grows past this
+DRIVER_RSS_KILL_MB = 1800          # Kill immediately; the page in progress fails with a WebDriver error
+MIN_AVAILABLE_MEMORY_MB = 600      # Hold back new browsers while host memory is below this
+MEMORY_THROTTLE_MAX_WAIT = 120
+WATCHDOG_INTERVAL = 2.0
+ORPHAN_SCAN_EVERY = 15             # Watchdog ticks between orphan scans
+ORPHAN_MIN_AGE = 60                # Never reap processes younger than this (they may still be registering)
+BROWSER_PROCESS_NAMES = ('chromedriver', 'chromium', 'chrome')
+
+
+def process_tree(pid):
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+
+def process_tree_rss_mb(pid):
+    total = 0
+    for proc in process_tree(pid):
+        try:
+            total += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total / (1024 * 1024)
+
+
+def kill_processes(processes):
+    for proc in processes:
+        try:
+            proc.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    psutil.wait_procs(processes, timeout=5)
+
+
+def wait_for_memory(min_available_mb=MIN_AVAILABLE_MEMORY_MB, max_wait=MEMORY_THROTTLE_MAX_WAIT):
+    """Blocks while host memory is low so a new browser doesn't push the box into swap or the OOM killer."""
+    waited = 0.0
+    while psutil.virtual_memory().available / (1024 * 1024) < min_available_mb and waited < max_wait:
+        if waited == 0:
+            logger.warning("Host memory below %s MB available; throttling new browser start.", min_available_mb)
+        time.sleep(WATCHDOG_INTERVAL)
+        waited += WATCHDOG_INTERVAL
+    if waited:
+        logger.info("Browser start resumed after waiting %.0fs for memory.", waited)
+
+
+class _ManagedDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pid = driver.service.process.pid
+        self.owner = threading.current_thread()
+        self.pages = 0
+        self.in_use = False
+        self.recycle = False
+        self.closed = False
+
+
+class DriverManager:
+    """Keeps one reusable WebDriver per worker thread and a watchdog over all of them.
+
+    Drivers are recycled after MAX_PAGES_PER_DRIVER pages or when their process tree grows past
+    DRIVER_RSS_RECYCLE_MB, killed outright past DRIVER_RSS_KILL_MB, and closed once their owning
+    thread has exited. The watchdog also reaps orphaned chromium/chromedriver processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._entries = {}
+        self._watchdog = None
+        self.stats = {"recycled": 0, "killed": 0, "orphans_reaped": 0}
+
+    def acquire(self, driver_factory):
+        entry = getattr(self._local, 'entry', None)
+        if entry is not None and (entry.closed or entry.recycle):
+            self._close(entry)
+            entry = None
+        if entry is None:
+            wait_for_memory()
+            entry = _ManagedDriver(driver_factory())
+            with self._lock:
+                self._entries[id(entry)] = entry
+            self._local.entry = entry
+            self._ensure_watchdog()
+        entry.in_use = True
+        return entry.driver
+
+    def release(self, driver, healthy=True):
+        entry = getattr(self._local, 'entry', None)
+        if entry is None or entry.driver is not driver:
+            return
+        entry.pages += 1
+        entry.in_use = False
+        if not healthy or entry.closed or entry.recycle or entry.pages >= MAX_PAGES_PER_DRIVER:
+            self._close(entry)
+            self._local.entry = None
+            return
+        try:
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+        except Exception as e:
+            logger.warning("Could not reset WebDriver for reuse (%s); closing it.", type(e).__name__)
+            self._close(entry)
+            self._local.entry = None
+
+    def _close(self, entry):
+        with self._lock:
+            if self._entries.pop(id(entry), None) is None and entry.closed:
+                return
+        entry.closed = True
+        leftover = process_tree(entry.pid)
+        try:
+            entry.driver.quit()
+        except Exception as quit_err:
+            logger.error("Error quitting WebDriver (pid %s): %s; killing its process tree.", entry.pid, quit_err)
+        kill_processes([proc for proc in leftover if proc.is_running()])
+        self.stats["recycled"] += 1
+
+    def _kill(self, entry):
+        with self._lock:
+            self._entries.pop(id(entry), None)
+        entry.closed = True
+        kill_processes(process_tree(entry.pid))
+        self.stats["killed"] += 1
+
+    def close_all(self):
+        """Closes every driver that is not serving a page right now."""
+        with self._lock:
+            idle = [entry for entry in self._entries.values() if not entry.in_use]
+        for entry in idle:
+            self._close(entry)
+
+    def _ensure_watchdog(self):
+        with self._lock:
+            if self._watchdog is None or not self._watchdog.is_alive():
+                self._watchdog = threading.Thread(target=self._watch, name="browser-watchdog", daemon=True)
+                self._watchdog.start()
+
+    def _watch(self):
+        tick = 0
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            tick += 1
+            try:
+                self._check_drivers()
+                if tick % ORPHAN_SCAN_EVERY == 0:
+                    self.reap_orphans()
+            except Exception as e:
+                logger.error("Browser watchdog error: %s", e, exc_info=True)
+
+    def _check_drivers(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            if not entry.in_use and not entry.owner.is_alive():
+                self._close(entry)
+                continue
+            rss_mb = process_tree_rss_mb(entry.pid)
+            if rss_mb > DRIVER_RSS_KILL_MB:
+                logger.error("Browser tree %s is using %.0f MB (> %s MB); killing it.", entry.pid, rss_mb, DRIVER_RSS_KILL_MB)
+                self._kill(entry)
+            elif rss_mb > DRIVER_RSS_RECYCLE_MB and not entry.recycle:
+                logger.warning("Browser tree %s is using %.0f MB; recycling it after the current page.", entry.pid, rss_mb)
+                entry.recycle = True
+
+    def reap_orphans(self):
+        """Kills chromium/chromedriver processes that were re-parented to init after their owner died."""
+        with self._lock:
+            known_pids = {proc.pid for entry in self._entries.values() for proc in process_tree(entry.pid)}
+        me = psutil.Process(os.getpid())
+        now = time.time()
+        orphans = []
+        for proc in psutil.process_iter(['pid', 'name', 'ppid', 'username', 'create_time']):
+            info = proc.info
+            name = (info.get('name') or '').lower()
+            if info['pid'] in known_pids or not any(browser in name for browser in BROWSER_PROCESS_NAMES):
+                continue
+            if info.get('username') != me.username() or now - (info.get('create_time') or now) < ORPHAN_MIN_AGE:
+                continue
+            if info.get('ppid') == 1 or not psutil.pid_exists(info.get('ppid') or 0):
+                orphans.append(proc)
+        if orphans:
+            logger.warning("Reaping %s orphaned browser process(es): %s", len(orphans), [proc.pid for proc in orphans])
+            kill_processes(orphans)
+            self.stats["orphans_reaped"] += len(orphans)
+        return len(orphans)
+
+
+driver_manager = DriverManager()
@@ -0,0 +1,441 @@
+# cdp_engine.py
+import asyncio
+import atexit
+import base64
+import itertools
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import websockets
+
+from browser_watchdog import DRIVER_RSS_RECYCLE_MB, kill_processes, process_tree, process_tree_rss_mb
+from failures import BROWSER_ERROR, PAGE_TIMEOUT, classify_error
+from pipeline import PAGE_TEXT_SAMPLE_CHARS, Deadline
+from selector_health import selector_registry
+from site_profiles import get_profile, normalize_domain
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+CHROMIUM_BINARY = "/usr/bin/chromium"
+CDP_MAX_TABS = 16                   # Concurrent listing tabs in the shared browser
+CDP_BROWSER_RSS_RECYCLE_MB = DRIVER_RSS_RECYCLE_MB * 4
+CDP_LAUNCH_TIMEOUT = 20
+CDP_COMMAND_TIMEOUT = 30
+CDP_POLL_INTERVAL = 0.25
+# Same categories the DevTools Performance panel records, so traces open there with full detail.
+CDP_TRACE_CATEGORIES = [
+    "devtools.timeline", "disabled-by-default-devtools.timeline", "disabled-by-default-devtools.timeline.frame",
+    "disabled-by-default-devtools.timeline.stack", "v8.execute", "disabled-by-default-v8.cpu_profiler",
+    "toplevel", "blink.user_timing", "loading", "latencyInfo",
+]
+
+_JS_XPATH_COUNT = "document.evaluate({xpath}, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength"
+_JS_XPATH_CLICK = """(() => {{
+    const el = document.evaluate({xpath}, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!el || !el.getClientRects().length) return null;
+    el.scrollIntoView({{block: 'center'}});
+    el.click();
+    return (el.innerText || el.textContent || '').trim().slice(0, 30);
+}})()"""
+_JS_CSS_COUNT = "document.querySelectorAll({selector}).length"
+_JS_PAGE_TEXT = f"[document.title, document.body ? document.body.innerText.slice(0, {PAGE_TEXT_SAMPLE_CHARS}) : '']"
+_JS_CSS_VISIBLE_HTML = """Array.from(document.querySelectorAll({selector}))
+    .filter(el => el.getClientRects().length && getComputedStyle(el).visibility !== 'hidden')
+    .map(el => el.outerHTML.trim())
+    .filter(Boolean)"""
+
+
+class CDPError(Exception):
+    pass
+
+
+class _Connection:
+    """One DevTools websocket, multiplexing commands and events for every attached tab."""
+
+    def __init__(self, ws):
+        self._ws = ws
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._waiters = []
+        self._reader = asyncio.get_running_loop().create_task(self._read())
+
+    @property
+    def closed(self):
+        return self._reader.done()
+
+    async def send(self, method, params=None, session_id=None, timeout=CDP_COMMAND_TIMEOUT):
+        message_id = next(self._ids)
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        try:
+            await self._ws.send(json.dumps(message))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(message_id, None)
+
+    def expect_event(self, method, session_id):
+        """Returns a future for the next `method` event on `session_id`; register it before triggering the event."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((method, session_id, future))
+        return future
+
+    async def _read(self):
+        try:
+            async for raw in self._ws:
+                message = json.loads(raw)
+                if "id" in message:
+                    future = self._pending.get(message["id"])
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        future.set_exception(CDPError(message["error"].get("message", "CDP error")))
+                    else:
+                        future.set_result(message.get("result", {}))
+                    continue
+                for waiter in list(self._waiters):
+                    method, session_id, future = waiter
+                    if future.done():
+                        self._waiters.remove(waiter)
+                    elif message.get("method") == method and message.get("sessionId") == session_id:
+                        self._waiters.remove(waiter)
+                        future.set_result(message.get("params", {}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for future in itertools.chain(self._pending.values(), (waiter[2] for waiter in self._waiters)):
+                if not future.done():
+                    future.set_exception(CDPError("DevTools connection closed."))
+
+    async def close(self):
+        await self._ws.close()
+
+
+class _Browser:
+    def __init__(self, process, user_data_dir, connection):
+        self.process = process
+        self.user_data_dir = user_data_dir
+        self.connection = connection
+        self.open_tabs = 0
+        self.retired = False
+
+    @property
+    def alive(self):
+        return self.process.poll() is None and not self.connection.closed
+
+    async def close(self):
+        try:
+            await self.connection.close()
+        except Exception:
+            pass
+        kill_processes(process_tree(self.process.pid))
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+
+class _Tab:
+    def __init__(self, connection, session_id):
+        self.connection = connection
+        self.session_id = session_id
+
+    async def send(self, method, params=None, timeout=CDP_COMMAND_TIMEOUT):
+        return await self.connection.send(method, params, self.session_id, timeout)
+
+    async def evaluate(self, expression):
+        result = await self.send("Runtime.evaluate", {"expression": expression, "returnByValue": True, "awaitPromise": True})
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise CDPError(details.get("exception", {}).get("description") or details.get("text", "JavaScript error"))
+        return result.get("result", {}).get("value")
+
+    async def navigate(self, url, timeout):
+        loaded = self.connection.expect_event("Page.domContentEventFired", self.session_id)
+        navigation = await self.send("Page.navigate", {"url": url}, timeout=timeout)
+        if navigation.get("errorText"):
+            loaded.cancel()
+            raise CDPError(f"Navigation failed: {navigation['errorText']}")
+        await asyncio.wait_for(loaded, timeout)
+
+    async def wait_for_count(self, expression, timeout):
+        """Polls a JS count expression until it is non-zero; returns the last count."""
+        deadline = time.monotonic() + timeout
+        while True:
+            count = await self.evaluate(expression)
+            if count or time.monotonic() >= deadline:
+                return count
+            await asyncio.sleep(CDP_POLL_INTERVAL)
+
+
+class CDPEngine:
+    """Async rendering engine that drives many listing tabs in one Chromium over the DevTools protocol.
+
+    `scrape()` is a blocking, thread-safe drop-in for `pipeline.scrape_targeted_sections`; the
+    browser, its websocket and every tab live on a private asyncio loop thread.
+    """
+
+    def __init__(self, user_agent, max_tabs=CDP_MAX_TABS):
+        self._user_agent = user_agent
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="cdp-engine", daemon=True)
+        self._thread.start()
+        self._browser = None
+        self._launch_lock = asyncio.Lock()
+        self._tab_slots = asyncio.Semaphore(max_tabs)
+        self._trace_lock = asyncio.Lock()  # Chrome records one trace per browser at a time
+        atexit.register(self.close)
+
+    def scrape(self, url, target_selectors=None, profile=None, deadline=None, trace=False):
+        return asyncio.run_coroutine_threadsafe(
+            self._scrape(url, target_selectors, profile, deadline or Deadline(), trace), self._loop
+        ).result()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        if self._browser is not None:
+            asyncio.run_coroutine_threadsafe(self._browser.close(), self._loop).result(CDP_COMMAND_TIMEOUT)
+            self._browser = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(CDP_COMMAND_TIMEOUT)
+        self._loop.close()
+
+    async def _launch(self):
+        user_data_dir = tempfile.mkdtemp(prefix="listinglens-cdp-")
+        process = subprocess.Popen(
+            [
+                CHROMIUM_BINARY, "--headless=new", "--remote-debugging-port=0", f"--user-data-dir={user_data_dir}",
+                "--no-sandbox", "--disable-gpu", "--disable-dev-shm-usage", "--disable-extensions",
+                "--window-size=1920,1080", f"--user-agent={self._user_agent}", "about:blank",
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        port_file = os.path.join(user_data_dir, "DevToolsActivePort")
+        deadline = time.monotonic() + CDP_LAUNCH_TIMEOUT
+        while not os.path.exists(port_file):
+            if process.poll() is not None or time.monotonic() > deadline:
+                kill_processes(process_tree(process.pid))
+                shutil.rmtree(user_data_dir, ignore_errors=True)
+                raise CDPError(f"Chromium did not expose a DevTools port within {CDP_LAUNCH_TIMEOUT}s.")
+            await asyncio.sleep(0.1)
+        await asyncio.sleep(0.1)  # The file is written before its second line on some builds
+        with open(port_file, 'r', encoding='utf-8') as f:
+            port, ws_path = f.read().split()[:2]
+        ws = await websockets.connect(f"ws://127.0.0.1:{port}{ws_path}", max_size=None)
+        logger.info("Launched shared Chromium (pid %s) for the CDP engine.", process.pid)
+        return _Browser(process, user_data_dir, _Connection(ws))
+
+    async def _acquire_browser(self):
+        async with self._launch_lock:
+            browser = self._browser
+            if browser is None or browser.retired or not browser.alive:
+                if browser is not None and not browser.alive:
+                    logger.error("Shared Chromium for the CDP engine died; relaunching.")
+                    await browser.close()
+                self._browser = browser = await self._launch()
+            browser.open_tabs += 1
+            return browser
+
+    async def _release_browser(self, browser):
+        browser.open_tabs -= 1
+        if not browser.retired and process_tree_rss_mb(browser.process.pid) > CDP_BROWSER_RSS_RECYCLE_MB:
+            logger.warning("Shared Chromium (pid %s) is over %s MB; retiring it once its tabs finish.", browser.process.pid, CDP_BROWSER_RSS_RECYCLE_MB)
+            browser.retired = True
+        if browser.retired and browser.open_tabs == 0:
+            await browser.close()
+
+    async def _start_trace(self, tab, url):
+        if self._trace_lock.locked():
+            logger.info("Another tab is being traced; no Chrome trace for %s.", url)
+            return False
+        await self._trace_lock.acquire()
+        try:
+            await tab.send("Tracing.start", {
+                "transferMode": "ReturnAsStream",
+                "traceConfig": {"includedCategories": CDP_TRACE_CATEGORIES, "excludedCategories": ["*"]},
+            })
+        except CDPError as e:
+            self._trace_lock.release()
+            logger.warning("Could not start a Chrome trace for %s: %s", url, e)
+            return False
+        return True
+
+    async def _collect_trace(self, tab, url):
+        try:
+            complete = tab.connection.expect_event("Tracing.tracingComplete", tab.session_id)
+            await tab.send("Tracing.end")
+            stream = (await asyncio.wait_for(complete, CDP_COMMAND_TIMEOUT))["stream"]
+            chunks = []
+            while True:
+                chunk = await tab.send("IO.read", {"handle": stream})
+                data = chunk.get("data", "")
+                chunks.append(base64.b64decode(data).decode('utf-8') if chunk.get("base64Encoded") else data)
+                if chunk.get("eof"):
+                    break
+            await tab.send("IO.close", {"handle": stream})
+            trace = json.loads("".join(chunks))
+            return {"traceEvents": trace} if isinstance(trace, list) else trace
+        except (CDPError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            logger.warning("Could not collect the Chrome trace for %s: %s: %s", url, type(e).__name__, e)
+            return None
+        finally:
+            self._trace_lock.release()
+
+    async def _scrape(self, url, target_selectors, profile, deadline, trace=False):
+        profile = profile or get_profile(url)
+        if target_selectors is None:
+            target_selectors = profile["target_selectors"]
+        result = {"url": url, "extracted_data": {selector: [] for selector in target_selectors}, "error": None, "error_class": None, "raw_error": None, "skipped_phases": []}
+        start_time = time.time()
+        async with self._tab_slots:
+            browser = None
+            tab = None
+            target_id = None
+            tracing = False
+            try:
+                browser = await self._acquire_browser()
+                target_id = (await browser.connection.send("Target.createTarget", {"url": "about:blank"}))["targetId"]
+                session_id = (await browser.connection.send("Target.attachToTarget", {"targetId": target_id, "flatten": True}))["sessionId"]
+                tab = _Tab(browser.connection, session_id)
+                await tab.send("Page.enable")
+                tracing = trace and await self._start_trace(tab, url)
+                await self._load_reveal_extract(tab, url, target_selectors, profile, result, deadline)
+            except asyncio.TimeoutError:
+                result["error"] = f"Timeout occurred during page load or element wait (Check page_load_timeout: {profile['timing']['page_load_timeout']}s or other waits)."
+                result["error_class"] = PAGE_TIMEOUT
+                result["raw_error"] = result["error"]
+                logger.error("Timeout error during CDP scraping for %s", url)
+            except CDPError as e:
+                result["error"] = f"CDP runtime error: {e}"
+                result["error_class"] = classify_error(str(e), default=BROWSER_ERROR)
+                result["raw_error"] = repr(e)
+                logger.error("CDP error during scraping for %s: %s", url, e)
+            except Exception as e:
+                result["error"] = f"Unexpected scraping error: {type(e).__name__}"
+                result["error_class"] = classify_error(f"{type(e).__name__}: {e}")
+                result["raw_error"] = f"{type(e).__name__}: {e}"
+                logger.error("Unexpected error during CDP scraping for %s: %s", url, e, exc_info=True)
+            finally:
+                if tracing:
+                    result["trace"] = await self._collect_trace(tab, url)
+                if browser is not None:
+                    if target_id is not None and browser.alive:
+                        try:
+                            await browser.connection.send("Target.closeTarget", {"targetId": target_id})
+                        except CDPError:
+                            pass
+                    await self._release_browser(browser)
+        logger.info("Finished CDP scraping %s in %.2f seconds. Error: %s", url, time.time() - start_time, result['error'])
+        return result
+
+    async def _click_all(self, tab, xpath, wait_timeout, post_click_delay):
+        """Clicks every visible element matching `xpath`; returns the specific XPaths that were clicked."""
+        clicked = []
+        count = await tab.wait_for_count(_JS_XPATH_COUNT.format(xpath=json.dumps(xpath)), wait_timeout)
+        for i in range(count or 0):
+            specific_xpath = f"({xpath})[{i+1}]"
+            try:
+                button_text = await tab.evaluate(_JS_XPATH_CLICK.format(xpath=json.dumps(specific_xpath)))
+            except CDPError as e:
+                logger.warning("Error clicking '%s': %s", specific_xpath, e)
+                continue
+            if button_text is not None:
+                logger.info("Clicked button '%s...' XPath: %s", button_text, specific_xpath)
+                clicked.append(specific_xpath)
+                await asyncio.sleep(post_click_delay)
+        return clicked
+
+    async def _load_reveal_extract(self, tab, url, target_selectors, profile, result, deadline):
+        timing = profile["timing"]
+        reveal_actions = profile["reveal_actions"]
+        expansion_button_texts = reveal_actions["expansion_button_texts"]
+        post_expansion_contact_xpaths = reveal_actions["post_expansion_contact_xpaths"]
+        fallback_selectors = profile.get("fallback_selectors", {})
+        extracted_html_dict = result["extracted_data"]
+
+        def skip_phase(phase):
+            if phase not in result["skipped_phases"]:
+                logger.warning("Time budget exhausted for %s; skipping %s.", url, phase)
+                result["skipped_phases"].append(phase)
+
+        await tab.navigate(url, deadline.cap(timing["page_load_timeout"]))
+        await asyncio.sleep(deadline.cap(timing["initial_settle_delay"]))
+
+        expansion_buttons_clicked = []
+        for xpath in reveal_actions["initial_button_xpaths"]:
+            if deadline.expired():
+                skip_phase("reveal buttons")
+                break
+            clicked = await self._click_all(tab, xpath, deadline.cap(timing["button_wait_timeout"]), deadline.cap(timing["post_click_delay"]))
+            if any(txt in xpath.lower() for txt in expansion_button_texts):
+                expansion_buttons_clicked.extend(clicked)
+
+        if expansion_buttons_clicked and deadline.expired():
+            skip_phase("second expansion clicks")
+        elif expansion_buttons_clicked:
+            await asyncio.sleep(deadline.cap(timing["second_expansion_click_delay"]))
+            for specific_xpath in expansion_buttons_clicked:
+                if deadline.expired():
+                    skip_phase("second expansion clicks")
+                    break
+                try:
+                    button_text = await tab.evaluate(_JS_XPATH_CLICK.format(xpath=json.dumps(specific_xpath)))
+                except CDPError as e:
+                    logger.warning("Error on second expansion click '%s': %s", specific_xpath, e)
+                    continue
+                if button_text is not None:
+                    logger.info("Second click on '%s...' XPath: %s", button_text, specific_xpath)
+                    await asyncio.sleep(deadline.cap(timing["post_second_expansion_click_delay"]))
+
+        if post_expansion_contact_xpaths and timing["delay_before_post_expansion_search"]:
+            await asyncio.sleep(deadline.cap(timing["delay_before_post_expansion_search"]))
+        for xpath in post_expansion_contact_xpaths:
+            if deadline.expired():
+                skip_phase("contact reveal buttons")
+                break
+            await self._click_all(tab, xpath, deadline.cap(timing["button_wait_timeout"]), deadline.cap(timing["post_expansion_click_delay"]))
+
+        domain = normalize_domain(urlparse(url).netloc)
+        for selector in target_selectors:
+            selector_wait_timeout = selector_registry.wait_timeout(domain, selector, timing["extraction_wait_timeout"])
+            if selector_wait_timeout and deadline.expired():
+                skip_phase("selector waits")
+            selector_wait_timeout = deadline.cap(selector_wait_timeout)
+            html_list = []
+            try:
+                if selector_wait_timeout:
+                    await tab.wait_for_count(_JS_CSS_COUNT.format(selector=json.dumps(selector)), selector_wait_timeout)
+                html_list = await tab.evaluate(_JS_CSS_VISIBLE_HTML.format(selector=json.dumps(selector))) or []
+            except CDPError as e:
+                logger.error("Error finding elements for selector '%s': %s", selector, e)
+            if html_list or "selector waits" not in result["skipped_phases"]:
+                selector_registry.record(domain, selector, bool(html_list))
+
+            if not html_list:
+                for fallback_selector in fallback_selectors.get(selector, []):
+                    try:
+                        html_list = await tab.evaluate(_JS_CSS_VISIBLE_HTML.format(selector=json.dumps(fallback_selector))) or []
+                    except CDPError as e_fallback:
+                        logger.warning("Error finding elements for fallback selector '%s': %s", fallback_selector, e_fallback)
+                    if html_list:
+                        logger.info("Using fallback selector '%s' for '%s' on %s", fallback_selector, selector, domain)
+                        break
+            extracted_html_dict[selector].extend(html_list)
+
+        if target_selectors and "selector waits" not in result["skipped_phases"]:
+            selectors_hit = sum(1 for html_list in extracted_html_dict.values() if html_list)
+            selector_registry.end_page(domain, selectors_hit, len(target_selectors))
+        if not any(extracted_html_dict.values()):
+            logger.warning("No HTML content extracted for any target selector for URL: %s", url)
+            try:
+                result["page_title"], result["page_text"] = await tab.evaluate(_JS_PAGE_TEXT)
+            except CDPError as e:
+                logger.warning("Could not read the page text of %s: %s", url, e)
@@ -0,0 +1,18 @@
+# credentials.py
+import os
+import tomllib
+
+# --- Constants ---
+SECRETS_PATH = os.path.join('.streamlit', 'secrets.toml')
+
+
+def load_api_key(secrets_path=SECRETS_PATH):
+    """GOOGLE_API_KEY from the environment, falling back to the Streamlit secrets file the UI reads."""
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if api_key:
+        return api_key
+    try:
+        with open(secrets_path, 'rb') as f:
+            return tomllib.load(f).get("GOOGLE_API_KEY")
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,65 @@
+# failures.py
+import re
+
+# --- Error Classes ---
+RENDERER_CRASH = 'renderer_crash'
+PAGE_TIMEOUT = 'page_timeout'
+NETWORK_ERROR = 'network_error'
+BROWSER_ERROR = 'browser_error'
+NOT_FOUND = 'not_found'
+NO_CONTENT = 'no_content'
+MISSING_KEY_DATA = 'missing_key_data'
+AI_QUOTA = 'ai_quota'
+AI_PARSE = 'ai_parse'
+AI_ERROR = 'ai_error'
+WORKER_TIMEOUT = 'worker_timeout'
+WORKER_CRASH = 'worker_crash'
+CANCELLED = 'cancelled'
+UNKNOWN = 'unknown'
+
+# --- Retry Policy ---
+# Extra attempts the end-of-batch retry lane gives each class; anything not listed is final.
+RETRY_POLICY = {
+    RENDERER_CRASH: 2,
+    PAGE_TIMEOUT: 1,
+    NETWORK_ERROR: 1,
+    BROWSER_ERROR: 1,
+    AI_QUOTA: 2,
+    AI_ERROR: 1,
+    WORKER_TIMEOUT: 1,
+    WORKER_CRASH: 1,
+}
+RETRY_BACKOFF_SECONDS = {AI_QUOTA: 30, NETWORK_ERROR: 5}
+RETRY_BUDGET_FACTOR = 2.0      # Retries get this multiple of the profile's url_budget
+
+# Checked in order; the first match wins.
+_ERROR_PATTERNS = [
+    (re.compile(r"hard timeout", re.IGNORECASE), WORKER_TIMEOUT),
+    (re.compile(r"worker process crashed|lease expired", re.IGNORECASE), WORKER_CRASH),
+    (re.compile(r"cancelled|shut down", re.IGNORECASE), CANCELLED),
+    (re.compile(r"DevToolsActivePort|unable to connect to renderer|chrome not reachable|session deleted|"
+                r"invalid session id|tab crashed|target closed|DevTools connection closed", re.IGNORECASE), RENDERER_CRASH),
+    (re.compile(r"\b429\b|quota|resource.{0,5}exhausted|rate.?limit", re.IGNORECASE), AI_QUOTA),
+    (re.compile(r"\b404\b|page not found|delisted", re.IGNORECASE), NOT_FOUND),
+    (re.compile(r"net::ERR_|name or service not known|connection (?:reset|refused)", re.IGNORECASE), NETWORK_ERROR),
+    (re.compile(r"timeout|timed out", re.IGNORECASE), PAGE_TIMEOUT),
+    (re.compile(r"parse AI response", re.IGNORECASE), AI_PARSE),
+    (re.compile(r"gemini", re.IGNORECASE), AI_ERROR),
+    (re.compile(r"no (?:relevant )?HTML content", re.IGNORECASE), NO_CONTENT),
+    (re.compile(r"key data might be missing", re.IGNORECASE), MISSING_KEY_DATA),
+    (re.compile(r"webdriver|CDP", re.IGNORECASE), BROWSER_ERROR),
+]
+
+
+def classify_error(error, default=UNKNOWN):
+    """Maps an error message to one of the error classes above (None for no error)."""
+    if not error:
+        return None
+    for pattern, error_class in _ERROR_PATTERNS:
+        if pattern.search(error):
+            return error_class
+    return default
+
+
+def retries_allowed(error_class):
+    return RETRY_POLICY.get(error_class, 0)
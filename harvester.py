@@ -0,0 +1,186 @@
+# harvester.py
+import argparse
+import functools
+import html
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+import urllib.request
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse
+
+from browser_identity import CHROME_USER_AGENT
+from site_profiles import get_profile, normalize_domain
+from structured_logging import configure_logging, process_log_file
+from url_canonical import canonicalize_url, listing_key
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+HARVEST_HTTP_TIMEOUT = 20
+HARVEST_QUEUE_SIZE = 500       # Listing URLs buffered ahead of the extraction queue
+HARVEST_PUT_TIMEOUT = 1.0
+_HREF_PATTERN = re.compile(r"""href\s*=\s*["']([^"'#]+)""", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(pattern):
+    return re.compile(pattern)
+
+
+def is_supported_search_url(url):
+    """Harvesting needs a site profile that can recognise listing links by their listing ID."""
+    return bool(get_profile(url).get("listing_id_pattern"))
+
+
+def page_url(search_url, page_param, page_number):
+    parsed = urlparse(search_url)
+    params = [(key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True) if key != page_param]
+    params.append((page_param, str(page_number)))
+    return parsed._replace(query=urlencode(params)).geturl()
+
+
+def fetch_http(url):
+    request = urllib.request.Request(url, headers={"User-Agent": CHROME_USER_AGENT, "Accept": "text/html"})
+    with urllib.request.urlopen(request, timeout=HARVEST_HTTP_TIMEOUT) as response:
+        charset = response.headers.get_content_charset() or 'utf-8'
+        return response.read().decode(charset, errors='replace')
+
+
+def fetch_browser(url, profile):
+    from pipeline import create_driver, driver_manager
+    driver = driver_manager.acquire(create_driver)
+    healthy = False
+    try:
+        driver.set_page_load_timeout(profile["timing"]["page_load_timeout"])
+        driver.get(url)
+        time.sleep(profile["timing"]["initial_settle_delay"])
+        page_html = driver.page_source
+        healthy = True
+        return page_html
+    finally:
+        driver_manager.release(driver, healthy=healthy)
+
+
+def extract_listing_urls(page_html, base_url, profile):
+    """Yields absolute links on `page_html` that point at listings on the same site."""
+    pattern = _compile(profile["listing_id_pattern"])
+    domain = normalize_domain(urlparse(base_url).netloc)
+    for href in _HREF_PATTERN.findall(page_html):
+        absolute = urljoin(base_url, html.unescape(href.strip()))
+        parsed = urlparse(absolute)
+        if parsed.scheme not in ('http', 'https'):
+            continue
+        link_domain = normalize_domain(parsed.netloc)
+        if link_domain != domain and not link_domain.endswith('.' + domain):
+            continue
+        if pattern.search(parsed.path.rstrip('/') or '/'):
+            yield absolute
+
+
+def harvest_listing_urls(search_url, max_pages=None, is_known=None):
+    """Walks a search results page's pagination, yielding each newly discovered listing URL.
+
+    Stops at `max_pages`, on a fetch error, or at the first page that adds no listings (most sites
+    repeat their last page past the end). `is_known(listing_key)` can skip listings already held elsewhere.
+    """
+    profile = get_profile(search_url)
+    if not profile.get("listing_id_pattern"):
+        logger.error("No site profile can recognise listing links on %s; nothing to harvest.", search_url)
+        return
+    search = profile["search"]
+    max_pages = max_pages or search["max_pages"]
+    seen_keys = set()
+    for page_number in range(search["first_page"], search["first_page"] + max_pages):
+        url = search_url if page_number == search["first_page"] else page_url(search_url, search["page_param"], page_number)
+        page_start_time = time.perf_counter()
+        try:
+            if search["fetch_tier"] == "browser":
+                page_html = fetch_browser(url, profile)
+            else:
+                page_html = fetch_http(url)
+        except Exception as e:
+            logger.error("Stopping harvest of %s: page %s failed (%s: %s)", search_url, page_number, type(e).__name__, e)
+            return
+        unseen_count = 0
+        for listing_url in extract_listing_urls(page_html, url, profile):
+            key = listing_key(listing_url)
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            unseen_count += 1
+            if is_known is None or not is_known(key):
+                yield canonicalize_url(listing_url)
+        logger.info("Harvested page %s of %s: %s new listing(s) in %.2fs.",
+                    page_number, search_url, unseen_count, time.perf_counter() - page_start_time)
+        if not unseen_count:
+            return
+        time.sleep(search["page_delay"])
+
+
+def stream_harvest(search_url, max_pages=None, is_known=None):
+    """Runs the harvest on a background thread so pages keep being fetched while the consumer
+    (the extraction queue) works through the listings already found."""
+    found = queue.Queue(maxsize=HARVEST_QUEUE_SIZE)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for listing_url in harvest_listing_urls(search_url, max_pages, is_known):
+                while not stop.is_set():
+                    try:
+                        found.put(listing_url, timeout=HARVEST_PUT_TIMEOUT)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            logger.error("Harvest of %s failed: %s", search_url, e, exc_info=True)
+        finally:
+            if not stop.is_set():
+                found.put(done)
+
+    threading.Thread(target=produce, name="search-harvester", daemon=True).start()
+    try:
+        while (listing_url := found.get()) is not done:
+            yield listing_url
+    finally:
+        stop.set()
+
+
+def main(argv=None):
+    configure_logging(log_file=process_log_file("harvester"))
+    parser = argparse.ArgumentParser(description="Collect listing URLs from a search results page and its following pages.")
+    parser.add_argument("search_url")
+    parser.add_argument("--max-pages", type=int)
+    parser.add_argument("--out", default="harvested_urls.txt")
+    parser.add_argument("--skip-known", metavar="WATCHLIST_DB", help="Skip listings already in a watchlist state database.")
+    args = parser.parse_args(argv)
+
+    if not is_supported_search_url(args.search_url):
+        logger.error("No site profile with a listing_id_pattern matches %s.", args.search_url)
+        return 1
+    is_known = None
+    if args.skip_known:
+        from watchlist import WatchlistState
+        is_known = WatchlistState(args.skip_known).has
+    count = 0
+    try:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            for listing_url in stream_harvest(args.search_url, args.max_pages, is_known):
+                f.write(listing_url + "\n")
+                count += 1
+    finally:
+        # Only the browser-tier fetch imports pipeline; close the browser it left for reuse.
+        pipeline = sys.modules.get("pipeline")
+        if pipeline is not None:
+            pipeline.driver_manager.close_all()
+    logger.info("Harvested %s listing URL(s) -> %s", count, args.out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
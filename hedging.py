@@ -0,0 +1,182 @@
+# hedging.py
+import concurrent.futures
+import logging
+import threading
+import time
+from collections import deque
+
+from listing_schema import ListingRecord
+from site_profiles import get_profile
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+HEDGE_PERCENTILE = 0.9          # Hedge a URL once it has run longer than this share of recent URLs
+HEDGE_MIN_SAMPLES = 10          # Completed URLs needed before the percentile is trusted
+HEDGE_SAMPLE_WINDOW = 200
+HEDGE_MAX_FRACTION = 0.1        # Never hedge more than this share of the batch
+HEDGE_CHECK_INTERVAL = 1.0
+
+
+class _Attempt:
+    def __init__(self, hedge):
+        self.hedge = hedge
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.started = None
+        self.finished = None
+
+
+class _Task:
+    def __init__(self, fn, url):
+        self.fn = fn
+        self.url = url
+        self.future = concurrent.futures.Future()
+        self.future.set_running_or_notify_cancel()
+        self.attempts = []
+        self.failed_record = None
+        self.resolved = False
+
+
+class HedgedExecutor:
+    """Wraps a thread pool so slow URLs get a second attempt once the pool has idle workers.
+
+    Submitted callables must accept a `cancel_event` keyword (see pipeline.process_url). The first
+    successful attempt resolves the Future; the other attempt's cancel event is set so it stops
+    early and its browser is recycled instead of reused.
+    """
+
+    def __init__(self, executor, max_workers, percentile=HEDGE_PERCENTILE, min_samples=HEDGE_MIN_SAMPLES,
+                 max_fraction=HEDGE_MAX_FRACTION):
+        self._executor = executor
+        self._max_workers = max_workers
+        self._percentile = percentile
+        self._min_samples = min_samples
+        self._max_fraction = max_fraction
+        self._lock = threading.RLock()
+        self._tasks = set()
+        self._durations = deque(maxlen=HEDGE_SAMPLE_WINDOW)
+        self._submitted = 0
+        self.stats = {
+            "hedges_launched": 0, "hedge_wins": 0, "hedge_attempt_seconds": 0.0,
+            "primary_elapsed_at_win": 0.0, "max_seconds_saved": 0.0,
+        }
+        self._stop = threading.Event()
+        self._monitor = threading.Thread(target=self._watch, name="hedge-monitor", daemon=True)
+        self._monitor.start()
+
+    def submit(self, fn, url):
+        task = _Task(fn, url)
+        with self._lock:
+            self._tasks.add(task)
+            self._submitted += 1
+            self._launch(task, hedge=False)
+        return task.future
+
+    def _launch(self, task, hedge):
+        attempt = _Attempt(hedge)
+        task.attempts.append(attempt)
+        attempt.future = self._executor.submit(self._run_attempt, attempt, task.fn, task.url)
+        attempt.future.add_done_callback(lambda _: self._attempt_done(task, attempt))
+
+    @staticmethod
+    def _run_attempt(attempt, fn, url):
+        attempt.started = time.monotonic()
+        try:
+            return fn(url, cancel_event=attempt.cancel_event)
+        finally:
+            attempt.finished = time.monotonic()
+
+    def _attempt_done(self, task, attempt):
+        try:
+            record = attempt.future.result()
+        except concurrent.futures.CancelledError:
+            record = None
+        except Exception as e:
+            logger.error("Critical exception processing %s: %s", task.url, e, exc_info=True)
+            record = ListingRecord.failed(task.url, f"Critical processing error: {e}")
+        with self._lock:
+            if attempt.hedge and attempt.started is not None:
+                self.stats["hedge_attempt_seconds"] += attempt.finished - attempt.started
+            if task.resolved:
+                return
+            still_running = [other for other in task.attempts if other is not attempt and not other.future.done()]
+            if record is not None and record.error and still_running:
+                task.failed_record = task.failed_record or record
+                return  # Give the other attempt its chance
+            if record is None:
+                if still_running:
+                    return
+                record = task.failed_record or ListingRecord.failed(task.url, "All attempts were cancelled.")
+            task.resolved = True
+            self._tasks.discard(task)
+            if not attempt.hedge and not record.error:
+                self._durations.append(attempt.finished - attempt.started)
+            if attempt.hedge and not record.error:
+                primary = task.attempts[0]
+                primary_elapsed = time.monotonic() - primary.started
+                self.stats["hedge_wins"] += 1
+                self.stats["primary_elapsed_at_win"] += primary_elapsed
+                self.stats["max_seconds_saved"] += max(0.0, get_profile(task.url)["timing"]["url_budget"] - primary_elapsed)
+                logger.info("Hedged attempt won for %s after the first attempt had run %.1fs.", task.url, primary_elapsed)
+            for other in still_running:
+                other.cancel_event.set()
+                other.future.cancel()
+        task.future.set_result(record)
+
+    def _hedge_threshold(self):
+        if len(self._durations) < self._min_samples:
+            return None
+        ordered = sorted(self._durations)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self._percentile))]
+
+    def _check(self):
+        with self._lock:
+            threshold = self._hedge_threshold()
+            if threshold is None:
+                return
+            attempts = [attempt for task in self._tasks for attempt in task.attempts if not attempt.future.done()]
+            if any(attempt.started is None for attempt in attempts):
+                return  # Work is still queued, so there is no idle capacity to spend
+            idle = self._max_workers - len(attempts)
+            allowance = int(self._submitted * self._max_fraction) - self.stats["hedges_launched"]
+            if idle <= 0 or allowance <= 0:
+                return
+            now = time.monotonic()
+            candidates = sorted(
+                (task for task in self._tasks
+                 if len(task.attempts) == 1 and task.attempts[0].started is not None
+                 and now - task.attempts[0].started > threshold),
+                key=lambda task: task.attempts[0].started
+            )
+            for task in candidates[:min(idle, allowance)]:
+                logger.info("Hedging %s: running %.1fs, p%s is %.1fs.", task.url, now - task.attempts[0].started, int(self._percentile * 100), threshold)
+                self.stats["hedges_launched"] += 1
+                self._launch(task, hedge=True)
+
+    def _watch(self):
+        while not self._stop.wait(HEDGE_CHECK_INTERVAL):
+            try:
+                self._check()
+            except Exception as e:
+                logger.error("Hedge monitor error: %s", e, exc_info=True)
+
+    def close(self):
+        self._stop.set()
+        self._monitor.join()
+
+    def summary(self):
+        stats = self.stats
+        if not stats["hedges_launched"]:
+            return "No URLs were hedged."
+        hedge_rate = stats["hedges_launched"] / max(1, self._submitted)
+        text = (
+            f"Hedged {stats['hedges_launched']} of {self._submitted} URL(s) ({hedge_rate:.0%}), "
+            f"{stats['hedge_wins']} won by the duplicate, costing {stats['hedge_attempt_seconds']:.0f}s of extra browser time."
+        )
+        if stats["hedge_wins"]:
+            text += (
+                f" Winning duplicates finished while the first attempt had run {stats['primary_elapsed_at_win'] / stats['hedge_wins']:.1f}s "
+                f"on average; up to {stats['max_seconds_saved']:.0f}s of remaining URL budget was saved."
+            )
+        return text
@@ -0,0 +1,103 @@
+# listing_schema.py
+import dataclasses
+import json
+import re
+from dataclasses import dataclass
+
+from failures import classify_error
+
+MISSING_TEXT_VALUES = {"", "n/a", "na", "none", "null", "-", "unknown"}
+AI_FIELDS = (
+    'listing_title', 'project_name', 'price', 'area', 'state',
+    'sq_ft', 'bedrooms', 'bathrooms',
+    'property_type', 'carpark', 'floor_range',
+    'phone_number', 'description'
+)
+INTEGER_FIELDS = ('price', 'sq_ft', 'bedrooms', 'bathrooms', 'carpark')
+TEXT_FIELDS = tuple(field for field in AI_FIELDS if field not in INTEGER_FIELDS)
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+@dataclass(slots=True)
+class ListingRecord:
+    """One extracted listing. Field order matches COLUMN_ORDER; missing values are None."""
+    url: str
+    listing_title: str | None = None
+    project_name: str | None = None
+    price: int | None = None
+    area: str | None = None
+    state: str | None = None
+    sq_ft: int | None = None
+    bedrooms: int | None = None
+    bathrooms: int | None = None
+    property_type: str | None = None
+    carpark: int | None = None
+    floor_range: str | None = None
+    phone_number: str | None = None
+    description: str | None = None
+    processing_time_seconds: float | None = None
+    duplicate_of: str | None = None
+    partial: str | None = None
+    profile_path: str | None = None
+    error: str | None = None
+    error_class: str | None = None
+
+    @classmethod
+    def from_ai_dict(cls, data, url):
+        """Builds a record from a Gemini response object, coercing numbers and dropping placeholder values."""
+        if not isinstance(data, dict):
+            raise ValueError(f"AI output was not a JSON object (got {type(data).__name__}).")
+        values = {field: coerce_text(data.get(field)) for field in TEXT_FIELDS}
+        values.update({field: coerce_int(data.get(field)) for field in INTEGER_FIELDS})
+        return cls(url=url, **values)
+
+    @classmethod
+    def failed(cls, url, error, error_class=None):
+        return cls(url=url, error=error, error_class=error_class or classify_error(error))
+
+    def has_key_data(self):
+        return self.listing_title is not None or self.price is not None
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, text):
+        return cls(**json.loads(text))
+
+
+def coerce_text(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    return None if text.lower() in MISSING_TEXT_VALUES else text
+
+
+def coerce_int(value):
+    """Turns 1200000, '1,200,000', 'RM 2,300 / month', '3R' or 2.0 into an int; 0 and unparseable values become None."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = int(round(value))
+    else:
+        match = _NUMBER_PATTERN.search(str(value).replace(',', ''))
+        if not match:
+            return None
+        number = int(round(float(match.group())))
+    # The prompt asks Gemini for 0 when a number is missing.
+    return number if number > 0 else None
+
+
+# Gemini structured-output schema (OpenAPI subset) matching the AI-filled fields of ListingRecord.
+GEMINI_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        field: {"type": "INTEGER" if field in INTEGER_FIELDS else "STRING"}
+        for field in AI_FIELDS
+    },
+    "required": list(AI_FIELDS),
+}
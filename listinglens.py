@@ -1,37 +1,34 @@
 # listinglens.py
-import streamlit as st
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import (
-    TimeoutException, NoSuchElementException, ElementClickInterceptedException,
-    StaleElementReferenceException, WebDriverException
-)
+import time
+SCRIPT_START_TIME = time.perf_counter()
 
-import pandas as pd
+import streamlit as st
 import os
-import time
-import traceback
-import google.generativeai as genai
 import logging
-import json
 import concurrent.futures
-from urllib.parse import urlparse
+import itertools
+import zipfile
+
+from failures import RETRY_BACKOFF_SECONDS, retries_allowed
+from listing_schema import ListingRecord
+from profiling import collect_profile, trace_path
+from results_db import GROUP_COLUMNS, SORT_COLUMNS, ResultsDatabase
+from selector_health import selector_registry
+from structured_logging import configure_logging
+from harvester import is_supported_search_url, stream_harvest
+from url_canonical import ListingDeduplicator
+from url_ingest import (
+    SUPPORTED_UPLOAD_TYPES, IngestReport, guess_url_column, iter_upload_values, list_columns, validate_urls
+)
+from worker_pools import WORKER_MODE, close_thread_drivers, make_worker_pool, max_in_flight
 
 # --- Logging Configuration ---
-log_file = 'property_scraper.log'
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# --- Constants ---
+HEDGING_ENABLED = os.environ.get("LISTINGLENS_HEDGING", "0") == "1"  # Thread mode only
+
 # --- Configuration ---
 try:
     GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
@@ -45,500 +42,29 @@ except KeyError:
     st.stop()
 except Exception as e:
     st.error(f"Error accessing Streamlit Secrets: {e}")
-    logger.error(f"Error accessing Streamlit Secrets: {e}", exc_info=True)
+    logger.error("Error accessing Streamlit Secrets: %s", e, exc_info=True)
     st.stop()
 
-# --- Constants ---
-MAX_CONCURRENT_WORKERS = 5
-
-PAGE_LOAD_TIMEOUT = 15
-BUTTON_WAIT_TIMEOUT = 2
-POST_CLICK_DELAY = 1
-POST_EXPANSION_CLICK_DELAY = 1
-DELAY_BEFORE_POST_EXPANSION_SEARCH = 1
-SECOND_EXPANSION_CLICK_DELAY = 1
-POST_SECOND_EXPANSION_CLICK_DELAY = 1
-
-COLUMN_ORDER = [
-    'url', 'listing_title', 'project_name', 'price', 'area', 'state',
-    'sq_ft', 'bedrooms', 'bathrooms',
-    'property_type', 'carpark', 'floor_range',
-    'phone_number', 'description',
-    'processing_time_seconds', 'error'
-]
-
-target_css_selectors = [
-        "div.Wrapper-ucve63-0.eKOxHS", # Contact Owner block
-        "div.style__ParentWrapper-iwjn3z-0.QvHGM", # Listing Details block
-        "div.Wrapper-ucve63-0.fKaMDx", # Description block
-        "div.Box-bx23rg-0.Flex-sc-9pwi7j-0.Wrapper-ucve63-0.kCBBkT" #Property Details
-]
-
-# --- Gemini API Initialization ---
-try:
-    genai.configure(api_key=GOOGLE_API_KEY)
-    logger.info("Gemini API configured successfully.")
-except Exception as e:
-    st.error(f"Failed to configure Gemini API: {e}")
-    logger.error(f"Failed to configure Gemini API: {e}", exc_info=True)
-    st.stop()
-
-# --- Selenium Options ---
-chrome_options = Options()
-chrome_options.page_load_strategy = 'eager'
-chrome_options.add_argument("--headless")
-chrome_options.add_argument("--disable-gpu")
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-chrome_options.add_argument("user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.212 Safari/537.36")
-chrome_options.add_argument("--window-size=1920,1080")
-chrome_options.add_argument("--log-level=3")
-chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-chrome_options.add_argument('--disable-infobars')
-chrome_options.add_argument('--disable-extensions')
-chrome_options.binary_location = "/usr/bin/chromium"
-
-# --- Helper Functions ---
-def format_elapsed_time(start_time: float) -> str:
-    elapsed = time.time() - start_time
-    return f"[+{elapsed:.2f}s]"
-
-def click_button(driver, button_element, xpath_description, wait_timeout, post_click_delay, start_time_for_logging, click_attempt_description=""):
-    clicked = False
-    btn_text = "(unknown)"
-    try:
-        if button_element and button_element.is_displayed() and button_element.is_enabled():
-            button_to_click = WebDriverWait(driver, wait_timeout).until(
-                EC.element_to_be_clickable((By.XPATH, xpath_description))
-            )
-            try:
-                button_to_click = driver.find_element(By.XPATH, xpath_description)
-                btn_text = button_to_click.text.strip().replace('\n', ' ')[:50]
-            except StaleElementReferenceException:
-                btn_text = "(stale element)"
-                try:
-                    time.sleep(0.5)
-                    button_to_click = driver.find_element(By.XPATH, xpath_description)
-                    btn_text = button_to_click.text.strip().replace('\n', ' ')[:50]
-                except Exception:
-                     btn_text = "(stale element - retry failed)"
-            except Exception:
-                btn_text = "(error getting text)"
-            try:
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button_to_click)
-                time.sleep(0.5)
-                driver.execute_script("arguments[0].click();", button_to_click)
-                clicked = True
-                print(f"{format_elapsed_time(start_time_for_logging)}     {click_attempt_description}Clicked button: '{btn_text}' using XPath: {xpath_description}")
-                logger.info(f"{click_attempt_description}Clicked button: '{btn_text}' using XPath: {xpath_description}")
-                time.sleep(post_click_delay)
-                print(f"{format_elapsed_time(start_time_for_logging)}     Post-click delay ({post_click_delay}s) finished for '{btn_text}'.")
-            except StaleElementReferenceException:
-                 print(f"{format_elapsed_time(start_time_for_logging)}     StaleElementReferenceException during JS click for XPath: {xpath_description}. Re-finding...")
-                 logger.warning(f"StaleElementReferenceException during JS click for XPath: {xpath_description}. Re-finding...")
-                 try:
-                     time.sleep(0.5)
-                     button_fresh = driver.find_element(By.XPATH, xpath_description)
-                     driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button_fresh)
-                     time.sleep(0.5)
-                     driver.execute_script("arguments[0].click();", button_fresh)
-                     clicked = True
-                     print(f"{format_elapsed_time(start_time_for_logging)}     {click_attempt_description}Clicked button (after re-find): '{btn_text}' using XPath: {xpath_description}")
-                     logger.info(f"{click_attempt_description}Clicked button (after re-find): '{btn_text}' using XPath: {xpath_description}")
-                     time.sleep(post_click_delay)
-                     print(f"{format_elapsed_time(start_time_for_logging)}     Post-click delay ({post_click_delay}s) finished for '{btn_text}'.")
-                 except Exception as e_retry_click:
-                     print(f"{format_elapsed_time(start_time_for_logging)}     Error clicking button after re-find for XPath '{xpath_description}': {type(e_retry_click).__name__}")
-                     logger.error(f"Error clicking button after re-find for XPath '{xpath_description}': {type(e_retry_click).__name__}")
-            except Exception as e_js_click:
-                 print(f"{format_elapsed_time(start_time_for_logging)}     Error during JS click for XPath '{xpath_description}': {type(e_js_click).__name__}")
-                 logger.error(f"Error during JS click for XPath '{xpath_description}': {type(e_js_click).__name__}")
-    except TimeoutException:
-        print(f"{format_elapsed_time(start_time_for_logging)}     Timeout waiting for button to be clickable (Timeout: {wait_timeout}s) for XPath: {xpath_description}")
-        logger.warning(f"Timeout waiting for button to be clickable (Timeout: {wait_timeout}s) for XPath: {xpath_description}")
-        pass
-    except StaleElementReferenceException:
-        print(f"{format_elapsed_time(start_time_for_logging)}     StaleElementReferenceException checking/waiting for button with XPath: {xpath_description}. Page might have updated.")
-        logger.warning(f"StaleElementReferenceException checking/waiting for button with XPath: {xpath_description}.")
-        pass
-    except NoSuchElementException:
-        print(f"{format_elapsed_time(start_time_for_logging)}     NoSuchElementException when trying to re-find button for clickability check/JS click: {xpath_description}.")
-        logger.warning(f"NoSuchElementException when trying to re-find button for clickability check/JS click: {xpath_description}.")
-        pass
-    except ElementClickInterceptedException:
-        print(f"{format_elapsed_time(start_time_for_logging)}     ElementClickInterceptedException for button with XPath: {xpath_description}. Another element may be blocking.")
-        logger.warning(f"ElementClickInterceptedException for button with XPath: {xpath_description}.")
-        pass
-    except Exception as e_click:
-        print(f"{format_elapsed_time(start_time_for_logging)}     Error clicking button instance with XPath '{xpath_description}': {type(e_click).__name__} - {e_click}")
-        logger.error(f"Error clicking button instance with XPath '{xpath_description}': {type(e_click).__name__} - {e_click}")
-        pass
-    return clicked, btn_text
-
-def extract_property_details(html_content, listing_url):
-    if not html_content or html_content.isspace():
-        logger.warning(f"HTML content provided to Gemini for {listing_url} is empty or whitespace. Skipping AI extraction.")
-        return json.dumps({"url": listing_url, "error": "No HTML content extracted from page to analyze."})
-    logger.info(f"Attempting to extract details using Gemini for URL: {listing_url}")
-    gemini_start_time = time.perf_counter()
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        prompt = f"""
-        You are an expert property data extractor. Analyze the following HTML content from a property listing website
-        (potentially combined from several relevant sections like description, details, contact, and property specifics)
-        and extract the following information in a JSON format:
-
-        - listing_title: The full title of the property listing as it appears. Look in <title> tags or main headings (h1, h2). If not found, return "N/A".
-        - project_name: The specific building, condo, or project name IF clearly identifiable within the title or description (e.g., "Winner Court A", "Cubic Botanical", "Sky Residences"). If not clear or just a general area name, return "N/A".
-        - area: The area/location (e.g., "Desa Petaling", "Bangsar South", "Damansara"). Look for location indicators near the title or in details sections. If not found, return "N/A".
-        - state: The state (e.g., "Kuala Lumpur", "Selangor", "Johor"). Look for location indicators. If not found, return "N/A".
-        - price: The listed price (for sale) or rent per month (for rent) as a number (integer). Remove currency symbols (like RM), commas, and text like "/ month" or "per month". If not found or cannot be converted to a number, return 0. Prioritize the main listed price.
-        - sq_ft: The size in square feet as a number (integer). Remove "sq.ft.", "sf", etc. If not found or cannot be converted, return 0.
-        - bedrooms: The number of bedrooms as a number (integer). Look for labels like "Bedrooms", "Beds", or patterns like "3R". If not found or cannot be converted, return 0.
-        - bathrooms: The number of bathrooms as a number (integer). Look for labels like "Bathrooms", "Baths", or patterns like "2B". If not found or cannot be converted, return 0.
-        - property_type: The type of property (e.g., "Condominium", "Serviced Residence", "Bungalow"). Look for labels like "Property Type". If not found, return "N/A". # <<< ADD THIS
-        - carpark: The number of car park spaces as a number (integer). Look for labels like "Carpark", "Parking". If not found or cannot be converted, return 0. # <<< ADD THIS
-        - floor_range: The floor range (e.g., "High", "Mid", "Low", "5-10"). Look for labels like "Floor Range". If not found, return "N/A". # <<< ADD THIS
-        - phone_number: The contact phone number. Look carefully, it might have been revealed after a button click in the original HTML (and thus present in the provided HTML, potentially multiple times). Extract the first clear phone number found (digits, possibly with +, -, or spaces). If not found, return "N/A".
-        - description: A concise summary of the property description. Look for description blocks, meta description tags, or sections labeled 'Description'. Include key details, even those potentially revealed after clicking 'show more' in the original page (which should be in the provided HTML). If not found, return "N/A".
-
-        Return ONLY the data in a valid JSON object format. Do not include ```json markdown wrappers or any text before or after the JSON object itself. Ensure all keys are present, using "N/A" or 0 as specified for missing values.
-
-        Example of the desired JSON output format:
-        {{
-          "listing_title": "Luxury Condo with KLCC View",
-          "project_name": "Sky Residences",
-          "area": "Ampang Hilir",
-          "state": "Kuala Lumpur",
-          "price": 1200000,
-          "sq_ft": 1500,
-          "bedrooms": 3,
-          "bathrooms": 2,
-          "property_type": "Condominium",
-          "carpark": 2,
-          "floor_range": "High",
-          "phone_number": "0123456789",
-          "description": "Fully furnished 3-bedroom unit at Sky Residences. High floor with stunning KLCC view. Includes 2 car parks. Available now."
-        }}
-
-        HTML Content:
-        ```html
-        {html_content}
-        ```
-        """
-        response = model.generate_content(prompt)
-        json_string = response.text.strip().strip('```json').strip('```').strip()
-        logger.debug(f"Raw Gemini response for {listing_url}: {json_string[:500]}...")
-        try:
-            data = json.loads(json_string)
-            if isinstance(data, dict):
-                 data['url'] = listing_url
-                 gemini_duration = time.perf_counter() - gemini_start_time
-                 logger.info(f"Gemini extraction successful and parsed for {listing_url} in {gemini_duration:.2f} seconds.")
-                 return json.dumps(data)
-            else:
-                 logger.warning(f"Gemini output for {listing_url} was not a dictionary after parsing: {json_string}")
-                 return json.dumps({"url": listing_url, "error": "AI output was not a valid JSON object."})
-        except json.JSONDecodeError as json_err:
-             logger.error(f"Failed to parse Gemini JSON response for {listing_url}: {json_err}. Response: {json_string}", exc_info=True)
-             return json.dumps({"url": listing_url, "error": f"Failed to parse AI response: {json_err}. Raw response: {json_string[:200]}..."})
-        except Exception as add_url_err:
-             logger.error(f"Error adding URL to Gemini result for {listing_url}: {add_url_err}", exc_info=True)
-             return json.dumps({"url": listing_url, "error": f"Internal error processing AI result: {add_url_err}"})
-    except Exception as e:
-        gemini_duration = time.perf_counter() - gemini_start_time
-        logger.error(f"Gemini extraction failed for {listing_url} after {gemini_duration:.2f} seconds: {e}", exc_info=True)
-        error_msg = f"Gemini API call failed: {str(e)}".replace('"', "'")
-        return json.dumps({"url": listing_url, "error": error_msg})
-
-def scrape_targeted_sections(url: str, target_selectors: list[str]):
-    logger.info(f"Processing URL: {url}")
-    print(f"Processing URL: {url}")
-    driver = None
-    start_time = time.time()
-    result = {"url": url, "extracted_data": {selector: [] for selector in target_selectors}, "error": None, "raw_error": None}
-
-    initial_button_xpaths = [
-        "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'view number')]",
-        "//a[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show more')]",
-        "//span[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'view number')]",
-    ]
-    expansion_button_texts = ["show more"]
-    post_expansion_contact_xpaths = [
-         "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show contact number')]",
-         "//a[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show contact number')]"
-    ]
-
-    try:
-        print(f"{format_elapsed_time(start_time)} Initializing WebDriver for Streamlit Cloud...")
-        service = Service(executable_path="/usr/bin/chromedriver")
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
-        print(f"{format_elapsed_time(start_time)} WebDriver initialized.")
-
-        print(f"{format_elapsed_time(start_time)} Loading page (Timeout: {PAGE_LOAD_TIMEOUT}s)...")
-        driver.get(url)
-        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
-            EC.presence_of_element_located((By.TAG_NAME, 'body'))
-        )
-        print(f"{format_elapsed_time(start_time)} Page loaded.")
-        initial_settle_delay = 2.0
-        print(f"{format_elapsed_time(start_time)} Allowing {initial_settle_delay}s for initial elements to settle...")
-        time.sleep(initial_settle_delay)
-        print(f"{format_elapsed_time(start_time)} Post-load delay finished.")
-
-        print(f"{format_elapsed_time(start_time)} Attempting to click initial reveal/expansion buttons...")
-        initial_click_attempts = 0
-        clicked_initial_button_texts = []
-        expansion_buttons_clicked = []
-        for xpath in initial_button_xpaths:
-            is_expansion_xpath = any(txt in xpath.lower() for txt in expansion_button_texts)
-            try:
-                potential_buttons = WebDriverWait(driver, BUTTON_WAIT_TIMEOUT).until(
-                    EC.presence_of_all_elements_located((By.XPATH, xpath))
-                )
-                if not potential_buttons: continue
-                for i, button in enumerate(potential_buttons):
-                    if not isinstance(button, webdriver.remote.webelement.WebElement):
-                         print(f"{format_elapsed_time(start_time)}     Skipping invalid element found for XPath '{xpath}' at index {i}.")
-                         continue
-                    specific_xpath = f"({xpath})[{i+1}]"
-                    try:
-                        clicked, btn_text = click_button(driver, button, specific_xpath, BUTTON_WAIT_TIMEOUT, POST_CLICK_DELAY, start_time, click_attempt_description="(Attempt 1) ")
-                        if clicked:
-                            initial_click_attempts += 1
-                            clicked_initial_button_texts.append(f"'{btn_text}...'")
-                            if is_expansion_xpath:
-                                expansion_buttons_clicked.append(specific_xpath)
-                    except Exception as e_inner_click:
-                         print(f"{format_elapsed_time(start_time)}     Error processing button {i+1} for XPath '{xpath}': {type(e_inner_click).__name__}")
-                         logger.error(f"Error processing button {i+1} for XPath '{xpath}': {type(e_inner_click).__name__}")
-            except TimeoutException:
-                 print(f"{format_elapsed_time(start_time)}   Timeout waiting for initial buttons for XPath '{xpath}' (Wait: {BUTTON_WAIT_TIMEOUT}s).")
-                 logger.warning(f"Timeout waiting for initial buttons for XPath '{xpath}' (Wait: {BUTTON_WAIT_TIMEOUT}s).")
-            except StaleElementReferenceException:
-                 print(f"{format_elapsed_time(start_time)}   StaleElementReferenceException while finding initial buttons for XPath '{xpath}'. Skipping rest for this XPath.")
-                 logger.warning(f"StaleElementReferenceException while finding initial buttons for XPath '{xpath}'.")
-            except Exception as e_find:
-                 print(f"{format_elapsed_time(start_time)}   Error finding/processing elements with initial XPath '{xpath}': {type(e_find).__name__} - {e_find}")
-                 logger.error(f"Error finding/processing elements with initial XPath '{xpath}': {type(e_find).__name__} - {e_find}")
-
-        if expansion_buttons_clicked:
-            print(f"{format_elapsed_time(start_time)} Pausing {SECOND_EXPANSION_CLICK_DELAY}s before attempting second click...")
-            time.sleep(SECOND_EXPANSION_CLICK_DELAY)
-            print(f"{format_elapsed_time(start_time)} Attempting second click on {len(expansion_buttons_clicked)} expansion button(s)...")
-            second_click_success_count = 0
-            for specific_xpath in expansion_buttons_clicked:
-                try:
-                    button_element_for_second_click = WebDriverWait(driver, BUTTON_WAIT_TIMEOUT).until(
-                        EC.presence_of_element_located((By.XPATH, specific_xpath))
-                    )
-                    clicked, btn_text = click_button(driver, button_element_for_second_click, specific_xpath, BUTTON_WAIT_TIMEOUT, POST_SECOND_EXPANSION_CLICK_DELAY, start_time, click_attempt_description="(Attempt 2) ")
-                    if clicked:
-                        second_click_success_count += 1
-                        print(f"{format_elapsed_time(start_time)}     Successfully performed second click on: '{btn_text}'")
-                        logger.info(f"Successfully performed second click on: '{btn_text}' XPath: {specific_xpath}")
-                except TimeoutException:
-                    print(f"{format_elapsed_time(start_time)}     Expansion button timed out before second click (Wait: {BUTTON_WAIT_TIMEOUT}s): {specific_xpath}")
-                    logger.warning(f"Expansion button timed out before second click (Wait: {BUTTON_WAIT_TIMEOUT}s): {specific_xpath}")
-                except NoSuchElementException:
-                    print(f"{format_elapsed_time(start_time)}     Could not re-find expansion button for second click: {specific_xpath}")
-                    logger.warning(f"Could not re-find expansion button for second click: {specific_xpath}")
-                except Exception as e_second_click:
-                    print(f"{format_elapsed_time(start_time)}     Error during second click attempt for XPath '{specific_xpath}': {type(e_second_click).__name__}")
-                    logger.error(f"Error during second click attempt for XPath '{specific_xpath}': {type(e_second_click).__name__}")
-            if second_click_success_count > 0:
-                 print(f"{format_elapsed_time(start_time)} Second click attempted successfully on {second_click_success_count} expansion button(s).")
-
-        if initial_click_attempts > 0:
-            print(f"{format_elapsed_time(start_time)} Initial click phase completed. Clicked: {', '.join(clicked_initial_button_texts)}")
-        else:
-            print(f"{format_elapsed_time(start_time)} No initial reveal/expansion buttons found or clicked.")
-
-        print(f"{format_elapsed_time(start_time)} Pausing {DELAY_BEFORE_POST_EXPANSION_SEARCH}s before post-expansion search...")
-        time.sleep(DELAY_BEFORE_POST_EXPANSION_SEARCH)
-        print(f"{format_elapsed_time(start_time)} Pause finished.")
-
-        print(f"{format_elapsed_time(start_time)} Attempting to click post-expansion contact buttons...")
-        post_expansion_clicks = 0
-        clicked_post_expansion_texts = []
-        for xpath in post_expansion_contact_xpaths:
-             try:
-                potential_buttons = WebDriverWait(driver, BUTTON_WAIT_TIMEOUT).until(
-                    EC.presence_of_all_elements_located((By.XPATH, xpath))
-                )
-                if not potential_buttons: continue
-                for i, button in enumerate(potential_buttons):
-                    if not isinstance(button, webdriver.remote.webelement.WebElement):
-                         print(f"{format_elapsed_time(start_time)}     Skipping invalid post-expansion element found for XPath '{xpath}' at index {i}.")
-                         continue
-                    specific_xpath = f"({xpath})[{i+1}]"
-                    try:
-                        clicked, btn_text = click_button(driver, button, specific_xpath, BUTTON_WAIT_TIMEOUT, POST_EXPANSION_CLICK_DELAY, start_time)
-                        if clicked:
-                             post_expansion_clicks += 1
-                             clicked_post_expansion_texts.append(f"'{btn_text}...'")
-                    except Exception as e_inner_click:
-                         print(f"{format_elapsed_time(start_time)}     Error processing post-expansion button {i+1} for XPath '{xpath}': {type(e_inner_click).__name__}")
-                         logger.error(f"Error processing post-expansion button {i+1} for XPath '{xpath}': {type(e_inner_click).__name__}")
-             except TimeoutException:
-                 print(f"{format_elapsed_time(start_time)}   Timeout waiting for post-expansion buttons for XPath '{xpath}' (Wait: {BUTTON_WAIT_TIMEOUT}s).")
-                 logger.warning(f"Timeout waiting for post-expansion buttons for XPath '{xpath}' (Wait: {BUTTON_WAIT_TIMEOUT}s).")
-             except StaleElementReferenceException:
-                 print(f"{format_elapsed_time(start_time)}   StaleElementReferenceException while finding post-expansion buttons for XPath '{xpath}'.")
-                 logger.warning(f"StaleElementReferenceException while finding post-expansion buttons for XPath '{xpath}'.")
-             except Exception as e_find:
-                 print(f"{format_elapsed_time(start_time)}   Error finding/processing elements with post-expansion XPath '{xpath}': {type(e_find).__name__} - {e_find}")
-                 logger.error(f"Error finding/processing elements with post-expansion XPath '{xpath}': {type(e_find).__name__} - {e_find}")
-
-        if post_expansion_clicks > 0:
-            print(f"{format_elapsed_time(start_time)} Clicked {post_expansion_clicks} post-expansion button(s): {', '.join(clicked_post_expansion_texts)}")
-        else:
-            print(f"{format_elapsed_time(start_time)} No post-expansion contact buttons found or clicked.")
-
-        print(f"{format_elapsed_time(start_time)} Extracting content from target selectors...")
-        if not target_selectors:
-             print(f"{format_elapsed_time(start_time)} Warning: No target selectors provided.")
-             logger.warning(f"No target CSS selectors provided for URL: {url}")
-        extraction_start_time = time.time()
-        extracted_html_dict = result["extracted_data"]
-        extraction_wait_timeout = 10
-        for i, selector in enumerate(target_selectors):
-            selector_start_time = time.time()
-            try:
-                WebDriverWait(driver, extraction_wait_timeout).until(
-                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
-                )
-                elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                if elements:
-                    print(f"{format_elapsed_time(start_time)}   Found {len(elements)} element(s) for selector: '{selector}' (took {time.time() - selector_start_time:.2f}s)")
-                    for element_index, element in enumerate(elements):
-                        try:
-                            if element.is_displayed():
-                                outer_html = element.get_attribute('outerHTML')
-                                if outer_html:
-                                    extracted_html_dict[selector].append(outer_html.strip())
-                        except StaleElementReferenceException:
-                             print(f"{format_elapsed_time(start_time)}     Stale element {element_index+1} encountered getting HTML for selector '{selector}'. Skipping.")
-                             logger.warning(f"Stale element {element_index+1} encountered for selector '{selector}'.")
-                        except Exception as e_html:
-                             print(f"{format_elapsed_time(start_time)}     Error getting HTML for element {element_index+1} selector '{selector}': {type(e_html).__name__}")
-                             logger.error(f"Error getting HTML for element {element_index+1} selector '{selector}': {type(e_html).__name__}")
-            except TimeoutException:
-                 print(f"{format_elapsed_time(start_time)}   Timeout waiting {extraction_wait_timeout}s for elements for selector: '{selector}' (after {time.time() - selector_start_time:.2f}s)")
-                 logger.warning(f"Timeout waiting {extraction_wait_timeout}s for elements for selector: '{selector}'")
-            except Exception as e:
-                print(f"{format_elapsed_time(start_time)}   Error finding elements for selector '{selector}': {type(e).__name__} - {e} (after {time.time() - selector_start_time:.2f}s)")
-                logger.error(f"Error finding elements for selector '{selector}': {type(e).__name__} - {e}")
-        print(f"{format_elapsed_time(start_time)} Finished extraction phase (took {time.time() - extraction_start_time:.2f}s)")
-        if not any(extracted_html_dict.values()):
-            print(f"{format_elapsed_time(start_time)} Warning: No HTML content was extracted from any target selectors.")
-            logger.warning(f"No HTML content extracted for any target selector for URL: {url}")
-
-    except WebDriverException as e:
-        raw_err_msg = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
-        if "net::ERR_CONNECTION_REFUSED" in str(e) or "unable to connect to renderer" in str(e) or "DevToolsActivePort file doesn't exist" in str(e):
-            err_msg = f"WebDriver Error (Cloud Env): Potential issue connecting to the browser instance. Check `packages.txt` & resources. Details: {type(e).__name__}"
-        else:
-            err_msg = f"WebDriver Error: {type(e).__name__} - Check Selenium setup/options. Error: {e}"
-        print(f"{format_elapsed_time(start_time)} ERROR: {err_msg}")
-        logger.error(f"WebDriver error during scraping for {url}: {err_msg}", exc_info=True)
-        result["error"] = f"WebDriver setup/runtime error: {type(e).__name__}"
-        result["raw_error"] = raw_err_msg
-    except TimeoutException as e:
-        raw_err_msg = f"Message: {getattr(e, 'msg', 'N/A')}\nStacktrace:\n{getattr(e, 'stacktrace', 'N/A')}"
-        err_msg = f"Timeout occurred during page load or element wait (Check PAGE_LOAD_TIMEOUT: {PAGE_LOAD_TIMEOUT}s or other waits). Details: {e.msg}"
-        print(f"{format_elapsed_time(start_time)} ERROR: {err_msg}")
-        logger.error(f"Timeout error during scraping for {url}: {err_msg}\nRaw Error: {raw_err_msg}", exc_info=False)
-        result["error"] = err_msg
-        result["raw_error"] = raw_err_msg
-    except Exception as e:
-        raw_err_msg = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
-        err_msg = f"An unexpected error occurred during scraping: {type(e).__name__} - {e}"
-        print(f"{format_elapsed_time(start_time)} ERROR: {err_msg}")
-        logger.error(f"Unexpected error during scraping for {url}: {err_msg}", exc_info=True)
-        result["error"] = f"Unexpected scraping error: {type(e).__name__}"
-        result["raw_error"] = raw_err_msg
-    finally:
-        if driver:
-            print(f"{format_elapsed_time(start_time)} Closing WebDriver...")
-            try:
-                driver.quit()
-                print(f"{format_elapsed_time(start_time)} WebDriver closed.")
-            except Exception as quit_err:
-                 print(f"{format_elapsed_time(start_time)} Error quitting WebDriver: {quit_err}")
-                 logger.error(f"Error quitting WebDriver for {url}: {quit_err}", exc_info=True)
-
-    total_time = time.time() - start_time
-    print(f"Finished processing {url} in {total_time:.2f} seconds.")
-    logger.info(f"Finished scraping {url} in {total_time:.2f} seconds. Error: {result['error']}")
-    return result
-
-def process_url(url):
-    process_start_time = time.perf_counter()
-    logger.info(f"Processing URL: {url}")
-    result_dict = {"url": url}
-
-    scrape_result = scrape_targeted_sections(url, target_css_selectors)
-
-    scraper_error = scrape_result.get("error")
-    if scraper_error:
-        logger.error(f"Scraping failed for {url}: {scraper_error}")
-        result_dict["error"] = f"Scraping failed: {scraper_error}"
-    else:
-        extracted_data = scrape_result.get("extracted_data", {})
-        all_html_parts = []
-        for selector, html_list in extracted_data.items():
-            if html_list:
-                all_html_parts.extend(html_list)
-
-        if not all_html_parts:
-            logger.warning(f"No HTML content was extracted by selectors for {url}. Cannot proceed with AI analysis.")
-            result_dict["error"] = "No relevant HTML content found on page by selectors."
-        else:
-            combined_html = "\n\n".join(all_html_parts)
-            logger.info(f"Scraping completed for {url}, combined HTML length: {len(combined_html)}. Proceeding to AI extraction.")
-
-            json_data_string = extract_property_details(combined_html, url)
-
-            if json_data_string:
-                logger.info(f"Received AI response for {url}.")
-                try:
-                    data_dict = json.loads(json_data_string)
-                    if isinstance(data_dict, dict):
-                        result_dict.update(data_dict)
-                        ai_error = result_dict.get("error")
-                        if ai_error:
-                            logger.error(f"AI extraction error for {url}: {ai_error}")
-                        else:
-                            if "error" in result_dict and not result_dict["error"]:
-                                del result_dict["error"]
-                            logger.info(f"Successfully extracted data for {url}.")
-                    else:
-                        logger.error(f"Parsed JSON from AI is not a dictionary for {url}: {data_dict}")
-                        result_dict["error"] = "AI response was not in the expected dictionary format."
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSONDecodeError processing AI response for {url}: {e}. Raw response: {json_data_string[:500]}...", exc_info=True)
-                    result_dict["error"] = f"Failed to parse AI response: {e}"
-                except Exception as e:
-                    logger.error(f"Unexpected error processing AI result for {url}: {e}", exc_info=True)
-                    result_dict["error"] = f"Internal processing error after AI: {e}"
-            else:
-                logger.error(f"No response string received from AI extraction function for {url}.")
-                result_dict["error"] = "Failed to get response from AI service function."
-
-    process_end_time = time.perf_counter()
-    duration = process_end_time - process_start_time
-    result_dict["processing_time_seconds"] = round(duration, 2)
-    logger.info(f"Finished processing {url} in {duration:.2f} seconds.")
-
-    if "error" not in result_dict and not all(k in result_dict for k in ['listing_title', 'price']):
-         if not scraper_error and not all_html_parts:
-             result_dict["error"] = "Processing completed but key data might be missing (No HTML found)."
-         elif not scraper_error:
-             result_dict["error"] = "Processing completed but key data might be missing (AI extraction likely failed)."
-
-    return result_dict
+# --- Cached Resources ---
+# Selenium, pandas and google.generativeai are only imported once a batch starts; the configured
+# pipeline module (Gemini client + Chrome options) is then shared by every rerun and session.
+@st.cache_resource(show_spinner=False)
+def load_pipeline(api_key):
+    import_start_time = time.perf_counter()
+    import pipeline
+    import_duration = time.perf_counter() - import_start_time
+    pipeline.configure_gemini(api_key)
+    pipeline.get_chrome_options()
+    logger.info("Pipeline imported in %.2fs and initialized in %.2fs.", import_duration, time.perf_counter() - import_start_time)
+    return pipeline
+
+@st.cache_resource(show_spinner=False)
+def load_results_db():
+    return ResultsDatabase()
+
+@st.cache_data(show_spinner=False)
+def minified_style(style):
+    return " ".join(line.strip() for line in style.splitlines() if line.strip())
 
 # --- Streamlit App ---
 st.set_page_config(page_title="ListingLens - Property Extractor", layout="wide")
@@ -633,7 +159,7 @@ app_style = """
         div[data-testid="stStatusWidget"] {visibility: hidden;}
     </style>
 """
-st.markdown(app_style, unsafe_allow_html=True)
+st.markdown(minified_style(app_style), unsafe_allow_html=True)
 
 st.title("🏠 ListingLens Property Extractor")
 st.markdown("Welcome to ListingLens! Paste property listing web addresses (one per line) below. The tool will visit each page, attempt to reveal hidden details, extract relevant sections, use AI to analyze the content, and present key details in a table. You can download successful results as a CSV file.")
@@ -649,108 +175,301 @@ urls_input = st.text_area(
     )
 )
 
+uploaded_file = st.file_uploader(
+    "...or upload a file of listing URLs (CSV, TXT or XLSX):",
+    type=SUPPORTED_UPLOAD_TYPES
+)
+url_column = None
+if uploaded_file is not None:
+    upload_columns = list_columns(uploaded_file, uploaded_file.name)
+    if upload_columns:
+        url_column = st.selectbox("Column containing the listing URLs:", upload_columns, index=guess_url_column(upload_columns))
+
+search_url_input = st.text_input(
+    "...or harvest every listing from a search results page (mudah.my, iproperty.com.my, edgeprop.my):",
+    placeholder="e.g., https://www.mudah.my/kuala-lumpur/apartment-condominium-for-rent"
+).strip()
+skip_known_listings = st.checkbox(
+    "Skip harvested listings already in the results database", value=True, disabled=not search_url_input
+)
+
+if not st.session_state.get("first_paint_logged"):
+    st.session_state["first_paint_logged"] = True
+    logger.info("First paint after %.3fs.", time.perf_counter() - SCRIPT_START_TIME)
+
 if st.button("🔍 Extract Details from URLs", type="primary"):
     batch_start_time = time.perf_counter()
 
-    raw_urls = [url.strip() for url in urls_input.splitlines() if url.strip()]
-    valid_urls = []
-    invalid_inputs = []
-    for url in raw_urls:
-        try:
-            result = urlparse(url)
-            if all([result.scheme in ['http', 'https'], result.netloc]):
-                valid_urls.append(url)
-            else:
-                invalid_inputs.append(f"'{url}' (invalid format)")
-        except ValueError:
-            invalid_inputs.append(f"'{url}' (could not parse)")
-
-    if invalid_inputs:
-        st.warning(f"⚠️ Some inputs were not valid web addresses and will be ignored: {', '.join(invalid_inputs)}")
-
-    if not valid_urls:
+    ingest_report = IngestReport()
+    harvesting = False
+    if uploaded_file is not None:
+        raw_values = iter_upload_values(uploaded_file, uploaded_file.name, url_column)
+    elif search_url_input:
+        if not is_supported_search_url(search_url_input):
+            st.warning("⚠️ Harvesting is only available for search pages on supported property sites.")
+            st.stop()
+        harvesting = True
+        is_known = load_results_db().has if skip_known_listings else None
+        # Later result pages keep being fetched while the listings already found are being extracted.
+        raw_values = stream_harvest(search_url_input, is_known=is_known)
+    else:
+        raw_values = urls_input.splitlines()
+    valid_url_iter = validate_urls(raw_values, ingest_report)
+    first_url = next(valid_url_iter, None)
+
+    if first_url is None and harvesting:
+        st.info("ℹ️ No new listings were found on that search page.")
+    elif first_url is None:
+        if ingest_report.invalid_count:
+            st.warning(f"⚠️ Some inputs were not valid web addresses and will be ignored: {ingest_report.summary()} Examples: {', '.join(ingest_report.invalid_samples)}")
         st.warning("⚠️ Please enter at least one valid web address (URL) starting with http:// or https://.")
     else:
-        total_urls = len(valid_urls)
-        st.info(f"Starting extraction for {total_urls} web address(es)...")
-        logger.info(f"User initiated extraction for {total_urls} valid URLs. Max workers: {MAX_CONCURRENT_WORKERS}")
-
-        all_results = []
+        try:
+            pipeline = load_pipeline(GOOGLE_API_KEY)
+        except Exception as e:
+            st.error(f"Failed to configure Gemini API: {e}")
+            logger.error("Failed to configure Gemini API: %s", e, exc_info=True)
+            st.stop()
+        import pandas as pd
+        from normalization import DERIVED_FIELDS
+        from results_store import ResultStore
+        MAX_CONCURRENT_WORKERS = pipeline.MAX_CONCURRENT_WORKERS
+        COLUMN_ORDER = pipeline.COLUMN_ORDER
+        submission_window = max_in_flight(MAX_CONCURRENT_WORKERS)
+
+        st.info("Starting extraction. Addresses are queued as they are read, so work begins before the whole input is parsed...")
+        logger.info("User initiated extraction. Max workers: %s (%s mode)", MAX_CONCURRENT_WORKERS, WORKER_MODE)
+
+        results_db = load_results_db()
+        batch_id = time.strftime('%Y%m%d-%H%M%S')
+        success_store = ResultStore("property_data_successful", on_batch=lambda batch: results_db.add_batch(batch, batch_id))
+        failure_store = ResultStore("property_data_failed", directory=success_store.directory)
         progress_bar = st.progress(0.0)
         status_text = st.empty()
         processed_count = 0
-
-        spinner_message = f"⚙️ Processing {total_urls} address(es)... This may take a few minutes."
+        submitted_count = 0
+        deduplicator = ListingDeduplicator()
+        retry_lane = []  # (key, attempt, error_class) of transient failures, re-run once the main batch drains
+        retried_keys = set()
+        recovered_count = 0
+        profiled = []
+        profile_dir = os.path.join(success_store.directory, "profiles")
+        collected_profiles = {}  # Worker-side profile path -> its path next to this batch's results
+        repost_originals = {}  # duplicate_of URL -> number of reposts that reused its extraction
+
+        def store_result(result):
+            if result.profile_path:
+                # Fanned-out duplicates share one profile; move it once.
+                if result.profile_path not in collected_profiles:
+                    collected_profiles[result.profile_path] = collect_profile(result.profile_path, profile_dir)
+                result.profile_path = collected_profiles[result.profile_path]
+            (failure_store if result.error else success_store).append(result)
+            if result.duplicate_of:
+                repost_originals[result.duplicate_of] = repost_originals.get(result.duplicate_of, 0) + 1
+            if result.profile_path:
+                profiled.append({'url': result.url, 'processing_time_seconds': result.processing_time_seconds,
+                                 'error_class': result.error_class, 'profile_path': result.profile_path})
+
+        def record_result(future, key, attempt=0):
+            global processed_count, recovered_count
+            url = deduplicator.primary_url(key)
+            try:
+                result = future.result()
+            except Exception as exc:
+                process_time = time.perf_counter() - batch_start_time
+                logger.error("Critical exception processing %s after ~%.2fs: %s", url, process_time, exc, exc_info=True)
+                result = ListingRecord.failed(url, f"Critical processing error: {exc}")
+                result.processing_time_seconds = round(process_time, 2)
+            if result.error and attempt < retries_allowed(result.error_class):
+                retry_lane.append((key, attempt + 1, result.error_class))
+                retried_keys.add(key)
+                return
+            if key in retried_keys and not result.error:
+                recovered_count += 1
+            processed_count += 1
+            progress_percentage = min(processed_count / submitted_count, 1.0)
+            status_text.text(f"Processed {processed_count} of {submitted_count} unique listings queued so far...")
+            progress_bar.progress(progress_percentage)
+            for fanned_out_result in deduplicator.complete(key, result):
+                store_result(fanned_out_result)
+
+        spinner_message = "⚙️ Processing addresses... This may take a few minutes."
         with st.spinner(spinner_message):
-            with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_WORKERS) as executor:
-                future_to_url = {executor.submit(process_url, url): url for url in valid_urls}
-                for future in concurrent.futures.as_completed(future_to_url):
-                    url = future_to_url[future]
-                    try:
-                        result = future.result()
-                        all_results.append(result)
-                    except Exception as exc:
-                        process_time = time.perf_counter() - batch_start_time
-                        logger.error(f"Critical exception processing {url} after ~{process_time:.2f}s: {exc}", exc_info=True)
-                        all_results.append({"url": url, "error": f"Critical processing error: {exc}", "processing_time_seconds": round(process_time, 2)})
-                    finally:
-                        processed_count += 1
-                        progress_percentage = min(processed_count / total_urls, 1.0)
-                        status_text.text(f"Processed {processed_count} of {total_urls} addresses...")
-                        progress_bar.progress(progress_percentage)
-
+            with make_worker_pool(MAX_CONCURRENT_WORKERS, GOOGLE_API_KEY) as executor:
+                hedger = None
+                if HEDGING_ENABLED and WORKER_MODE not in ("process", "queue"):
+                    from hedging import HedgedExecutor
+                    hedger = executor = HedgedExecutor(executor, MAX_CONCURRENT_WORKERS)
+                future_to_key = {}
+                for url in itertools.chain([first_url], valid_url_iter):
+                    key = deduplicator.admit(url)
+                    for duplicate_result in deduplicator.drain_ready():
+                        store_result(duplicate_result)
+                    if key is None:
+                        continue
+                    future_to_key[executor.submit(pipeline.process_url, url)] = key
+                    submitted_count += 1
+                    if len(future_to_key) >= submission_window:
+                        done, _ = concurrent.futures.wait(future_to_key, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            record_result(future, future_to_key.pop(future))
+                for future in concurrent.futures.as_completed(future_to_key):
+                    record_result(future, future_to_key[future])
+                if hedger is not None:
+                    hedger.close()
+                    logger.info("Hedging: %s Stats: %s", hedger.summary(), hedger.stats)
+            close_thread_drivers(pipeline)
+
+            # Retry lane: transient failures get another go on a fresh pool (so fresh browsers) with a longer
+            # time budget, only after every first attempt has finished and been stored.
+            while retry_lane:
+                pending, retry_lane = retry_lane, []
+                backoff = max(RETRY_BACKOFF_SECONDS.get(error_class, 0) for _, _, error_class in pending)
+                logger.info("Retry lane: re-running %s transient failure(s) after %ss.", len(pending), backoff)
+                status_text.text(f"Retrying {len(pending)} listing(s) that failed for transient reasons...")
+                time.sleep(backoff)
+                with make_worker_pool(MAX_CONCURRENT_WORKERS, GOOGLE_API_KEY) as executor:
+                    retry_futures = {
+                        executor.submit(pipeline.process_url_retry, deduplicator.primary_url(key)): (key, attempt)
+                        for key, attempt, _ in pending
+                    }
+                    for future in concurrent.futures.as_completed(retry_futures):
+                        record_result(future, *retry_futures[future])
+                close_thread_drivers(pipeline)
+
+        total_urls = submitted_count + deduplicator.duplicate_count
+        if hedger is not None:
+            st.info(f"⏱️ {hedger.summary()}")
+        if repost_originals:
+            st.info(f"♻️ {sum(repost_originals.values())} listing(s) looked like reposts of {len(repost_originals)} already-extracted listing(s); "
+                    f"only {', '.join(pipeline.REEXTRACT_FIELDS)} were re-extracted for them. See the `duplicate_of` column.")
+        if retried_keys:
+            st.info(f"🔄 Retried {len(retried_keys)} listing(s) after transient failures; {recovered_count} recovered.")
+        if deduplicator.duplicate_count:
+            st.info(f"🔁 Collapsed {deduplicator.duplicate_count} duplicate address(es) onto {submitted_count} unique listing(s); each input row still gets its result.")
+        if ingest_report.invalid_count:
+            st.warning(f"⚠️ Some inputs were not valid web addresses and were ignored: {ingest_report.summary()} Examples: {', '.join(ingest_report.invalid_samples)}")
         status_text.text(f"Extraction complete! Processed {processed_count} of {total_urls} addresses.")
         time.sleep(2)
         status_text.empty()
         progress_bar.empty()
 
-        successful_extractions = [res for res in all_results if not res.get("error")]
-        failed_extractions = [res for res in all_results if res.get("error")]
+        success_store.close()
+        failure_store.close()
 
         st.markdown("---")
 
-        if successful_extractions:
-            st.success(f"✅ Successfully extracted details from {len(successful_extractions)} address(es).")
+        if success_store.row_count:
+            st.success(f"✅ Successfully extracted details from {success_store.row_count} address(es).")
             st.subheader("Extracted Property Details:")
-            df_success = pd.DataFrame(successful_extractions)
-            current_cols = df_success.columns.tolist()
-            ordered_cols = []
-            for col in COLUMN_ORDER:
-                if col in current_cols and col != 'error':
-                    ordered_cols.append(col)
-            remaining_cols = [col for col in current_cols if col not in ordered_cols and col != 'error']
-            final_cols_success = [col for col in ordered_cols + remaining_cols if col in df_success.columns]
-            df_success_display = df_success[final_cols_success].fillna('N/A')
+            success_cols = [col for col in COLUMN_ORDER if col not in ('error', 'error_class')] + list(DERIVED_FIELDS)
+            df_success_display = success_store.preview(columns=success_cols)
+            if success_store.row_count > len(df_success_display):
+                st.caption(f"Showing the first {len(df_success_display)} of {success_store.row_count} rows. Download the full results below.")
             st.dataframe(df_success_display)
-            csv_data = df_success_display.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="⬇️ Download Successful Results as CSV",
-                data=csv_data,
-                file_name='property_data_successful.csv',
-                mime='text/csv',
-                key='download-csv'
-            )
+            csv_col, parquet_col = st.columns(2)
+            with open(success_store.write_csv(columns=success_cols), 'rb') as csv_file:
+                csv_col.download_button(
+                    label="⬇️ Download Successful Results as CSV",
+                    data=csv_file,
+                    file_name='property_data_successful.csv',
+                    mime='text/csv',
+                    key='download-csv'
+                )
+            with open(success_store.parquet_path, 'rb') as parquet_file:
+                parquet_col.download_button(
+                    label="⬇️ Download Successful Results as Parquet",
+                    data=parquet_file,
+                    file_name='property_data_successful.parquet',
+                    mime='application/vnd.apache.parquet',
+                    key='download-parquet'
+                )
         else:
             if total_urls > 0:
                 st.info("ℹ️ No data was successfully extracted from the provided addresses. Check errors below.")
 
-        if failed_extractions:
-            with st.expander(f"⚠️ View Processing Issues & Errors ({len(failed_extractions)} URLs)", expanded=True):
-                st.warning(f"Failed to process or extract full details for {len(failed_extractions)} address(es). See details below.")
-                df_failed = pd.DataFrame(failed_extractions)
-                current_cols_failed = df_failed.columns.tolist()
-                fail_order = ['url', 'error', 'processing_time_seconds']
-                ordered_cols_failed = [col for col in fail_order if col in current_cols_failed]
-                remaining_cols_failed = [col for col in current_cols_failed if col not in ordered_cols_failed]
-                final_cols_failed = [col for col in ordered_cols_failed + remaining_cols_failed if col in df_failed.columns]
-                df_failed_display = df_failed[final_cols_failed].fillna('N/A')
+        if failure_store.row_count:
+            with st.expander(f"⚠️ View Processing Issues & Errors ({failure_store.row_count} URLs)", expanded=True):
+                st.warning(f"Failed to process or extract full details for {failure_store.row_count} address(es). See details below.")
+                df_failed_display = failure_store.preview(columns=['url', 'error_class', 'error', 'processing_time_seconds'])
                 st.dataframe(df_failed_display, use_container_width=True)
-                logger.warning(f"Failed/Partial URLs ({len(failed_extractions)}): {[res.get('url') for res in failed_extractions]}")
+                logger.warning("Failed/Partial URLs (%s): %s", failure_store.row_count, df_failed_display['url'].tolist())
+
+        if profiled:
+            with st.expander(f"🔬 Profiles of Slow or Sampled URLs ({len(profiled)})"):
+                st.caption("`.folded` files are Python stack samples (open in speedscope or flamegraph.pl); "
+                           "`.trace.json` files are Chrome traces (open in the DevTools Performance panel or Perfetto).")
+                st.dataframe(pd.DataFrame(profiled), use_container_width=True)
+                profiles_zip_path = os.path.join(success_store.directory, "profiles.zip")
+                with zipfile.ZipFile(profiles_zip_path, 'w', zipfile.ZIP_DEFLATED) as profiles_zip:
+                    for row in profiled:
+                        # Queue-mode profiles stay on the worker machine that wrote them.
+                        for path in (row['profile_path'], trace_path(row['profile_path'])):
+                            if path and os.path.exists(path):
+                                profiles_zip.write(path, os.path.basename(path))
+                with open(profiles_zip_path, 'rb') as profiles_file:
+                    st.download_button(
+                        label="⬇️ Download Profiles",
+                        data=profiles_file,
+                        file_name='listinglens_profiles.zip',
+                        mime='application/zip',
+                        key='download-profiles'
+                    )
+
+        selector_alerts = selector_registry.active_alerts()
+        if selector_alerts:
+            for alert in selector_alerts:
+                st.error(f"🚨 {alert['message']}")
+            with st.expander("🩺 Selector Health"):
+                st.dataframe(pd.DataFrame(selector_registry.snapshot()), use_container_width=True)
 
         batch_end_time = time.perf_counter()
         total_duration = batch_end_time - batch_start_time
         st.info(f"⏱️ Total processing time for the batch: {total_duration:.2f} seconds.")
-        logger.info(f"Total batch processing finished in {total_duration:.2f} seconds for {total_urls} initial URLs.")
+        logger.info("Total batch processing finished in %.2f seconds for %s initial URLs.", total_duration, total_urls)
+
+# --- Listing Database ---
+# Filters, sorting, paging and aggregates run in SQLite; only the visible page reaches pandas.
+results_db = load_results_db()
+stored_count = results_db.count()
+if stored_count:
+    st.markdown("---")
+    st.subheader("📚 Listing Database")
+    st.caption(f"{stored_count:,} listings extracted across all batches (latest extraction of each listing).")
+    filter_cols = st.columns(4)
+    db_filters = {
+        'state': filter_cols[0].multiselect("State", results_db.distinct_values('state')),
+        'area': filter_cols[1].multiselect("Area", results_db.distinct_values('area')),
+        'property_type': filter_cols[2].multiselect("Property type", results_db.distinct_values('property_type')),
+        'listing_type': filter_cols[3].multiselect("Rent or sale", results_db.distinct_values('listing_type')),
+    }
+    range_cols = st.columns(5)
+    db_filters['min_price'] = range_cols[0].number_input("Min price (RM)", min_value=0, step=10000)
+    db_filters['max_price'] = range_cols[1].number_input("Max price (RM)", min_value=0, step=10000, help="0 means no limit.")
+    db_filters['min_sq_ft'] = range_cols[2].number_input("Min sq ft", min_value=0, step=100)
+    db_filters['max_sq_ft'] = range_cols[3].number_input("Max sq ft", min_value=0, step=100, help="0 means no limit.")
+    db_filters['text'] = range_cols[4].text_input("Title/project contains")
+
+    listings_tab, stats_tab = st.tabs(["Listings", "Area statistics"])
+    with listings_tab:
+        matching_count = results_db.count(db_filters)
+        sort_cols = st.columns(3)
+        sort_by = sort_cols[0].selectbox("Sort by", SORT_COLUMNS, index=SORT_COLUMNS.index('last_seen'))
+        descending = sort_cols[1].checkbox("Descending", value=True)
+        page_size = sort_cols[2].selectbox("Rows per page", (50, 100, 500), index=1)
+        page_count = max(1, -(-matching_count // page_size))
+        page = st.number_input(f"Page (of {page_count:,})", min_value=1, max_value=page_count, value=1)
+        st.dataframe(
+            results_db.query(db_filters, sort_by, descending, limit=page_size, offset=(page - 1) * page_size),
+            use_container_width=True
+        )
+        if matching_count:
+            st.caption(f"Showing rows {(page - 1) * page_size + 1:,}-{min(page * page_size, matching_count):,} of {matching_count:,} matching listings.")
+    with stats_tab:
+        stats_cols = st.columns(2)
+        group_by = stats_cols[0].selectbox("Group by", GROUP_COLUMNS)
+        min_listings = stats_cols[1].number_input("Minimum listings per group", min_value=1, value=5)
+        st.dataframe(results_db.aggregate(db_filters, group_by, min_listings), use_container_width=True)
 
 st.markdown("---")
 st.caption("ListingLens Extractor")
\ No newline at end of file
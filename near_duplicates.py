@@ -0,0 +1,103 @@
+# near_duplicates.py
+import html
+import re
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# --- Constants ---
+SHINGLE_CHARS = 5
+SIMHASH_MAX_DISTANCE = 3        # Differing bits (of 64) still treated as the same unit reposted
+MIN_TEXT_CHARS = 200            # Too little text to fingerprint reliably
+REEXTRACT_FIELDS = ('price', 'phone_number')  # Fields agents change between reposts
+INDEX_INITIAL_CAPACITY = 1024
+INDEX_MAX_ENTRIES = 20000       # Oldest fingerprints are overwritten beyond this, so memory stays flat on long runs
+
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_TEL_LINK_PATTERN = re.compile(r"""href\s*=\s*["']tel:([^"']+)""", re.IGNORECASE)
+_SHINGLE_POWERS = np.array([31 ** i for i in reversed(range(SHINGLE_CHARS))], dtype=np.uint64)
+_BIT_POSITIONS = np.arange(64, dtype=np.uint64)
+
+
+def compact_text(html_parts):
+    """Visible text of the scraped sections, lower-cased with whitespace collapsed; tel: links are kept
+    because revealed phone numbers often only appear there."""
+    joined = "\n".join(html_parts)
+    text = _WHITESPACE_PATTERN.sub(" ", html.unescape(_TAG_PATTERN.sub(" ", joined))).strip().lower()
+    tel_links = _TEL_LINK_PATTERN.findall(joined)
+    return f"{text} {' '.join(tel_links)}" if tel_links else text
+
+
+def _mix64(values):
+    """splitmix64 finalizer, so polynomial shingle hashes spread over all 64 bits."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def simhash(text):
+    """64-bit SimHash of the text's character shingles, hashed as whole arrays (None for short text)."""
+    data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+    if len(data) < MIN_TEXT_CHARS:
+        return None
+    shingles = sliding_window_view(data, SHINGLE_CHARS).astype(np.uint64)
+    # Unique shingles only, so repeated boilerplate doesn't outvote the listing-specific text.
+    hashes = np.unique(_mix64(shingles @ _SHINGLE_POWERS))
+    ones = ((hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)).sum(axis=0)
+    return int(((ones * 2 > len(hashes)).astype(np.uint64) << _BIT_POSITIONS).sum())
+
+
+class NearDuplicateIndex:
+    """SimHash fingerprints of the last `max_entries` listings extracted by this process.
+
+    A lookup XORs the query against every stored fingerprint at once and counts differing bits,
+    which takes a few milliseconds for a hundred thousand listings. Once full, each new listing
+    overwrites the oldest one's signature and record in the same slot.
+    """
+
+    def __init__(self, max_distance=SIMHASH_MAX_DISTANCE, max_entries=INDEX_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._signatures = np.empty(min(INDEX_INITIAL_CAPACITY, max_entries), dtype=np.uint64)
+        self._records = []
+        self._oldest = 0  # Next slot to overwrite once the index is full
+
+    def find(self, signature):
+        """Returns (record, distance) for the closest stored listing within max_distance, else None."""
+        with self._lock:
+            # Held for the whole lookup so the matched slot can't be overwritten before its record is read.
+            count = len(self._records)
+            if not count:
+                return None
+            differing = self._signatures[:count] ^ np.uint64(signature)
+            distances = np.unpackbits(differing.view(np.uint8).reshape(count, 8), axis=1).sum(axis=1)
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                return None
+            return self._records[best], int(distances[best])
+
+    def add(self, signature, record):
+        with self._lock:
+            count = len(self._records)
+            if count < self.max_entries:
+                if count == len(self._signatures):
+                    grown = min(count * 2, self.max_entries)
+                    self._signatures = np.concatenate([self._signatures, np.empty(grown - count, dtype=np.uint64)])
+                self._signatures[count] = signature
+                self._records.append(record)
+                return
+            slot = self._oldest
+            self._signatures[slot] = signature
+            self._records[slot] = record
+            self._oldest = (slot + 1) % self.max_entries
+
+    def __len__(self):
+        return len(self._records)
+
+
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,185 @@
+# normalization.py
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from listing_schema import INTEGER_FIELDS
+
+# --- Constants ---
+RENT_PRICE_CEILING = 20000      # RM; asking prices below this are monthly rents unless the text says otherwise
+DERIVED_FIELDS = {'price_per_sqft': pa.float64(), 'listing_type': pa.string()}
+
+# Ordered (pattern, canonical value) rules, matched against lower-cased values with punctuation turned
+# into spaces; the first match wins.
+STATE_RULES = (
+    (r"kuala lumpur|^(w ?p )?kl$", "Kuala Lumpur"),
+    (r"putrajaya", "Putrajaya"),
+    (r"labuan", "Labuan"),
+    (r"selangor|^sgr$", "Selangor"),
+    (r"johor", "Johor"),
+    (r"penang|pinang", "Penang"),
+    (r"melaka|malacca", "Melaka"),
+    (r"negeri sembilan|^n ?sembilan$|^ns$", "Negeri Sembilan"),
+    (r"kedah", "Kedah"),
+    (r"kelantan", "Kelantan"),
+    (r"pahang", "Pahang"),
+    (r"perak", "Perak"),
+    (r"perlis", "Perlis"),
+    (r"sabah", "Sabah"),
+    (r"sarawak", "Sarawak"),
+    (r"terengganu|trengganu", "Terengganu"),
+)
+PROPERTY_TYPE_RULES = (
+    (r"serviced?( apartment| residen)|\bso[hvf]o\b", "Serviced Residence"),
+    (r"condo", "Condominium"),
+    (r"penthouse", "Penthouse"),
+    (r"duplex", "Duplex"),
+    (r"studio", "Studio"),
+    (r"town ?house", "Townhouse"),
+    (r"cluster", "Cluster House"),
+    (r"semi ?d\b|semi detached", "Semi-Detached House"),
+    (r"bungalow|detached|villa", "Bungalow"),
+    (r"terrace|link|\b\d+(\.\d+)? ?(sty|storey|story)\b", "Terrace House"),
+    (r"flat", "Flat"),
+    (r"apartment|\bapt\b", "Apartment"),
+    (r"shop|office|retail|commercial", "Commercial"),
+    (r"\bland\b", "Land"),
+)
+AREA_ALIASES = {
+    "pj": "Petaling Jaya",
+    "jb": "Johor Bahru",
+    "johor baru": "Johor Bahru",
+    "klcc": "KLCC",
+    "kl city centre": "KLCC",
+    "kl city": "KL City",
+    "kl sentral": "KL Sentral",
+    "mont kiara": "Mont Kiara",
+    "ttdi": "Taman Tun Dr Ismail",
+    "damansara hts": "Damansara Heights",
+    "old klang rd": "Old Klang Road",
+    "jalan klang lama": "Old Klang Road",
+    "klang lama": "Old Klang Road",
+    "usj": "USJ",
+}
+RENT_PATTERN = r"\b(for rent|to let|rental|sewa|disewa)\b|per month|/ ?(month|mth|mo)\b"
+SALE_PATTERN = r"\b(for sale|on sale|selling|jual|dijual|sub ?sale|new launch)\b"
+PHONE_SEPARATORS = (" ", "-", "(", ")", ".")
+PHONE_PATTERN = r"(?P<phone>\+?\d{8,15})"
+
+
+def _key(values):
+    """Lower-cased values with runs of punctuation and whitespace collapsed to one space."""
+    return pc.utf8_trim_whitespace(pc.replace_substring_regex(pc.utf8_lower(values), r"[^a-z0-9]+", " "))
+
+
+def _tidy(values):
+    """Collapsed whitespace; all-lower or all-upper values longer than five characters are title-cased
+    ("CHERAS" -> "Cheras") while short acronyms like "KLCC" and mixed-case values are kept."""
+    values = pc.utf8_trim_whitespace(pc.replace_substring_regex(values, r"\s+", " "))
+    shouty = pc.or_(pc.utf8_is_lower(values), pc.and_(pc.utf8_is_upper(values), pc.greater(pc.utf8_length(values), 5)))
+    return pc.if_else(shouty, pc.utf8_title(values), values)
+
+
+def _per_distinct(values, normalize):
+    """Runs `normalize` over the distinct values only and expands the result back by dictionary index."""
+    encoded = pc.dictionary_encode(values)
+    return pc.take(normalize(encoded.dictionary), encoded.indices)
+
+
+def _apply_rules(values, rules):
+    """Canonical value of the first matching rule; unmatched values are only tidied."""
+    keys = _key(values)
+    conditions = [pc.fill_null(pc.match_substring_regex(keys, pattern), False) for pattern, _ in rules]
+    if not len(values):
+        return values
+    return pc.case_when(
+        pc.make_struct(*conditions, field_names=[str(i) for i in range(len(rules))]),
+        *(pa.scalar(canonical) for _, canonical in rules), _tidy(values)
+    )
+
+
+def canonical_states(values):
+    return _per_distinct(values, lambda distinct: _apply_rules(distinct, STATE_RULES))
+
+
+def canonical_property_types(values):
+    return _per_distinct(values, lambda distinct: _apply_rules(distinct, PROPERTY_TYPE_RULES))
+
+
+def canonical_areas(values):
+    """Drops a trailing ", <state>" qualifier and maps known abbreviations and spellings onto one name."""
+    def normalize(distinct):
+        distinct = pc.replace_substring_regex(distinct, r",.*$", "")
+        keys = _key(distinct)
+        aliased = pc.take(pa.array(list(AREA_ALIASES.values())), pc.index_in(keys, value_set=pa.array(list(AREA_ALIASES))))
+        return pc.coalesce(aliased, _tidy(distinct))
+    return _per_distinct(values, normalize)
+
+
+def e164_phone_numbers(values):
+    """First phone number in each value in E.164 form; local Malaysian numbers get +60. Unusable values become null."""
+    # Literal replacements are several times cheaper than a regex that tolerates separators.
+    for separator in PHONE_SEPARATORS:
+        values = pc.replace_substring(values, separator, "")
+    found = pc.struct_field(pc.extract_regex(values, PHONE_PATTERN), [0])
+    digits = pc.replace_substring(found, "+", "")
+    international = pc.and_(pc.starts_with(found, "+"), pc.invert(pc.starts_with(digits, "60")))
+    # Malaysian numbers: country code 60 or trunk prefix 0, then 8-10 digits not starting with 0.
+    digit_count = pc.utf8_length(digits)
+    has_country_code = pc.and_(pc.starts_with(digits, "60"), pc.greater_equal(digit_count, 10))
+    national = pc.if_else(
+        has_country_code, pc.utf8_slice_codeunits(digits, 2),
+        pc.if_else(pc.starts_with(digits, "0"), pc.utf8_slice_codeunits(digits, 1), digits)
+    )
+    local = pc.binary_join_element_wise("+60", national, "")
+    length = pc.utf8_length(national)
+    local_ok = pc.and_(pc.and_(pc.greater_equal(length, 8), pc.less_equal(length, 10)), pc.invert(pc.starts_with(national, "0")))
+    foreign = pc.binary_join_element_wise("+", digits, "")
+    foreign_ok = pc.and_(pc.greater_equal(digit_count, 8), pc.less_equal(digit_count, 15))
+    return pc.if_else(international, pc.if_else(foreign_ok, foreign, None), pc.if_else(local_ok, local, None))
+
+
+def positive_integers(values):
+    """Integer column with zero/negative placeholders nulled; numeric strings such as "RM 1,200" are parsed."""
+    if pa.types.is_string(values.type):
+        number = pc.struct_field(pc.extract_regex(pc.replace_substring(values, ",", ""), r"(?P<n>\d+(?:\.\d+)?)"), [0])
+        values = pc.cast(pc.round(pc.cast(number, pa.float64())), pa.int64())
+    elif not pa.types.is_int64(values.type):
+        values = pc.cast(pc.round(pc.cast(values, pa.float64())), pa.int64())
+    return pc.if_else(pc.greater(values, 0), values, None)
+
+
+def listing_types(price, listing_title):
+    """"rent" or "sale": explicit wording in the title wins, otherwise the price decides."""
+    says_rent = pc.match_substring_regex(listing_title, RENT_PATTERN, ignore_case=True)
+    says_sale = pc.match_substring_regex(listing_title, SALE_PATTERN, ignore_case=True)
+    if not len(price):
+        return pa.array([], pa.string())
+    conditions = [
+        pc.fill_null(pc.and_(says_rent, pc.invert(says_sale)), False),
+        pc.fill_null(pc.and_(says_sale, pc.invert(says_rent)), False),
+        pc.fill_null(pc.less(price, RENT_PRICE_CEILING), False),
+        pc.is_valid(price),
+    ]
+    return pc.case_when(
+        pc.make_struct(*conditions, field_names=["rent_text", "sale_text", "rent_price", "sale_price"]),
+        "rent", "sale", "rent", "sale"
+    )
+
+
+def normalize_batch(batch):
+    """Normalizes a RecordBatch of ListingRecord columns as whole columns and appends the DERIVED_FIELDS.
+
+    Low-cardinality text columns are dictionary-encoded so each distinct spelling is cleaned once.
+    """
+    columns = {name: batch.column(name) for name in batch.schema.names}
+    for field in INTEGER_FIELDS:
+        columns[field] = positive_integers(columns[field])
+    columns['state'] = canonical_states(columns['state'])
+    columns['area'] = canonical_areas(columns['area'])
+    columns['property_type'] = canonical_property_types(columns['property_type'])
+    columns['phone_number'] = e164_phone_numbers(columns['phone_number'])
+    columns['price_per_sqft'] = pc.round(pc.divide(pc.cast(columns['price'], pa.float64()), columns['sq_ft']), 2)
+    columns['listing_type'] = listing_types(columns['price'], columns['listing_title'])
+    return pa.RecordBatch.from_pydict(
+        columns, schema=pa.schema(list(batch.schema) + [pa.field(name, kind) for name, kind in DERIVED_FIELDS.items()])
+    )
@@ -0,0 +1,731 @@
+# pipeline.py
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import (
+    TimeoutException, NoSuchElementException, ElementClickInterceptedException,
+    StaleElementReferenceException, WebDriverException
+)
+
+import os
+import time
+import traceback
+import dataclasses
+import functools
+import hashlib
+import threading
+import google.generativeai as genai
+import logging
+import json
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from browser_identity import CHROME_USER_AGENT
+from browser_watchdog import driver_manager
+from failures import BROWSER_ERROR, MISSING_KEY_DATA, PAGE_TIMEOUT, RETRY_BUDGET_FACTOR, classify_error
+from listing_schema import AI_FIELDS, GEMINI_RESPONSE_SCHEMA, ListingRecord
+from near_duplicates import REEXTRACT_FIELDS, compact_text, near_duplicate_index, simhash
+from profiling import start_profile
+from structured_logging import url_context
+from selector_health import selector_registry
+from site_profiles import get_profile, normalize_domain
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+RENDER_ENGINE = os.environ.get("LISTINGLENS_RENDER_ENGINE", "selenium")  # "selenium" or "cdp"
+# CDP tabs share one browser, so far more of them fit in memory than Selenium browsers.
+MAX_CONCURRENT_WORKERS = 16 if RENDER_ENGINE == "cdp" else 5
+
+GEMINI_MODEL_NAME = 'gemini-2.0-flash'
+AI_CACHE_MAX_ENTRIES = 20000
+ARCHIVE_DIR = 'html_archive'
+PAGE_TEXT_SAMPLE_CHARS = 2000   # Body text kept when no section matched, so callers can tell a removed listing from a selector break
+_JS_PAGE_TEXT = f"return [document.title, document.body ? document.body.innerText.slice(0, {PAGE_TEXT_SAMPLE_CHARS}) : ''];"
+_JS_PERFORMANCE_TIMELINE = """return performance.getEntries().map(e => ({
+    name: e.name, cat: e.entryType, ph: 'X', pid: 1, tid: 1,
+    ts: Math.round(e.startTime * 1000), dur: Math.round(e.duration * 1000)
+}));"""
+
+COLUMN_ORDER = [
+    'url', 'listing_title', 'project_name', 'price', 'area', 'state',
+    'sq_ft', 'bedrooms', 'bathrooms',
+    'property_type', 'carpark', 'floor_range',
+    'phone_number', 'description',
+    'processing_time_seconds', 'duplicate_of', 'partial', 'profile_path', 'error', 'error_class'
+]
+
+
+# --- Selenium Options ---
+@functools.lru_cache(maxsize=1)
+def get_chrome_options():
+    chrome_options = Options()
+    chrome_options.page_load_strategy = 'eager'
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument(f"user-agent={CHROME_USER_AGENT}")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--log-level=3")
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    chrome_options.add_argument('--disable-infobars')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.binary_location = "/usr/bin/chromium"
+    return chrome_options
+
+def create_driver():
+    service = Service(executable_path="/usr/bin/chromedriver")
+    return webdriver.Chrome(service=service, options=get_chrome_options())
+
+@functools.lru_cache(maxsize=1)
+def get_cdp_engine():
+    from cdp_engine import CDPEngine  # Optional: only needed for LISTINGLENS_RENDER_ENGINE=cdp
+    return CDPEngine(CHROME_USER_AGENT, max_tabs=MAX_CONCURRENT_WORKERS)
+
+# --- Gemini API / AI Cache ---
+_ai_cache = OrderedDict()
+_ai_cache_lock = threading.Lock()
+
+def configure_gemini(api_key):
+    genai.configure(api_key=api_key)
+    logger.info("Gemini API configured successfully.")
+
+def _ai_cache_get(key):
+    with _ai_cache_lock:
+        value = _ai_cache.get(key)
+        if value is not None:
+            _ai_cache.move_to_end(key)
+        return value
+
+def _ai_cache_put(key, value):
+    with _ai_cache_lock:
+        _ai_cache[key] = value
+        _ai_cache.move_to_end(key)
+        while len(_ai_cache) > AI_CACHE_MAX_ENTRIES:
+            _ai_cache.popitem(last=False)
+
+# --- Helper Functions ---
+class Deadline:
+    """Time budget shared by every phase of one URL; waits are capped to what is left of it.
+
+    Setting `cancel_event` expires the deadline at once, so an abandoned attempt winds down quickly.
+    """
+
+    def __init__(self, seconds=None, cancel_event=None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self.cancel_event = cancel_event
+
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def remaining(self):
+        if self.cancelled():
+            return 0.0
+        if self.expires_at is None:
+            return float('inf')
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cap(self, seconds):
+        return min(seconds, self.remaining())
+
+    def reserve(self, seconds):
+        """Returns a sub-deadline that ends `seconds` before this one, keeping that time for later phases."""
+        if self.expires_at is None:
+            return Deadline(cancel_event=self.cancel_event)
+        return Deadline(max(0.0, self.remaining() - seconds), self.cancel_event)
+
+def click_button(driver, button_element, xpath_description, wait_timeout, post_click_delay, click_attempt_description=""):
+    clicked = False
+    btn_text = "(unknown)"
+    try:
+        if button_element and button_element.is_displayed() and button_element.is_enabled():
+            button_to_click = WebDriverWait(driver, wait_timeout).until(
+                EC.element_to_be_clickable((By.XPATH, xpath_description))
+            )
+            try:
+                button_to_click = driver.find_element(By.XPATH, xpath_description)
+                btn_text = button_to_click.text.strip().replace('\n', ' ')[:50]
+            except StaleElementReferenceException:
+                btn_text = "(stale element)"
+                try:
+                    time.sleep(0.5)
+                    button_to_click = driver.find_element(By.XPATH, xpath_description)
+                    btn_text = button_to_click.text.strip().replace('\n', ' ')[:50]
+                except Exception:
+                     btn_text = "(stale element - retry failed)"
+            except Exception:
+                btn_text = "(error getting text)"
+            try:
+                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button_to_click)
+                time.sleep(0.5)
+                driver.execute_script("arguments[0].click();", button_to_click)
+                clicked = True
+                logger.info("%sClicked button: '%s' using XPath: %s", click_attempt_description, btn_text, xpath_description)
+                time.sleep(post_click_delay)
+                logger.debug("Post-click delay (%ss) finished for '%s'.", post_click_delay, btn_text)
+            except StaleElementReferenceException:
+                 logger.warning("StaleElementReferenceException during JS click for XPath: %s. Re-finding...", xpath_description)
+                 try:
+                     time.sleep(0.5)
+                     button_fresh = driver.find_element(By.XPATH, xpath_description)
+                     driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button_fresh)
+                     time.sleep(0.5)
+                     driver.execute_script("arguments[0].click();", button_fresh)
+                     clicked = True
+                     logger.info("%sClicked button (after re-find): '%s' using XPath: %s", click_attempt_description, btn_text, xpath_description)
+                     time.sleep(post_click_delay)
+                     logger.debug("Post-click delay (%ss) finished for '%s'.", post_click_delay, btn_text)
+                 except Exception as e_retry_click:
+                     logger.error("Error clicking button after re-find for XPath '%s': %s", xpath_description, type(e_retry_click).__name__)
+            except Exception as e_js_click:
+                 logger.error("Error during JS click for XPath '%s': %s", xpath_description, type(e_js_click).__name__)
+    except TimeoutException:
+        logger.warning("Timeout waiting for button to be clickable (Timeout: %ss) for XPath: %s", wait_timeout, xpath_description)
+        pass
+    except StaleElementReferenceException:
+        logger.warning("StaleElementReferenceException checking/waiting for button with XPath: %s.", xpath_description)
+        pass
+    except NoSuchElementException:
+        logger.warning("NoSuchElementException when trying to re-find button for clickability check/JS click: %s.", xpath_description)
+        pass
+    except ElementClickInterceptedException:
+        logger.warning("ElementClickInterceptedException for button with XPath: %s.", xpath_description)
+        pass
+    except Exception as e_click:
+        logger.error("Error clicking button instance with XPath '%s': %s - %s", xpath_description, type(e_click).__name__, e_click)
+        pass
+    return clicked, btn_text
+
+def _generate_record(model, prompt, listing_url, deadline=None):
+    """Calls Gemini in JSON mode and parses the reply, spending at most one extra call on a retry or repair."""
+    deadline = deadline or Deadline()
+
+    def generate(text):
+        if deadline.expires_at is None:
+            return model.generate_content(text)
+        return model.generate_content(text, request_options={"timeout": max(1.0, deadline.remaining())})
+
+    response = generate(prompt)
+    try:
+        raw_text = response.text
+    except ValueError as e:
+        logger.warning("Gemini returned no usable text for %s (%s); retrying once.", listing_url, e)
+        raw_text = generate(prompt).text
+    logger.debug("Raw Gemini response for %s: %s...", listing_url, raw_text[:500])
+    try:
+        return ListingRecord.from_ai_dict(json.loads(raw_text), listing_url)
+    except ValueError as parse_err:
+        logger.warning("Malformed Gemini response for %s (%s); attempting one repair.", listing_url, parse_err)
+        repair_prompt = (
+            f"The text below was supposed to be one JSON object with the keys {', '.join(AI_FIELDS)} "
+            f"but could not be parsed ({parse_err}). Return only the corrected JSON object.\n\n{raw_text[:20000]}"
+        )
+        return ListingRecord.from_ai_dict(json.loads(generate(repair_prompt).text), listing_url)
+
+def extract_property_details(html_content, listing_url, prompt_hints="", deadline=None):
+    if not html_content or html_content.isspace():
+        logger.warning("HTML content provided to Gemini for %s is empty or whitespace. Skipping AI extraction.", listing_url)
+        return ListingRecord.failed(listing_url, "No HTML content extracted from page to analyze.")
+    logger.info("Attempting to extract details using Gemini for URL: %s", listing_url)
+    gemini_start_time = time.perf_counter()
+    try:
+        model = genai.GenerativeModel(
+            GEMINI_MODEL_NAME,
+            generation_config={"response_mime_type": "application/json", "response_schema": GEMINI_RESPONSE_SCHEMA}
+        )
+        prompt = f"""
+        You are an expert property data extractor. Analyze the following HTML content from a property listing website
+        (potentially combined from several relevant sections like description, details, contact, and property specifics)
+        and extract the following information in a JSON format:
+
+        - listing_title: The full title of the property listing as it appears. Look in <title> tags or main headings (h1, h2). If not found, return "N/A".
+        - project_name: The specific building, condo, or project name IF clearly identifiable within the title or description (e.g., "Winner Court A", "Cubic Botanical", "Sky Residences"). If not clear or just a general area name, return "N/A".
+        - area: The area/location (e.g., "Desa Petaling", "Bangsar South", "Damansara"). Look for location indicators near the title or in details sections. If not found, return "N/A".
+        - state: The state (e.g., "Kuala Lumpur", "Selangor", "Johor"). Look for location indicators. If not found, return "N/A".
+        - price: The listed price (for sale) or rent per month (for rent) as a number (integer). Remove currency symbols (like RM), commas, and text like "/ month" or "per month". If not found or cannot be converted to a number, return 0. Prioritize the main listed price.
+        - sq_ft: The size in square feet as a number (integer). Remove "sq.ft.", "sf", etc. If not found or cannot be converted, return 0.
+        - bedrooms: The number of bedrooms as a number (integer). Look for labels like "Bedrooms", "Beds", or patterns like "3R". If not found or cannot be converted, return 0.
+        - bathrooms: The number of bathrooms as a number (integer). Look for labels like "Bathrooms", "Baths", or patterns like "2B". If not found or cannot be converted, return 0.
+        - property_type: The type of property (e.g., "Condominium", "Serviced Residence", "Bungalow"). Look for labels like "Property Type". If not found, return "N/A". # <<< ADD THIS
+        - carpark: The number of car park spaces as a number (integer). Look for labels like "Carpark", "Parking". If not found or cannot be converted, return 0. # <<< ADD THIS
+        - floor_range: The floor range (e.g., "High", "Mid", "Low", "5-10"). Look for labels like "Floor Range". If not found, return "N/A". # <<< ADD THIS
+        - phone_number: The contact phone number. Look carefully, it might have been revealed after a button click in the original HTML (and thus present in the provided HTML, potentially multiple times). Extract the first clear phone number found (digits, possibly with +, -, or spaces). If not found, return "N/A".
+        - description: A concise summary of the property description. Look for description blocks, meta description tags, or sections labeled 'Description'. Include key details, even those potentially revealed after clicking 'show more' in the original page (which should be in the provided HTML). If not found, return "N/A".
+
+        Return ONLY the data in a valid JSON object format. Do not include ```json markdown wrappers or any text before or after the JSON object itself. Ensure all keys are present, using "N/A" or 0 as specified for missing values.
+
+        Example of the desired JSON output format:
+        {{
+          "listing_title": "Luxury Condo with KLCC View",
+          "project_name": "Sky Residences",
+          "area": "Ampang Hilir",
+          "state": "Kuala Lumpur",
+          "price": 1200000,
+          "sq_ft": 1500,
+          "bedrooms": 3,
+          "bathrooms": 2,
+          "property_type": "Condominium",
+          "carpark": 2,
+          "floor_range": "High",
+          "phone_number": "0123456789",
+          "description": "Fully furnished 3-bedroom unit at Sky Residences. High floor with stunning KLCC view. Includes 2 car parks. Available now."
+        }}
+
+        {f"Site-specific notes: {prompt_hints}" if prompt_hints else ""}
+
+        HTML Content:
+        ```html
+        {html_content}
+        ```
+        """
+        cache_key = hashlib.sha256(f"{GEMINI_MODEL_NAME}\n{prompt}".encode('utf-8')).hexdigest()
+        cached_record = _ai_cache_get(cache_key)
+        if cached_record is not None:
+            logger.info("AI cache hit for %s.", listing_url)
+            return dataclasses.replace(cached_record, url=listing_url)
+        record = _generate_record(model, prompt, listing_url, deadline)
+        _ai_cache_put(cache_key, dataclasses.replace(record))
+        gemini_duration = time.perf_counter() - gemini_start_time
+        logger.info("Gemini extraction successful and parsed for %s in %.2f seconds.", listing_url, gemini_duration)
+        return record
+    except ValueError as parse_err:
+        logger.error("Failed to parse Gemini response for %s after repair: %s", listing_url, parse_err, exc_info=True)
+        return ListingRecord.failed(listing_url, f"Failed to parse AI response: {parse_err}")
+    except Exception as e:
+        gemini_duration = time.perf_counter() - gemini_start_time
+        logger.error("Gemini extraction failed for %s after %.2f seconds: %s", listing_url, gemini_duration, e, exc_info=True)
+        return ListingRecord.failed(listing_url, f"Gemini API call failed: {str(e)}")
+
+def extract_changed_fields(page_text, listing_url, fields, deadline=None):
+    """Asks Gemini for only `fields` of a listing, from its compact text. Returns a dict, or None if the call fails."""
+    instructions = {
+        "price": "the listed price (for sale) or rent per month (for rent) as an integer without currency symbols or commas; 0 if not found",
+        "phone_number": "the first clear contact phone number; \"N/A\" if not found",
+    }
+    prompt = (
+        "Extract only the following fields from the property listing text below and return them as one JSON object:\n"
+        + "\n".join(f"- {field}: {instructions.get(field, f'the listing {field}')}" for field in fields)
+        + f"\n\nListing text:\n{page_text}"
+    )
+    model = genai.GenerativeModel(
+        GEMINI_MODEL_NAME,
+        generation_config={
+            "response_mime_type": "application/json",
+            "response_schema": {
+                "type": "OBJECT",
+                "properties": {field: GEMINI_RESPONSE_SCHEMA["properties"][field] for field in fields},
+                "required": list(fields),
+            },
+        }
+    )
+    try:
+        partial_record = _generate_record(model, prompt, listing_url, deadline)
+    except Exception as e:
+        logger.warning("Re-extracting %s for %s failed: %s", ', '.join(fields), listing_url, e)
+        return None
+    return {field: getattr(partial_record, field) for field in fields}
+
+def _reuse_near_duplicate(url, page_text, original, distance, deadline=None):
+    """Builds the record of a repost from the original's extraction plus freshly extracted REEXTRACT_FIELDS."""
+    logger.info("%s looks like a repost of %s (%s differing SimHash bits); re-extracting only %s.",
+                url, original.url, distance, ', '.join(REEXTRACT_FIELDS))
+    changed = extract_changed_fields(page_text, url, REEXTRACT_FIELDS, deadline)
+    if changed is None:
+        return None
+    return dataclasses.replace(
+        original, url=url, duplicate_of=original.url if original.url != url else None, processing_time_seconds=None, partial=None, profile_path=None, **changed
+    )
+
+def capture_page_timeline(driver):
+    """Selenium can't receive CDP trace events, so build a Chrome-trace-format timeline from the page's
+    Performance API entries, with Chrome's Performance.getMetrics counters as metadata."""
+    driver.execute_cdp_cmd("Performance.enable", {})
+    metrics = driver.execute_cdp_cmd("Performance.getMetrics", {}).get("metrics", [])
+    return {
+        "traceEvents": driver.execute_script(_JS_PERFORMANCE_TIMELINE) or [],
+        "metadata": {"url": driver.current_url, "performance_metrics": {m["name"]: m["value"] for m in metrics}},
+    }
+
+def scrape_targeted_sections(url: str, target_selectors: list[str] | None = None, profile: dict | None = None, deadline: Deadline | None = None, trace: bool = False):
+    profile = profile or get_profile(url)
+    deadline = deadline or Deadline()
+    if target_selectors is None:
+        target_selectors = profile["target_selectors"]
+    logger.info("Processing URL: %s (site profile: %s)", url, profile['name'])
+    driver = None
+    start_time = time.time()
+    result = {"url": url, "extracted_data": {selector: [] for selector in target_selectors}, "error": None, "error_class": None, "raw_error": None, "skipped_phases": []}
+
+    def skip_phase(phase):
+        if phase not in result["skipped_phases"]:
+            logger.warning("Time budget exhausted for %s; skipping %s.", url, phase)
+            result["skipped_phases"].append(phase)
+
+    reveal_actions = profile["reveal_actions"]
+    initial_button_xpaths = reveal_actions["initial_button_xpaths"]
+    expansion_button_texts = reveal_actions["expansion_button_texts"]
+    post_expansion_contact_xpaths = reveal_actions["post_expansion_contact_xpaths"]
+    fallback_selectors = profile.get("fallback_selectors", {})
+
+    timing = profile["timing"]
+    page_load_timeout = timing["page_load_timeout"]
+    button_wait_timeout = timing["button_wait_timeout"]
+    post_click_delay = timing["post_click_delay"]
+    post_expansion_click_delay = timing["post_expansion_click_delay"]
+    delay_before_post_expansion_search = timing["delay_before_post_expansion_search"]
+    second_expansion_click_delay = timing["second_expansion_click_delay"]
+    post_second_expansion_click_delay = timing["post_second_expansion_click_delay"]
+
+    try:
+        logger.debug("Acquiring WebDriver for Streamlit Cloud...")
+        driver = driver_manager.acquire(create_driver)
+        page_load_timeout = deadline.cap(page_load_timeout)
+        driver.set_page_load_timeout(page_load_timeout)
+        logger.debug("WebDriver ready.")
+
+        logger.debug("Loading page (Timeout: %ss)...", page_load_timeout)
+        driver.get(url)
+        WebDriverWait(driver, page_load_timeout).until(
+            EC.presence_of_element_located((By.TAG_NAME, 'body'))
+        )
+        logger.debug("Page loaded.")
+        initial_settle_delay = timing["initial_settle_delay"]
+        logger.debug("Allowing %ss for initial elements to settle...", initial_settle_delay)
+        time.sleep(deadline.cap(initial_settle_delay))
+        logger.debug("Post-load delay finished.")
+
+        logger.debug("Attempting to click initial reveal/expansion buttons...")
+        initial_click_attempts = 0
+        clicked_initial_button_texts = []
+        expansion_buttons_clicked = []
+        for xpath in initial_button_xpaths:
+            if deadline.expired():
+                skip_phase("reveal buttons")
+                break
+            button_wait_timeout = deadline.cap(button_wait_timeout)
+            post_click_delay = deadline.cap(post_click_delay)
+            is_expansion_xpath = any(txt in xpath.lower() for txt in expansion_button_texts)
+            try:
+                potential_buttons = WebDriverWait(driver, button_wait_timeout).until(
+                    EC.presence_of_all_elements_located((By.XPATH, xpath))
+                )
+                if not potential_buttons: continue
+                for i, button in enumerate(potential_buttons):
+                    if not isinstance(button, webdriver.remote.webelement.WebElement):
+                         logger.debug("Skipping invalid element found for XPath '%s' at index %s.", xpath, i)
+                         continue
+                    specific_xpath = f"({xpath})[{i+1}]"
+                    try:
+                        clicked, btn_text = click_button(driver, button, specific_xpath, button_wait_timeout, post_click_delay, click_attempt_description="(Attempt 1) ")
+                        if clicked:
+                            initial_click_attempts += 1
+                            clicked_initial_button_texts.append(f"'{btn_text}...'")
+                            if is_expansion_xpath:
+                                expansion_buttons_clicked.append(specific_xpath)
+                    except Exception as e_inner_click:
+                         logger.error("Error processing button %s for XPath '%s': %s", i+1, xpath, type(e_inner_click).__name__)
+            except TimeoutException:
+                 logger.warning("Timeout waiting for initial buttons for XPath '%s' (Wait: %ss).", xpath, button_wait_timeout)
+            except StaleElementReferenceException:
+                 logger.warning("StaleElementReferenceException while finding initial buttons for XPath '%s'.", xpath)
+            except Exception as e_find:
+                 logger.error("Error finding/processing elements with initial XPath '%s': %s - %s", xpath, type(e_find).__name__, e_find)
+
+        if expansion_buttons_clicked and deadline.expired():
+            skip_phase("second expansion clicks")
+        elif expansion_buttons_clicked:
+            second_expansion_click_delay = deadline.cap(second_expansion_click_delay)
+            post_second_expansion_click_delay = deadline.cap(post_second_expansion_click_delay)
+            logger.debug("Pausing %ss before attempting second click...", second_expansion_click_delay)
+            time.sleep(second_expansion_click_delay)
+            logger.debug("Attempting second click on %s expansion button(s)...", len(expansion_buttons_clicked))
+            second_click_success_count = 0
+            for specific_xpath in expansion_buttons_clicked:
+                button_wait_timeout = deadline.cap(button_wait_timeout)
+                try:
+                    button_element_for_second_click = WebDriverWait(driver, button_wait_timeout).until(
+                        EC.presence_of_element_located((By.XPATH, specific_xpath))
+                    )
+                    clicked, btn_text = click_button(driver, button_element_for_second_click, specific_xpath, button_wait_timeout, post_second_expansion_click_delay, click_attempt_description="(Attempt 2) ")
+                    if clicked:
+                        second_click_success_count += 1
+                        logger.info("Successfully performed second click on: '%s' XPath: %s", btn_text, specific_xpath)
+                except TimeoutException:
+                    logger.warning("Expansion button timed out before second click (Wait: %ss): %s", button_wait_timeout, specific_xpath)
+                except NoSuchElementException:
+                    logger.warning("Could not re-find expansion button for second click: %s", specific_xpath)
+                except Exception as e_second_click:
+                    logger.error("Error during second click attempt for XPath '%s': %s", specific_xpath, type(e_second_click).__name__)
+            if second_click_success_count > 0:
+                 logger.debug("Second click attempted successfully on %s expansion button(s).", second_click_success_count)
+
+        if initial_click_attempts > 0:
+            logger.debug("Initial click phase completed. Clicked: %s", ', '.join(clicked_initial_button_texts))
+        else:
+            logger.debug("No initial reveal/expansion buttons found or clicked.")
+
+        if post_expansion_contact_xpaths and delay_before_post_expansion_search:
+            logger.debug("Pausing %ss before post-expansion search...", delay_before_post_expansion_search)
+            time.sleep(deadline.cap(delay_before_post_expansion_search))
+            logger.debug("Pause finished.")
+
+        logger.debug("Attempting to click post-expansion contact buttons...")
+        post_expansion_clicks = 0
+        clicked_post_expansion_texts = []
+        for xpath in post_expansion_contact_xpaths:
+             if deadline.expired():
+                 skip_phase("contact reveal buttons")
+                 break
+             button_wait_timeout = deadline.cap(button_wait_timeout)
+             post_expansion_click_delay = deadline.cap(post_expansion_click_delay)
+             try:
+                potential_buttons = WebDriverWait(driver, button_wait_timeout).until(
+                    EC.presence_of_all_elements_located((By.XPATH, xpath))
+                )
+                if not potential_buttons: continue
+                for i, button in enumerate(potential_buttons):
+                    if not isinstance(button, webdriver.remote.webelement.WebElement):
+                         logger.debug("Skipping invalid post-expansion element found for XPath '%s' at index %s.", xpath, i)
+                         continue
+                    specific_xpath = f"({xpath})[{i+1}]"
+                    try:
+                        clicked, btn_text = click_button(driver, button, specific_xpath, button_wait_timeout, post_expansion_click_delay)
+                        if clicked:
+                             post_expansion_clicks += 1
+                             clicked_post_expansion_texts.append(f"'{btn_text}...'")
+                    except Exception as e_inner_click:
+                         logger.error("Error processing post-expansion button %s for XPath '%s': %s", i+1, xpath, type(e_inner_click).__name__)
+             except TimeoutException:
+                 logger.warning("Timeout waiting for post-expansion buttons for XPath '%s' (Wait: %ss).", xpath, button_wait_timeout)
+             except StaleElementReferenceException:
+                 logger.warning("StaleElementReferenceException while finding post-expansion buttons for XPath '%s'.", xpath)
+             except Exception as e_find:
+                 logger.error("Error finding/processing elements with post-expansion XPath '%s': %s - %s", xpath, type(e_find).__name__, e_find)
+
+        if post_expansion_clicks > 0:
+            logger.debug("Clicked %s post-expansion button(s): %s", post_expansion_clicks, ', '.join(clicked_post_expansion_texts))
+        else:
+            logger.debug("No post-expansion contact buttons found or clicked.")
+
+        logger.debug("Extracting content from target selectors...")
+        if not target_selectors:
+             logger.warning("No target CSS selectors provided for URL: %s", url)
+        extraction_start_time = time.time()
+        extracted_html_dict = result["extracted_data"]
+        extraction_wait_timeout = timing["extraction_wait_timeout"]
+        domain = normalize_domain(urlparse(url).netloc)
+        for i, selector in enumerate(target_selectors):
+            selector_start_time = time.time()
+            selector_wait_timeout = selector_registry.wait_timeout(domain, selector, extraction_wait_timeout)
+            if selector_wait_timeout and deadline.expired():
+                # Out of time: still take whatever is already in the DOM, just don't wait for more.
+                skip_phase("selector waits")
+                selector_wait_timeout = 0
+            else:
+                selector_wait_timeout = deadline.cap(selector_wait_timeout)
+            elements = []
+            try:
+                if selector_wait_timeout:
+                    WebDriverWait(driver, selector_wait_timeout).until(
+                        EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
+                    )
+                elif "selector waits" not in result["skipped_phases"]:
+                    logger.debug("Selector '%s' has been missing on recent %s pages; not waiting for it.", selector, domain)
+                elements = driver.find_elements(By.CSS_SELECTOR, selector)
+            except TimeoutException:
+                 logger.warning("Timeout waiting %ss for elements for selector: '%s'", selector_wait_timeout, selector)
+            except Exception as e:
+                logger.error("Error finding elements for selector '%s': %s - %s", selector, type(e).__name__, e)
+            if elements or "selector waits" not in result["skipped_phases"]:
+                selector_registry.record(domain, selector, bool(elements))
+
+            if not elements:
+                for fallback_selector in fallback_selectors.get(selector, []):
+                    try:
+                        elements = driver.find_elements(By.CSS_SELECTOR, fallback_selector)
+                    except Exception as e_fallback:
+                        logger.warning("Error finding elements for fallback selector '%s': %s", fallback_selector, type(e_fallback).__name__)
+                        elements = []
+                    if elements:
+                        logger.info("Using fallback selector '%s' for '%s' on %s", fallback_selector, selector, domain)
+                        break
+
+            if elements:
+                logger.debug("Found %s element(s) for selector: '%s' (took %.2fs)", len(elements), selector, time.time() - selector_start_time)
+                for element_index, element in enumerate(elements):
+                    try:
+                        if element.is_displayed():
+                            outer_html = element.get_attribute('outerHTML')
+                            if outer_html:
+                                extracted_html_dict[selector].append(outer_html.strip())
+                    except StaleElementReferenceException:
+                         logger.warning("Stale element %s encountered for selector '%s'.", element_index+1, selector)
+                    except Exception as e_html:
+                         logger.error("Error getting HTML for element %s selector '%s': %s", element_index+1, selector, type(e_html).__name__)
+        if target_selectors and "selector waits" not in result["skipped_phases"]:
+            selectors_hit = sum(1 for html_list in extracted_html_dict.values() if html_list)
+            selector_registry.end_page(domain, selectors_hit, len(target_selectors))
+        logger.debug("Finished extraction phase (took %.2fs)", time.time() - extraction_start_time)
+        if not any(extracted_html_dict.values()):
+            logger.warning("No HTML content extracted for any target selector for URL: %s", url)
+            try:
+                result["page_title"], result["page_text"] = driver.execute_script(_JS_PAGE_TEXT)
+            except WebDriverException as e_text:
+                logger.warning("Could not read the page text of %s: %s", url, type(e_text).__name__)
+
+    except WebDriverException as e:
+        raw_err_msg = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+        if "net::ERR_CONNECTION_REFUSED" in str(e) or "unable to connect to renderer" in str(e) or "DevToolsActivePort file doesn't exist" in str(e):
+            err_msg = f"WebDriver Error (Cloud Env): Potential issue connecting to the browser instance. Check `packages.txt` & resources. Details: {type(e).__name__}"
+        else:
+            err_msg = f"WebDriver Error: {type(e).__name__} - Check Selenium setup/options. Error: {e}"
+        logger.error("WebDriver error during scraping for %s: %s", url, err_msg, exc_info=True)
+        result["error"] = f"WebDriver setup/runtime error: {type(e).__name__}"
+        result["error_class"] = classify_error(raw_err_msg, default=BROWSER_ERROR)
+        result["raw_error"] = raw_err_msg
+    except TimeoutException as e:
+        raw_err_msg = f"Message: {getattr(e, 'msg', 'N/A')}\nStacktrace:\n{getattr(e, 'stacktrace', 'N/A')}"
+        err_msg = f"Timeout occurred during page load or element wait (Check page_load_timeout: {page_load_timeout}s or other waits). Details: {e.msg}"
+        logger.error("Timeout error during scraping for %s: %s\nRaw Error: %s", url, err_msg, raw_err_msg, exc_info=False)
+        result["error"] = err_msg
+        result["error_class"] = PAGE_TIMEOUT
+        result["raw_error"] = raw_err_msg
+    except Exception as e:
+        raw_err_msg = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+        err_msg = f"An unexpected error occurred during scraping: {type(e).__name__} - {e}"
+        logger.error("Unexpected error during scraping for %s: %s", url, err_msg, exc_info=True)
+        result["error"] = f"Unexpected scraping error: {type(e).__name__}"
+        result["error_class"] = classify_error(raw_err_msg)
+        result["raw_error"] = raw_err_msg
+    finally:
+        if driver and trace:
+            try:
+                result["trace"] = capture_page_timeline(driver)
+            except Exception as e:
+                logger.warning("Could not capture a page timeline for %s: %s: %s", url, type(e).__name__, e)
+        if driver:
+            # Healthy browsers go back to this thread's slot; anything that errored is quit (or killed).
+            driver_manager.release(driver, healthy=result["error"] is None and not deadline.cancelled())
+
+    total_time = time.time() - start_time
+    logger.info("Finished scraping %s in %.2f seconds. Error: %s", url, total_time, result['error'])
+    return result
+
+def archive_sections(url, extracted_data, archive_dir=ARCHIVE_DIR):
+    """Stores the raw section HTML for a URL so it can be replayed later without a browser."""
+    try:
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_name = hashlib.sha1(url.encode('utf-8')).hexdigest() + ".json"
+        archive_path = os.path.join(archive_dir, archive_name)
+        tmp_path = archive_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"url": url, "scraped_at": time.time(), "extracted_data": extracted_data}, f)
+        os.replace(tmp_path, archive_path)
+        return archive_path
+    except Exception as e:
+        logger.error("Failed to archive section HTML for %s: %s", url, e, exc_info=True)
+        return None
+
+def extract_from_sections(url, extracted_data, deadline=None, reuse_near_duplicates=True):
+    """Runs the post-scrape half of the pipeline: joins section HTML, calls Gemini and returns a ListingRecord.
+
+    Reposts of a listing this process already extracted only have REEXTRACT_FIELDS sent to Gemini.
+    """
+    all_html_parts = []
+    for selector, html_list in extracted_data.items():
+        if html_list:
+            all_html_parts.extend(html_list)
+
+    if not all_html_parts:
+        logger.warning("No HTML content was extracted by selectors for %s. Cannot proceed with AI analysis.", url)
+        return ListingRecord.failed(url, "No relevant HTML content found on page by selectors.")
+
+    signature = None
+    if reuse_near_duplicates:
+        page_text = compact_text(all_html_parts)
+        signature = simhash(page_text)
+        match = near_duplicate_index.find(signature) if signature is not None else None
+        if match is not None:
+            record = _reuse_near_duplicate(url, page_text, *match, deadline)
+            if record is not None:
+                return record
+
+    combined_html = "\n\n".join(all_html_parts)
+    logger.info("Scraping completed for %s, combined HTML length: %s. Proceeding to AI extraction.", url, len(combined_html))
+
+    record = extract_property_details(combined_html, url, get_profile(url).get("prompt_hints", ""), deadline)
+    if record.error:
+        logger.error("AI extraction error for %s: %s", url, record.error)
+    elif not record.has_key_data():
+        record.error = "Processing completed but key data might be missing (AI extraction likely failed)."
+        record.error_class = MISSING_KEY_DATA
+    else:
+        logger.info("Successfully extracted data for %s.", url)
+        if signature is not None:
+            near_duplicate_index.add(signature, dataclasses.replace(record))
+    return record
+
+def scrape(url, profile=None, deadline=None, trace=False):
+    """Scrapes a listing's target sections with the configured render engine."""
+    profile = profile or get_profile(url)
+    if profile.get("fetch_tier", "browser") != "browser":
+        logger.warning("Fetch tier '%s' for profile '%s' is not supported; using the browser.", profile['fetch_tier'], profile['name'])
+    with url_context(url):
+        if RENDER_ENGINE == "cdp":
+            return get_cdp_engine().scrape(url, profile=profile, deadline=deadline, trace=trace)
+        return scrape_targeted_sections(url, profile=profile, deadline=deadline, trace=trace)
+
+def process_url(url, archive_dir=ARCHIVE_DIR, cancel_event=None, budget_factor=1.0):
+    with url_context(url):
+        process_start_time = time.perf_counter()
+        logger.info("Processing URL: %s", url)
+        profile_session = start_profile(url)
+        profile_path = None
+        scrape_result = {}
+        try:
+            timing = get_profile(url)["timing"]
+            deadline = Deadline(timing["url_budget"] * budget_factor, cancel_event)
+            # The browser phases may not eat into the time kept back for the Gemini call.
+            scrape_result = scrape(
+                url, deadline=deadline.reserve(timing["ai_budget_reserve"]),
+                trace=profile_session is not None and profile_session.wants_trace
+            )
+
+            scraper_error = scrape_result.get("error")
+            if deadline.cancelled():
+                logger.info("Attempt for %s was cancelled; skipping AI extraction.", url)
+                record = ListingRecord.failed(url, "Cancelled: another attempt for this listing finished first.")
+            elif scraper_error:
+                logger.error("Scraping failed for %s: %s", url, scraper_error)
+                record = ListingRecord.failed(url, f"Scraping failed: {scraper_error}", scrape_result.get("error_class"))
+            else:
+                extracted_data = scrape_result.get("extracted_data", {})
+                if archive_dir and any(extracted_data.values()):
+                    archive_sections(url, extracted_data, archive_dir)
+                record = extract_from_sections(url, extracted_data, deadline)
+                if scrape_result.get("skipped_phases") and not record.error:
+                    record.partial = f"Time budget of {timing['url_budget'] * budget_factor:.0f}s exhausted; skipped {', '.join(scrape_result['skipped_phases'])}."
+        finally:
+            # Always unregister, or the sampler keeps recording whatever this thread runs next.
+            if profile_session is not None:
+                profile_session.trace = scrape_result.get("trace")
+                profile_path = profile_session.finish()
+
+        process_end_time = time.perf_counter()
+        duration = process_end_time - process_start_time
+        record.processing_time_seconds = round(duration, 2)
+        record.profile_path = profile_path
+        logger.info("Finished processing %s in %.2f seconds.", url, duration)
+
+        return record
+
+def process_url_retry(url, archive_dir=ARCHIVE_DIR, cancel_event=None):
+    """Retry-lane entry point: same as process_url with a longer time budget."""
+    return process_url(url, archive_dir, cancel_event, budget_factor=RETRY_BUDGET_FACTOR)
@@ -0,0 +1,200 @@
+# process_workers.py
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from failures import RETRY_BUDGET_FACTOR
+from listing_schema import ListingRecord
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+TASK_HARD_TIMEOUT = 180         # Seconds before a worker and its browser process tree are killed
+# Entry points that run with a larger time budget get their hard timeout scaled by the same factor.
+TASK_BUDGET_FACTORS = {"process_url_retry": RETRY_BUDGET_FACTOR}
+WORKER_JOIN_TIMEOUT = 10
+COORDINATOR_POLL_INTERVAL = 0.2
+
+
+def _worker_main(worker_id, api_key, task_queue, result_queue):
+    """Runs in a child process: owns its own browser(s) and executes one task at a time."""
+    if hasattr(os, 'setpgrp'):
+        # Own process group, so the coordinator can kill chromedriver/chromium along with us.
+        os.setpgrp()
+    from structured_logging import configure_logging, process_log_file
+    configure_logging(f'%(asctime)s - %(levelname)s - [worker {worker_id}] %(message)s', process_log_file(f"worker{worker_id}"))
+    import pipeline
+    pipeline.configure_gemini(api_key)
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, fn, args = task
+        try:
+            result_queue.put((worker_id, task_id, fn(*args), None))
+        except Exception as e:
+            result_queue.put((worker_id, task_id, None, f"{type(e).__name__}: {e}"))
+    pipeline.driver_manager.close_all()
+
+
+def kill_process_tree(process):
+    """Kills a worker process and everything in its process group (chromedriver, chromium)."""
+    if process.pid is None:
+        return
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass  # Worker had not created its process group yet (or is already gone)
+    if process.is_alive():
+        process.kill()
+    process.join(WORKER_JOIN_TIMEOUT)
+
+
+class _Worker:
+    def __init__(self, worker_id, context, api_key, result_queue):
+        self.worker_id = worker_id
+        self.task_queue = context.Queue()
+        self.process = context.Process(
+            target=_worker_main, args=(worker_id, api_key, self.task_queue, result_queue), daemon=True
+        )
+        self.process.start()
+        self.task_id = None
+        self.task_started = None
+        self.task_timeout = None
+
+
+class ProcessWorkerPool:
+    """Executor-compatible pool where every worker is a separate process with its own browser.
+
+    Tasks that exceed `task_timeout` (scaled per entry point by TASK_BUDGET_FACTORS) get their worker's
+    whole process tree killed and resolve to a failed ListingRecord; crashed or killed workers are replaced automatically. Submitted callables
+    must be importable module-level functions whose first argument is the listing URL.
+    """
+
+    def __init__(self, max_workers, api_key, task_timeout=TASK_HARD_TIMEOUT):
+        self._context = multiprocessing.get_context('spawn')
+        self._api_key = api_key
+        self._task_timeout = task_timeout
+        self._result_queue = self._context.Queue()
+        self._worker_ids = itertools.count()
+        self._task_ids = itertools.count()
+        self._pending = queue.Queue()
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._shutdown = threading.Event()
+        self._workers = [self._spawn_worker() for _ in range(max_workers)]
+        self._coordinator = threading.Thread(target=self._coordinate, name="process-pool-coordinator", daemon=True)
+        self._coordinator.start()
+
+    def _spawn_worker(self):
+        return _Worker(next(self._worker_ids), self._context, self._api_key, self._result_queue)
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._tasks[task_id] = (future, fn, args)
+        self._pending.put(task_id)
+        return future
+
+    def _finish(self, task_id, record=None, error=None):
+        with self._lock:
+            future, fn, args = self._tasks.pop(task_id, (None, None, None))
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_result(ListingRecord.failed(args[0], error))
+        else:
+            future.set_result(record)
+
+    def _dispatch(self):
+        for worker in self._workers:
+            if worker.task_id is not None:
+                continue
+            try:
+                task_id = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                future, fn, args = self._tasks[task_id]
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._tasks.pop(task_id, None)
+                continue
+            worker.task_id = task_id
+            worker.task_started = time.monotonic()
+            worker.task_timeout = self._task_timeout * TASK_BUDGET_FACTORS.get(fn.__name__, 1)
+            worker.task_queue.put((task_id, fn, args))
+
+    def _collect(self):
+        try:
+            worker_id, task_id, record, error = self._result_queue.get(timeout=COORDINATOR_POLL_INTERVAL)
+        except queue.Empty:
+            return
+        for worker in self._workers:
+            if worker.worker_id == worker_id and worker.task_id == task_id:
+                worker.task_id = None
+                worker.task_started = None
+                worker.task_timeout = None
+        self._finish(task_id, record, error)
+
+    def _reap(self):
+        now = time.monotonic()
+        for index, worker in enumerate(self._workers):
+            timed_out = worker.task_id is not None and now - worker.task_started > worker.task_timeout
+            if not timed_out and worker.process.is_alive():
+                continue
+            if timed_out:
+                logger.error("Worker %s exceeded the %.0fs hard timeout; killing its process tree.", worker.worker_id, worker.task_timeout)
+                error = f"Worker killed after exceeding the {worker.task_timeout:.0f}s hard timeout."
+            else:
+                logger.error("Worker %s exited unexpectedly (exit code %s); replacing it.", worker.worker_id, worker.process.exitcode)
+                error = f"Worker process crashed (exit code {worker.process.exitcode})."
+            kill_process_tree(worker.process)
+            if worker.task_id is not None:
+                self._finish(worker.task_id, error=error)
+            self._workers[index] = self._spawn_worker()
+
+    def _coordinate(self):
+        while not self._shutdown.is_set():
+            try:
+                self._dispatch()
+                self._collect()
+                self._reap()
+            except Exception as e:
+                logger.error("Process pool coordinator error: %s", e, exc_info=True)
+
+    def shutdown(self, wait=True):
+        if wait:
+            while True:
+                with self._lock:
+                    if not self._tasks:
+                        break
+                time.sleep(COORDINATOR_POLL_INTERVAL)
+        self._shutdown.set()
+        self._coordinator.join()
+        for worker in self._workers:
+            worker.task_queue.put(None)
+        for worker in self._workers:
+            worker.process.join(WORKER_JOIN_TIMEOUT)
+            if worker.process.is_alive():
+                kill_process_tree(worker.process)
+        with self._lock:
+            leftover, self._tasks = self._tasks, {}
+        for future, fn, args in leftover.values():
+            if not future.cancel() and not future.done():
+                future.set_result(ListingRecord.failed(args[0], "Worker pool shut down."))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown(wait=exc_type is None)
+        return False
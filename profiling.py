@@ -0,0 +1,157 @@
+# profiling.py
+import collections
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+PROFILE_FRACTION = float(os.environ.get("LISTINGLENS_PROFILE_FRACTION", "0"))          # Share of URLs picked for profiling up front
+PROFILE_SLOW_SECONDS = float(os.environ.get("LISTINGLENS_PROFILE_SLOW_SECONDS", "0"))  # Also keep profiles of URLs slower than this (0 = off)
+PROFILE_DIR = os.environ.get("LISTINGLENS_PROFILE_DIR", "profiles")  # Where workers write; front ends collect from here
+SAMPLE_INTERVAL = 0.01
+MAX_STACK_DEPTH = 80
+STACKS_SUFFIX = ".folded"
+TRACE_SUFFIX = ".trace.json"
+
+
+def profiling_enabled():
+    return PROFILE_FRACTION > 0 or PROFILE_SLOW_SECONDS > 0
+
+
+def _fold(frame):
+    """Renders a stack root-first in the collapsed format flamegraph.pl and speedscope read."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class _StackSampler:
+    """One background thread that snapshots the Python stack of every registered thread each interval.
+
+    Unlike cProfile there is no per-call hook, so profiled threads run at full speed; the cost is one
+    sys._current_frames() call per interval however many URLs are being profiled.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._thread = None
+
+    def register(self, thread_id):
+        counts = collections.Counter()
+        with self._lock:
+            self._targets[thread_id] = counts
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        return counts
+
+    def unregister(self, thread_id):
+        with self._lock:
+            self._targets.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, counts in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counts[_fold(frame)] += 1
+                del frames
+
+
+_sampler = _StackSampler()
+
+
+class ProfileSession:
+    """Profiling state for one URL on the calling thread.
+
+    Sampling runs for every URL while profiling is enabled; whether the artifacts are kept is only
+    decided in finish(), so URLs that turn out slow are caught without knowing it in advance.
+    """
+
+    def __init__(self, url, directory=PROFILE_DIR):
+        self.url = url
+        self.directory = directory
+        self.selected = random.random() < PROFILE_FRACTION
+        self.trace = None  # Chrome trace dict, filled in by the scraper when wants_trace is set
+        self._thread_id = threading.get_ident()
+        self._counts = _sampler.register(self._thread_id)
+        self._start_time = time.perf_counter()
+
+    @property
+    def wants_trace(self):
+        return self.selected or PROFILE_SLOW_SECONDS > 0
+
+    def finish(self):
+        """Stops sampling and writes the artifacts if the URL was picked or ran slow; returns the stack profile path."""
+        _sampler.unregister(self._thread_id)
+        elapsed = time.perf_counter() - self._start_time
+        if not self.selected and not (PROFILE_SLOW_SECONDS > 0 and elapsed >= PROFILE_SLOW_SECONDS):
+            return None
+        stem = os.path.join(
+            self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{hashlib.sha1(self.url.encode('utf-8')).hexdigest()[:12]}"
+        )
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(stem + STACKS_SUFFIX, 'w', encoding='utf-8') as f:
+                for stack, count in self._counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            if self.trace is not None:
+                with open(stem + TRACE_SUFFIX, 'w', encoding='utf-8') as f:
+                    json.dump(self.trace, f)
+        except Exception as e:
+            logger.error("Failed to save profile for %s: %s", self.url, e, exc_info=True)
+            return None
+        reason = "sampled" if self.selected else f"slower than {PROFILE_SLOW_SECONDS:.0f}s"
+        logger.info("Saved profile for %s (%s, %.1fs, %s samples) -> %s", self.url, reason, elapsed, sum(self._counts.values()), stem)
+        return stem + STACKS_SUFFIX
+
+
+def start_profile(url, directory=PROFILE_DIR):
+    """Returns a ProfileSession for `url`, or None when profiling is switched off."""
+    return ProfileSession(url, directory) if profiling_enabled() else None
+
+
+def trace_path(stacks_path):
+    """The Chrome trace saved alongside a stack profile, if one was captured."""
+    path = stacks_path[:-len(STACKS_SUFFIX)] + TRACE_SUFFIX
+    return path if os.path.exists(path) else None
+
+
+def collect_profile(stacks_path, directory):
+    """Moves a stack profile and its trace into `directory` (e.g. next to a batch's results); returns the new path.
+
+    Workers only know the URL, so they write to PROFILE_DIR and the front end gathers what its batch
+    produced. Profiles written on another machine (queue mode) aren't visible here and keep their path.
+    """
+    if not os.path.exists(stacks_path):
+        return stacks_path
+    trace = trace_path(stacks_path)
+    target = os.path.join(directory, os.path.basename(stacks_path))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        shutil.move(stacks_path, target)
+        if trace is not None:
+            shutil.move(trace, target[:-len(STACKS_SUFFIX)] + TRACE_SUFFIX)
+    except OSError as e:
+        logger.warning("Could not move profile %s to %s: %s", stacks_path, directory, e)
+        return stacks_path if os.path.exists(stacks_path) else target
+    return target
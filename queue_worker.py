@@ -0,0 +1,95 @@
+# queue_worker.py
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+
+import pipeline
+from credentials import load_api_key
+from listing_schema import ListingRecord
+from structured_logging import configure_logging, process_log_file
+from task_queue import DEFAULT_QUEUE_PATH, LEASE_SECONDS, QUEUE_POLL_INTERVAL, SQLiteTaskQueue
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+TASKS = {
+    "process_url": pipeline.process_url,
+    "process_url_retry": pipeline.process_url_retry,
+}
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 4
+
+
+def _heartbeat(queue, task_id, worker_id, done):
+    while not done.wait(HEARTBEAT_INTERVAL):
+        if not queue.heartbeat(task_id, worker_id):
+            logger.warning("Lost the lease on task %s; its result will be discarded if another worker finished first.", task_id)
+            return
+
+
+def run_worker_thread(queue_path, worker_id, stop):
+    """Leases tasks until `stop` is set, keeping the lease alive while each one runs."""
+    queue = SQLiteTaskQueue(queue_path)
+    while not stop.is_set():
+        leased = queue.lease(worker_id)
+        if leased is None:
+            stop.wait(QUEUE_POLL_INTERVAL)
+            continue
+        task_id, task, url = leased
+        done = threading.Event()
+        threading.Thread(target=_heartbeat, args=(queue, task_id, worker_id, done), daemon=True).start()
+        try:
+            fn = TASKS.get(task)
+            if fn is None:
+                record = ListingRecord.failed(url, f"Unknown task type: {task}")
+            else:
+                record = fn(url)
+        except Exception as e:
+            logger.error("Task %s (%s) raised: %s", task_id, url, e, exc_info=True)
+            record = ListingRecord.failed(url, f"Critical processing error: {e}")
+        finally:
+            done.set()
+        queue.complete(task_id, record)
+
+
+def main(argv=None):
+    configure_logging(
+        '%(asctime)s - %(levelname)s - %(threadName)s - %(message)s',
+        process_log_file(f"{socket.gethostname()}-{os.getpid()}")
+    )
+    parser = argparse.ArgumentParser(description="Run ListingLens browser workers against a shared task queue.")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Path to the shared SQLite queue file.")
+    parser.add_argument("--threads", type=int, default=pipeline.MAX_CONCURRENT_WORKERS)
+    args = parser.parse_args(argv)
+
+    api_key = load_api_key()
+    if not api_key:
+        logger.error("GOOGLE_API_KEY not set in the environment or Streamlit secrets.")
+        return 1
+    pipeline.configure_gemini(api_key)
+
+    node_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=run_worker_thread, args=(args.queue, f"{node_id}:{index}", stop), name=f"queue-worker-{index}")
+        for index in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    logger.info("Worker node %s serving %s with %s thread(s).", node_id, args.queue, args.threads)
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+    except KeyboardInterrupt:
+        logger.info("Stopping after the tasks in progress finish...")
+        stop.set()
+        for thread in threads:
+            thread.join()
+    pipeline.driver_manager.close_all()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
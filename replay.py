@@ -0,0 +1,135 @@
+# replay.py
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+
+from credentials import load_api_key
+from listing_schema import ListingRecord
+from pipeline import ARCHIVE_DIR, COLUMN_ORDER, configure_gemini, extract_from_sections
+from results_store import RESULT_CHUNK_SIZE, RESULT_SCHEMA, normalize_records
+from structured_logging import configure_logging, process_log_file, url_context
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+REPLAY_MAX_WORKERS = 32
+REPLAY_QUEUE_FACTOR = 4
+
+# --- Helper Functions ---
+def iter_archived_sections(archive_dir=ARCHIVE_DIR):
+    """Yields archived section records one at a time so large archives are never loaded whole."""
+    with os.scandir(archive_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+                if record.get("url") and isinstance(record.get("extracted_data"), dict):
+                    yield record
+                else:
+                    logger.warning("Skipping malformed archive entry: %s", entry.path)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning("Could not read archive entry %s: %s", entry.path, e)
+
+def replay_record(record):
+    replay_start_time = time.perf_counter()
+    url = record["url"]
+    with url_context(url):
+        # Replays measure the full prompt, so every page gets a full extraction.
+        listing = extract_from_sections(url, record["extracted_data"], reuse_near_duplicates=False)
+    listing.processing_time_seconds = round(time.perf_counter() - replay_start_time, 2)
+    return listing
+
+def replay_archive(archive_dir=ARCHIVE_DIR, max_workers=REPLAY_MAX_WORKERS):
+    """Re-runs extraction over every archived page in parallel, yielding results as they complete."""
+    max_in_flight = max_workers * REPLAY_QUEUE_FACTOR
+    records = iter_archived_sections(archive_dir)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        for record in records:
+            in_flight[executor.submit(replay_record, record)] = record["url"]
+            if len(in_flight) >= max_in_flight:
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield _future_result(future, in_flight.pop(future))
+        for future in concurrent.futures.as_completed(in_flight):
+            yield _future_result(future, in_flight[future])
+
+def _future_result(future, url):
+    try:
+        return future.result()
+    except Exception as exc:
+        logger.error("Critical exception replaying %s: %s", url, exc, exc_info=True)
+        return ListingRecord.failed(url, f"Critical processing error: {exc}")
+
+def write_results_csv(results, out_path, chunk_size=RESULT_CHUNK_SIZE):
+    """Writes results in chunks, normalized exactly like the UI's ResultStore batches, so the two stay comparable."""
+    count = 0
+    results = iter(results)
+    with open(out_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_SCHEMA.names, extrasaction='ignore')
+        writer.writeheader()
+        while chunk := list(itertools.islice(results, chunk_size)):
+            writer.writerows(normalize_records(chunk).to_pylist())
+            count += len(chunk)
+    return count
+
+def diff_results(old_csv, new_csv, ignore_columns=('processing_time_seconds', 'duplicate_of', 'partial', 'profile_path')):
+    """Compares two result sets by URL and returns (url, column, old_value, new_value) tuples."""
+    with open(old_csv, 'r', newline='', encoding='utf-8') as f:
+        old_rows = {row['url']: row for row in csv.DictReader(f)}
+    changes = []
+    with open(new_csv, 'r', newline='', encoding='utf-8') as f:
+        for new_row in csv.DictReader(f):
+            url = new_row['url']
+            old_row = old_rows.pop(url, None)
+            if old_row is None:
+                changes.append((url, '(row)', '', 'added'))
+                continue
+            for col in COLUMN_ORDER:
+                if col in ignore_columns:
+                    continue
+                if old_row.get(col, '') != new_row.get(col, ''):
+                    changes.append((url, col, old_row.get(col, ''), new_row.get(col, '')))
+    for url in old_rows:
+        changes.append((url, '(row)', 'removed', ''))
+    return changes
+
+def main(argv=None):
+    configure_logging(log_file=process_log_file("replay"))
+    parser = argparse.ArgumentParser(description="Re-run AI extraction over archived listing HTML without a browser.")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--out", default="property_data_replay.csv")
+    parser.add_argument("--workers", type=int, default=REPLAY_MAX_WORKERS)
+    parser.add_argument("--diff-against", help="Previous result CSV to diff the new result set against.")
+    args = parser.parse_args(argv)
+
+    api_key = load_api_key()
+    if not api_key:
+        logger.error("GOOGLE_API_KEY not set in the environment or Streamlit secrets.")
+        return 1
+    configure_gemini(api_key)
+
+    batch_start_time = time.perf_counter()
+    count = write_results_csv(replay_archive(args.archive_dir, args.workers), args.out)
+    logger.info("Replayed %s archived listings in %.2f seconds -> %s", count, time.perf_counter() - batch_start_time, args.out)
+
+    if args.diff_against:
+        changes = diff_results(args.diff_against, args.out)
+        diff_path = os.path.splitext(args.out)[0] + "_diff.csv"
+        with open(diff_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['url', 'column', 'old_value', 'new_value'])
+            writer.writerows(changes)
+        logger.info("%s field change(s) against %s -> %s", len(changes), args.diff_against, diff_path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
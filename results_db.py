@@ -0,0 +1,195 @@
+# results_db.py
+import dataclasses
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from listing_schema import INTEGER_FIELDS, ListingRecord
+from url_canonical import listing_key
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_RESULTS_DB_PATH = os.environ.get("LISTINGLENS_RESULTS_DB", "listinglens_results.db")
+DISTINCT_VALUES_LIMIT = 5000
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+RECORD_FIELDS = tuple(field.name for field in dataclasses.fields(ListingRecord))
+# Successful records only, so the error columns are left out; RM/sqft is derived in SQL instead.
+STORED_FIELDS = tuple(field for field in RECORD_FIELDS if field not in ('partial', 'profile_path', 'error', 'error_class')) + ('listing_type',)
+FILTER_COLUMNS = ('state', 'area', 'property_type', 'listing_type')
+SORT_COLUMNS = STORED_FIELDS + ('rm_per_sqft', 'last_seen')
+GROUP_COLUMNS = ('area', 'state', 'property_type', 'listing_type', 'project_name')
+_RM_PER_SQFT = "CASE WHEN price > 0 AND sq_ft > 0 THEN CAST(price AS REAL) / sq_ft END"
+
+
+def _column_type(field):
+    if field in INTEGER_FIELDS:
+        return "INTEGER"
+    if field == 'processing_time_seconds':
+        return "REAL"
+    return "TEXT"
+
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS listings (
+    listing_key TEXT PRIMARY KEY,
+    {", ".join(f"{field} {_column_type(field)}" for field in STORED_FIELDS)},
+    batch_id TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+"""
+# Created after the column migration in ResultsDatabase.__init__, since they may index a new column.
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_listings_state ON listings (state);
+CREATE INDEX IF NOT EXISTS idx_listings_area ON listings (area);
+CREATE INDEX IF NOT EXISTS idx_listings_property_type ON listings (property_type);
+CREATE INDEX IF NOT EXISTS idx_listings_listing_type ON listings (listing_type);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);
+CREATE INDEX IF NOT EXISTS idx_listings_sq_ft ON listings (sq_ft);
+"""
+
+
+def _where(filters):
+    """Builds a parameterised WHERE clause from a filter dict (see ResultsDatabase.query)."""
+    clauses, params = [], []
+    for column in FILTER_COLUMNS:
+        values = filters.get(column)
+        if values:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    for column in ('price', 'sq_ft'):
+        if filters.get(f"min_{column}"):
+            clauses.append(f"{column} >= ?")
+            params.append(filters[f"min_{column}"])
+        if filters.get(f"max_{column}"):
+            clauses.append(f"{column} <= ?")
+            params.append(filters[f"max_{column}"])
+    if filters.get("text"):
+        clauses.append("(listing_title LIKE ? OR project_name LIKE ?)")
+        params.extend([f"%{filters['text']}%"] * 2)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class ResultsDatabase:
+    """Every successfully extracted listing across batches, one row per listing (latest extraction wins).
+
+    Filtering, sorting, paging and aggregates run inside SQLite, so the UI only ever loads one page.
+    """
+
+    def __init__(self, path=DEFAULT_RESULTS_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        # Databases created before a ListingRecord field was added get the new column.
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(listings)")}
+        for field in STORED_FIELDS:
+            if field not in existing:
+                conn.execute(f"ALTER TABLE listings ADD COLUMN {field} {_column_type(field)}")
+        conn.executescript(_INDEXES)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add_batch(self, batch, batch_id=None):
+        """Upserts the successful rows of a normalized ResultStore batch (see results_store.py)."""
+        rows = [
+            (listing_key(row['url']), *(row[field] for field in STORED_FIELDS), batch_id)
+            for row in batch.select(('error',) + STORED_FIELDS).to_pylist() if not row['error']
+        ]
+        if not rows:
+            return
+        now = time.time()
+        columns = ("listing_key",) + STORED_FIELDS + ("batch_id",)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                f"INSERT INTO listings ({', '.join(columns)}, first_seen, last_seen)"
+                f" VALUES ({', '.join('?' * len(columns))}, ?, ?)"
+                f" ON CONFLICT(listing_key) DO UPDATE SET {updates}, last_seen = excluded.last_seen",
+                [row + (now, now) for row in rows]
+            )
+        logger.debug("Stored %s listing(s) in %s", len(rows), self.path)
+
+    def has(self, key):
+        """Whether a listing (by url_canonical.listing_key) is already stored; the harvester calls this from its fetch thread."""
+        return self._connection().execute("SELECT 1 FROM listings WHERE listing_key = ?", (key,)).fetchone() is not None
+
+    def count(self, filters=None):
+        where, params = _where(filters or {})
+        return self._connection().execute(f"SELECT COUNT(*) FROM listings {where}", params).fetchone()[0]
+
+    def distinct_values(self, column):
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot list values of column '{column}'.")
+        rows = self._connection().execute(
+            f"SELECT DISTINCT {column} FROM listings WHERE {column} IS NOT NULL ORDER BY {column} LIMIT ?",
+            (DISTINCT_VALUES_LIMIT,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def query(self, filters=None, sort_by='last_seen', descending=True, limit=100, offset=0):
+        """Returns one page of listings matching `filters` as a DataFrame.
+
+        `filters` may hold lists for state/area/property_type, min_/max_ bounds for price and sq_ft,
+        and `text` to search titles and project names.
+        """
+        import pandas as pd
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by '{sort_by}'.")
+        where, params = _where(filters or {})
+        return pd.read_sql_query(
+            f"SELECT {', '.join(STORED_FIELDS)}, ROUND({_RM_PER_SQFT}, 2) AS rm_per_sqft,"
+            f" datetime(last_seen, 'unixepoch') AS last_seen FROM listings {where}"
+            f" ORDER BY {sort_by} IS NULL, {sort_by} {'DESC' if descending else 'ASC'} LIMIT ? OFFSET ?",
+            self._connection(), params=params + [limit, offset]
+        )
+
+    def aggregate(self, filters=None, group_by='area', min_listings=1, limit=500):
+        """Per-group listing count and median price and RM/sqft, computed with window functions in SQLite."""
+        import pandas as pd
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by '{group_by}'.")
+        where, params = _where(filters or {})
+        return pd.read_sql_query(
+            f"""
+            WITH filtered AS (
+                SELECT {group_by} AS grp, price, {_RM_PER_SQFT} AS rm_per_sqft
+                FROM listings {where}
+            ), ranked AS (
+                SELECT grp, price, rm_per_sqft,
+                       COUNT(*) OVER (PARTITION BY grp) AS n,
+                       COUNT(price) OVER (PARTITION BY grp) AS n_price,
+                       ROW_NUMBER() OVER (PARTITION BY grp ORDER BY price IS NULL, price) AS price_rank,
+                       COUNT(rm_per_sqft) OVER (PARTITION BY grp) AS n_rate,
+                       ROW_NUMBER() OVER (PARTITION BY grp ORDER BY rm_per_sqft IS NULL, rm_per_sqft) AS rate_rank
+                FROM filtered WHERE grp IS NOT NULL
+            )
+            SELECT grp AS {group_by}, n AS listings,
+                   AVG(CASE WHEN price_rank IN ((n_price + 1) / 2, (n_price + 2) / 2) THEN price END) AS median_price,
+                   ROUND(AVG(CASE WHEN rate_rank IN ((n_rate + 1) / 2, (n_rate + 2) / 2) THEN rm_per_sqft END), 2) AS median_rm_per_sqft,
+                   n_rate AS listings_with_sq_ft
+            FROM ranked
+            GROUP BY grp
+            HAVING n >= ?
+            ORDER BY listings DESC
+            LIMIT ?
+            """,
+            self._connection(), params=params + [min_listings, limit]
+        )
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,106 @@
+# results_store.py
+import csv
+import dataclasses
+import logging
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from listing_schema import INTEGER_FIELDS, ListingRecord
+from normalization import DERIVED_FIELDS, normalize_batch
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+RESULT_CHUNK_SIZE = 500
+PREVIEW_ROW_LIMIT = 1000
+
+RECORD_SCHEMA = pa.schema([
+    (field, pa.int64() if field in INTEGER_FIELDS
+     else pa.float64() if field == 'processing_time_seconds'
+     else pa.string())
+    for field in (f.name for f in dataclasses.fields(ListingRecord))
+])
+RESULT_SCHEMA = pa.schema(list(RECORD_SCHEMA) + [pa.field(name, kind) for name, kind in DERIVED_FIELDS.items()])
+PANDAS_TYPES = {pa.int64(): pd.Int64Dtype(), pa.float64(): pd.Float64Dtype(), pa.string(): pd.StringDtype()}
+
+
+def normalize_records(records):
+    """Normalized RecordBatch of a handful of ListingRecords, for callers that stream results instead of storing them."""
+    return normalize_batch(pa.RecordBatch.from_pylist([record.to_dict() for record in records], schema=RECORD_SCHEMA))
+
+
+class ResultStore:
+    """Appends ListingRecords to an on-disk Parquet file in Arrow record batches so memory stays flat.
+
+    Each batch is normalized (see normalization.py) before it is written; `on_batch`, if given, is
+    called with every normalized batch.
+    """
+
+    def __init__(self, name, directory=None, chunk_size=RESULT_CHUNK_SIZE, on_batch=None):
+        self.directory = directory or tempfile.mkdtemp(prefix="listinglens_")
+        self.parquet_path = os.path.join(self.directory, f"{name}.parquet")
+        self.chunk_size = chunk_size
+        self.on_batch = on_batch
+        self.row_count = 0
+        self._buffer = {field: [] for field in RECORD_SCHEMA.names}
+        self._buffered = 0
+        self._writer = pq.ParquetWriter(self.parquet_path, RESULT_SCHEMA, compression='zstd')
+
+    def append(self, record):
+        for field in RECORD_SCHEMA.names:
+            self._buffer[field].append(getattr(record, field))
+        self._buffered += 1
+        self.row_count += 1
+        if self._buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered or self._writer is None:
+            return
+        batch = normalize_batch(pa.RecordBatch.from_pydict(self._buffer, schema=RECORD_SCHEMA))
+        self._writer.write_batch(batch)
+        self._buffer = {field: [] for field in RECORD_SCHEMA.names}
+        self._buffered = 0
+        if self.on_batch is not None:
+            self.on_batch(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    def iter_batches(self, columns=None, batch_size=RESULT_CHUNK_SIZE):
+        self.close()
+        if not self.row_count:
+            return
+        yield from pq.ParquetFile(self.parquet_path).iter_batches(batch_size=batch_size, columns=columns)
+
+    def preview(self, columns=None, limit=PREVIEW_ROW_LIMIT):
+        """Returns up to `limit` rows as a DataFrame with nullable numeric dtypes."""
+        batches = []
+        rows = 0
+        for batch in self.iter_batches(columns=columns):
+            batches.append(batch.slice(0, limit - rows))
+            rows += batches[-1].num_rows
+            if rows >= limit:
+                break
+        if not batches:
+            return pd.DataFrame(columns=columns or RESULT_SCHEMA.names)
+        return pa.Table.from_batches(batches).to_pandas(types_mapper=PANDAS_TYPES.get)
+
+    def write_csv(self, csv_path=None, columns=None):
+        """Streams the store to a CSV file batch by batch and returns its path."""
+        csv_path = csv_path or os.path.splitext(self.parquet_path)[0] + ".csv"
+        columns = columns or RESULT_SCHEMA.names
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for batch in self.iter_batches(columns=columns):
+                writer.writerows(zip(*(batch.column(name).to_pylist() for name in columns)))
+        logger.info("Wrote %s rows to %s", self.row_count, csv_path)
+        return csv_path
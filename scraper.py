@@ -10,17 +10,23 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException,
 import traceback # Keep for detailed error logging
 from bs4 import BeautifulSoup # For parsing HTML text
 
+from site_profiles import get_profile # Per-domain selectors, reveal buttons and timings
+
 # --- Configuration ---
 CHROME_DRIVER_PATH = r'C:\Users\estan\Documents\GitHub\Playground\chromedriver-win64\chromedriver.exe' # <--- UPDATE THIS PATH (Keep your original path)
 
-# Timeouts (in seconds)
-PAGE_LOAD_TIMEOUT = 4 # Increased timeout slightly, pages can be slow
-BUTTON_WAIT_TIMEOUT = 2 # Longer wait specifically for buttons to become clickable
-POST_CLICK_DELAY = 1.5    # Wait longer after clicking, for content reveal/state changes
-POST_EXPANSION_CLICK_DELAY = 1.5 # Shorter delay after clicking a secondary button like 'show contact number'
-DELAY_BEFORE_POST_EXPANSION_SEARCH = 1.5 # Seconds to wait after initial clicks finish
-SECOND_EXPANSION_CLICK_DELAY = 1.0 # Delay between first and second click on 'show more'
-POST_SECOND_EXPANSION_CLICK_DELAY = 1.5 # Delay after the *second* click on 'show more'
+# Timeouts (in seconds) this standalone script has always used; they take precedence over the profile's timing
+STANDALONE_TIMING = {
+    "page_load_timeout": 4,
+    "button_wait_timeout": 2,
+    "post_click_delay": 1.5,
+    "post_expansion_click_delay": 1.5,
+    "delay_before_post_expansion_search": 1.5,
+    "second_expansion_click_delay": 1.0,
+    "post_second_expansion_click_delay": 1.5,
+    "initial_settle_delay": 3.0,
+    "extraction_wait_timeout": 5,
+}
 
 # --- Selenium Options ---
 chrome_options = Options()
@@ -118,16 +124,20 @@ def click_button(driver, button_element, xpath_description, wait_timeout, post_c
 
 # --- Function to Scrape Targeted Sections ---
 
-def scrape_targeted_sections(url: str, target_selectors: list[str]):
+def scrape_targeted_sections(url: str, target_selectors: list[str] | None = None, profile: dict | None = None):
     """
     Loads a URL, clicks potential reveal buttons (including multi-step reveals like double-clicking 'show more'),
     and extracts HTML only from elements matching the provided CSS selectors.
+    Reveal buttons and selectors come from the site profile matching the URL's domain; STANDALONE_TIMING
+    overrides the profile's timings.
     Includes elapsed time logging.
 
     Args:
         url (str): The web address of the property listing.
-        target_selectors (list[str]): A list of CSS selectors identifying the
-                                      HTML sections/elements to extract.
+        target_selectors (list[str] | None): A list of CSS selectors identifying the
+                                             HTML sections/elements to extract. Defaults to
+                                             the site profile's selectors.
+        profile (dict | None): Site profile to use. Defaults to the profile matched by domain.
 
     Returns:
         dict: A dictionary containing:
@@ -137,31 +147,29 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
                                          for each selector.
               - 'error' (str): An error message if scraping failed, otherwise None.
     """
-    print(f"Processing URL: {url}")
+    profile = profile or get_profile(url)
+    if target_selectors is None:
+        target_selectors = profile["target_selectors"]
+    print(f"Processing URL: {url} (site profile: {profile['name']})")
     driver = None
     start_time = time.time() # Start timing for this specific URL
     # Initialize result with extracted_data as a dictionary
     result = {"url": url, "extracted_data": {selector: [] for selector in target_selectors}, "error": None}
 
-    # --- Define Button XPaths ---
-    initial_button_xpaths = [
-        "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'view number')]",
-        "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show phone')]",
-        "//a[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show phone')]",
-        "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show more')]", # Expansion button
-        "//a[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'read more')]",      # Expansion button
-        "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'lihat nombor')]",
-        "//span[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'view number')]",
-        "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'tunjuk nombor telefon')]"
-    ]
-    expansion_button_texts = ["show more", "read more"] # Keywords to identify expansion buttons for potential double click
-
-    post_expansion_contact_xpaths = [
-         "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show contact number')]",
-         "//a[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show contact number')]",
-         "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show contact')]",
-         "//a[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show contact')]",
-    ]
+    # --- Button XPaths and Timeouts (in seconds) from the Site Profile ---
+    reveal_actions = profile["reveal_actions"]
+    initial_button_xpaths = reveal_actions["initial_button_xpaths"]
+    expansion_button_texts = reveal_actions["expansion_button_texts"] # Keywords to identify expansion buttons for potential double click
+    post_expansion_contact_xpaths = reveal_actions["post_expansion_contact_xpaths"]
+
+    timing = {**profile["timing"], **STANDALONE_TIMING}
+    page_load_timeout = timing["page_load_timeout"]
+    button_wait_timeout = timing["button_wait_timeout"]
+    post_click_delay = timing["post_click_delay"]
+    post_expansion_click_delay = timing["post_expansion_click_delay"]
+    delay_before_post_expansion_search = timing["delay_before_post_expansion_search"]
+    second_expansion_click_delay = timing["second_expansion_click_delay"]
+    post_second_expansion_click_delay = timing["post_second_expansion_click_delay"]
 
     try:
         # --- Setup WebDriver ---
@@ -170,17 +178,17 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
         service = ChromeService(executable_path=CHROME_DRIVER_PATH)
         print(f"{format_elapsed_time(start_time)} Initializing WebDriver...")
         driver = webdriver.Chrome(service=service, options=chrome_options)
-        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        driver.set_page_load_timeout(page_load_timeout)
         print(f"{format_elapsed_time(start_time)} WebDriver initialized.")
 
         # --- Load Page ---
         print(f"{format_elapsed_time(start_time)} Loading page...")
         driver.get(url)
-        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+        WebDriverWait(driver, page_load_timeout).until(
             EC.presence_of_element_located((By.TAG_NAME, 'body')) # Wait for body tag
         )
         print(f"{format_elapsed_time(start_time)} Page loaded.")
-        initial_settle_delay = 3.0
+        initial_settle_delay = timing["initial_settle_delay"]
         print(f"{format_elapsed_time(start_time)} Allowing {initial_settle_delay}s for initial elements to settle...")
         time.sleep(initial_settle_delay)
         print(f"{format_elapsed_time(start_time)} Post-load delay finished.")
@@ -202,7 +210,7 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
                     specific_xpath = f"({xpath})[{i+1}]" # XPath indexes are 1-based
                     try:
                         # Pass the button element found initially for the is_displayed/is_enabled check
-                        clicked, btn_text = click_button(driver, button, specific_xpath, BUTTON_WAIT_TIMEOUT, POST_CLICK_DELAY, start_time, click_attempt_description="(Attempt 1) ")
+                        clicked, btn_text = click_button(driver, button, specific_xpath, button_wait_timeout, post_click_delay, start_time, click_attempt_description="(Attempt 1) ")
                         if clicked:
                             initial_click_attempts += 1
                             clicked_initial_button_texts.append(f"'{btn_text}...'")
@@ -224,8 +232,8 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
 
         # --- Attempt Second Click on Expansion Buttons if Necessary ---
         if expansion_buttons_clicked:
-            print(f"{format_elapsed_time(start_time)} Pausing {SECOND_EXPANSION_CLICK_DELAY}s before attempting second click on expansion buttons...")
-            time.sleep(SECOND_EXPANSION_CLICK_DELAY)
+            print(f"{format_elapsed_time(start_time)} Pausing {second_expansion_click_delay}s before attempting second click on expansion buttons...")
+            time.sleep(second_expansion_click_delay)
             print(f"{format_elapsed_time(start_time)} Attempting second click on {len(expansion_buttons_clicked)} expansion button(s)...")
             second_click_success_count = 0
             for specific_xpath in expansion_buttons_clicked:
@@ -233,7 +241,7 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
                     # Re-find the button element just before the second click attempt
                     button_element_for_second_click = driver.find_element(By.XPATH, specific_xpath)
                     # Use a potentially different post-click delay for the second click
-                    clicked, btn_text = click_button(driver, button_element_for_second_click, specific_xpath, BUTTON_WAIT_TIMEOUT, POST_SECOND_EXPANSION_CLICK_DELAY, start_time, click_attempt_description="(Attempt 2) ")
+                    clicked, btn_text = click_button(driver, button_element_for_second_click, specific_xpath, button_wait_timeout, post_second_expansion_click_delay, start_time, click_attempt_description="(Attempt 2) ")
                     if clicked:
                         second_click_success_count += 1
                         # Optionally update the clicked texts list or just log here
@@ -254,9 +262,10 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
 
 
         # --- Delay Before Searching for Post-Expansion Buttons ---
-        print(f"{format_elapsed_time(start_time)} Pausing {DELAY_BEFORE_POST_EXPANSION_SEARCH}s after initial/second clicks before searching for post-expansion buttons...")
-        time.sleep(DELAY_BEFORE_POST_EXPANSION_SEARCH)
-        print(f"{format_elapsed_time(start_time)} Pause finished. Proceeding with post-expansion search.")
+        if post_expansion_contact_xpaths and delay_before_post_expansion_search: # Nothing to search for on sites without contact buttons
+            print(f"{format_elapsed_time(start_time)} Pausing {delay_before_post_expansion_search}s after initial/second clicks before searching for post-expansion buttons...")
+            time.sleep(delay_before_post_expansion_search)
+            print(f"{format_elapsed_time(start_time)} Pause finished. Proceeding with post-expansion search.")
 
 
         # --- Click Post-Expansion Contact Buttons ---
@@ -273,7 +282,7 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
                 for i, button in enumerate(potential_buttons):
                     specific_xpath = f"({xpath})[{i+1}]"
                     try:
-                        clicked, btn_text = click_button(driver, button, specific_xpath, BUTTON_WAIT_TIMEOUT, POST_EXPANSION_CLICK_DELAY, start_time)
+                        clicked, btn_text = click_button(driver, button, specific_xpath, button_wait_timeout, post_expansion_click_delay, start_time)
                         if clicked:
                              post_expansion_clicks += 1
                              clicked_post_expansion_texts.append(f"'{btn_text}...'")
@@ -307,7 +316,7 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
             selector_start_time = time.time()
             try:
                 # Wait briefly for elements matching the selector to be present
-                WebDriverWait(driver, 5).until(
+                WebDriverWait(driver, timing["extraction_wait_timeout"]).until(
                     EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
                 )
                 elements = driver.find_elements(By.CSS_SELECTOR, selector) # Find again after wait
@@ -346,7 +355,7 @@ def scrape_targeted_sections(url: str, target_selectors: list[str]):
         print(f"{format_elapsed_time(start_time)} ERROR: {e}")
         result["error"] = str(e)
     except TimeoutException as e:
-        err_msg = f"Timeout occurred (Check PAGE_LOAD_TIMEOUT: {PAGE_LOAD_TIMEOUT}s or other waits). Details: {e}"
+        err_msg = f"Timeout occurred (Check page_load_timeout: {page_load_timeout}s or other waits). Details: {e}"
         print(f"{format_elapsed_time(start_time)} ERROR: {err_msg}")
         result["error"] = err_msg
     except Exception as e:
@@ -371,18 +380,10 @@ if __name__ == "__main__":
         # Add more URLs here if needed
     ]
 
-    # === List of CSS Selectors for Target Sections ===
-    target_css_selectors = [
-        "div.Wrapper-ucve63-0.eKOxHS", # Contact Owner block
-        "div.style__ParentWrapper-iwjn3z-0.QvHGM", # Listing Details block
-        "div.Wrapper-ucve63-0.fKaMDx" # Description block
-    ]
-
     # --- Process URLs ---
     script_start_time = time.time()
     all_results = []
     print("=== Starting Scraping Process ===")
-    print(f"Target CSS Selectors: {target_css_selectors}")
     for i, url in enumerate(urls_to_scrape):
         print(f"\n--- Processing URL {i+1}/{len(urls_to_scrape)} ---")
         if not url.startswith("http://") and not url.startswith("https://"):
@@ -390,7 +391,7 @@ if __name__ == "__main__":
             all_results.append({"url": url, "extracted_data": {}, "error": "Invalid URL format"})
             continue
 
-        scrape_result = scrape_targeted_sections(url, target_css_selectors)
+        scrape_result = scrape_targeted_sections(url) # Selectors come from the URL's site profile
         all_results.append(scrape_result)
         print("-" * 30)
 
@@ -408,7 +409,7 @@ if __name__ == "__main__":
         elif not result.get('extracted_data') or not any(result['extracted_data'].values()):
             print(f"  Status: Success (but no content extracted for the specified selectors)")
             print(f"  Extracted Content: [None]")
-            print(f"  -> Check if the CSS selectors in 'target_css_selectors' are still correct on the live page.")
+            print(f"  -> Check if the CSS selectors in site_profiles.json are still correct on the live page.")
             print(f"  -> Ensure the target sections actually exist on the page: {url}")
         else:
             print(f"  Status: Success")
@@ -417,7 +418,7 @@ if __name__ == "__main__":
             all_text_for_file = [] # List to hold text from all sections for saving
             try:
                 extracted_data = result['extracted_data']
-                for selector in target_css_selectors: # Iterate in the order selectors were provided
+                for selector in extracted_data: # Iterate in the order selectors were provided
                     html_parts = extracted_data.get(selector, []) # Get list of HTML for this selector
                     if html_parts:
                         # Join HTML parts found by *this* selector
@@ -0,0 +1,86 @@
+# selector_health.py
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+HEALTH_WINDOW_PAGES = 20            # Pages of history kept per (domain, selector)
+DEAD_SELECTOR_MIN_SAMPLES = 5       # Misses needed before a selector is treated as dead
+DEAD_SELECTOR_PROBE_EVERY = 10      # Still give a dead selector its full wait every N pages so it can recover
+DOMAIN_ALERT_HIT_RATE = 0.25        # Alert when a domain's overall hit rate drops below this
+DOMAIN_ALERT_MIN_PAGES = 5
+
+
+class SelectorRegistry:
+    """Tracks recent per-domain hit rates for extraction selectors so dead ones stop costing a full wait."""
+
+    def __init__(self, window=HEALTH_WINDOW_PAGES):
+        self._lock = threading.Lock()
+        self._window = window
+        self._history = defaultdict(lambda: deque(maxlen=self._window))
+        self._pages_seen = defaultdict(int)
+        self._page_hit_rates = defaultdict(lambda: deque(maxlen=self._window))
+        self._active_alerts = {}  # domain -> alert, removed again once the domain recovers
+
+    def record(self, domain, selector, hit):
+        with self._lock:
+            self._history[(domain, selector)].append(bool(hit))
+
+    def hit_rate(self, domain, selector):
+        with self._lock:
+            history = self._history.get((domain, selector))
+            if not history:
+                return None
+            return sum(history) / len(history)
+
+    def is_dead(self, domain, selector):
+        with self._lock:
+            history = self._history.get((domain, selector))
+            if not history or len(history) < DEAD_SELECTOR_MIN_SAMPLES:
+                return False
+            recent = list(history)[-DEAD_SELECTOR_MIN_SAMPLES:]
+            if any(recent):
+                return False
+            # Periodic probe so a selector that starts matching again is noticed.
+            return self._pages_seen[domain] % DEAD_SELECTOR_PROBE_EVERY != 0
+
+    def wait_timeout(self, domain, selector, default_timeout):
+        return 0 if self.is_dead(domain, selector) else default_timeout
+
+    def end_page(self, domain, selectors_hit, selectors_total):
+        """Records the page-level hit rate for a domain and raises an alert if it has collapsed."""
+        page_rate = selectors_hit / selectors_total if selectors_total else 0.0
+        with self._lock:
+            self._pages_seen[domain] += 1
+            rates = self._page_hit_rates[domain]
+            rates.append(page_rate)
+            if len(rates) < DOMAIN_ALERT_MIN_PAGES:
+                return
+            domain_rate = sum(rates) / len(rates)
+            if domain_rate < DOMAIN_ALERT_HIT_RATE and domain not in self._active_alerts:
+                message = (f"Selector hit rate for {domain} has collapsed to {domain_rate:.0%} over the last "
+                           f"{len(rates)} pages. The site layout has probably changed; update its selectors.")
+                self._active_alerts[domain] = {"domain": domain, "hit_rate": round(domain_rate, 3), "time": time.time(), "message": message}
+                logger.error(message)
+            elif domain_rate >= DOMAIN_ALERT_HIT_RATE and domain in self._active_alerts:
+                del self._active_alerts[domain]
+                logger.info("Selector hit rate for %s recovered to %.0f%%.", domain, domain_rate * 100)
+
+    def active_alerts(self):
+        """Alerts for domains whose hit rate is still collapsed."""
+        with self._lock:
+            return list(self._active_alerts.values())
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {"domain": domain, "selector": selector, "pages": len(history),
+                 "hit_rate": round(sum(history) / len(history), 3) if history else None}
+                for (domain, selector), history in self._history.items()
+            ]
+
+
+selector_registry = SelectorRegistry()
@@ -0,0 +1,79 @@
+# site_profiles.py
+import json
+import logging
+import os
+import threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+SITE_PROFILES_PATH = os.environ.get(
+    "LISTINGLENS_SITE_PROFILES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site_profiles.json')
+)
+GENERIC_PROFILE_NAME = 'generic'
+MERGED_SECTIONS = ('timing', 'reveal_actions', 'fallback_selectors', 'search')
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def _read_profile_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml  # Optional: only needed when profiles are kept in YAML
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _merge_with_generic(name, raw_profile, generic):
+    profile = dict(generic)
+    for key, value in raw_profile.items():
+        if key in MERGED_SECTIONS and isinstance(value, dict):
+            profile[key] = {**generic.get(key, {}), **value}
+        else:
+            profile[key] = value
+    profile['name'] = name
+    return profile
+
+
+def load_profiles(path=SITE_PROFILES_PATH):
+    """Loads the site-profile registry. Every profile inherits unspecified settings from the generic profile."""
+    raw_profiles = _read_profile_file(path)
+    if GENERIC_PROFILE_NAME not in raw_profiles:
+        raise ValueError(f"Site profile file {path} must define a '{GENERIC_PROFILE_NAME}' profile.")
+    generic = dict(raw_profiles[GENERIC_PROFILE_NAME], name=GENERIC_PROFILE_NAME)
+    profiles = {GENERIC_PROFILE_NAME: generic}
+    for name, raw_profile in raw_profiles.items():
+        if name != GENERIC_PROFILE_NAME:
+            profiles[name] = _merge_with_generic(name, raw_profile, generic)
+    logger.info("Loaded %s site profile(s) from %s.", len(profiles), path)
+    return profiles
+
+
+def get_profiles():
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = load_profiles()
+        return _profiles
+
+
+def normalize_domain(netloc):
+    domain = netloc.lower().split(':')[0]
+    for prefix in ('www.', 'm.'):
+        if domain.startswith(prefix):
+            domain = domain[len(prefix):]
+    return domain
+
+
+def get_profile(url):
+    """Returns the profile whose domain matches the URL's host (or a parent of it), else the generic profile."""
+    domain = normalize_domain(urlparse(url).netloc)
+    profiles = get_profiles()
+    for profile in profiles.values():
+        for profile_domain in profile.get('domains', []):
+            if domain == profile_domain or domain.endswith('.' + profile_domain):
+                return profile
+    return profiles[GENERIC_PROFILE_NAME]
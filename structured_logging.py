@@ -0,0 +1,128 @@
+# structured_logging.py
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+import uuid
+
+# --- Constants ---
+LOG_LEVEL = os.environ.get("LISTINGLENS_LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.environ.get("LISTINGLENS_LOG_FILE", "listinglens.log.jsonl")
+LOG_FILE_MAX_BYTES = 20 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_url_context = contextvars.ContextVar("listinglens_url_context", default=None)
+_listener = None
+
+
+@contextlib.contextmanager
+def url_context(url):
+    """Tags every record logged while processing `url` with a correlation ID and the seconds since it began.
+
+    The context follows the calling thread and any asyncio task it starts (e.g. CDP engine coroutines).
+    Re-entering it for the URL already being processed reuses the outer ID.
+    """
+    current = _url_context.get()
+    if current is not None and current[1] == url:
+        yield current[0]
+        return
+    correlation_id = uuid.uuid4().hex[:12]
+    token = _url_context.set((correlation_id, url, time.perf_counter()))
+    try:
+        yield correlation_id
+    finally:
+        _url_context.reset(token)
+
+
+def process_log_file(tag):
+    """Per-process JSON-lines path, so processes never rotate each other's file."""
+    stem, ext = os.path.splitext(LOG_FILE)
+    return f"{stem}.{tag}{ext}"
+
+
+class _ContextFilter(logging.Filter):
+    """Runs on the emitting thread, so the URL context is captured before the record crosses the queue."""
+
+    def filter(self, record):
+        context = _url_context.get()
+        if context is None:
+            record.correlation_id = record.url = record.elapsed = None
+        else:
+            record.correlation_id, record.url, started = context
+            record.elapsed = time.perf_counter() - started
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hands records over unformatted: %-style arguments are only merged on the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+class _ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        correlation_id = getattr(record, "correlation_id", None)
+        record.url_tag = f"[{correlation_id} +{record.elapsed:.2f}s] " if correlation_id else ""
+        return super().format(record)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "thread": record.threadName,
+            "correlation_id": getattr(record, "correlation_id", None),
+            "url": getattr(record, "url", None),
+            "elapsed": round(record.elapsed, 3) if getattr(record, "elapsed", None) is not None else None,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(console_format=CONSOLE_FORMAT, log_file=LOG_FILE, level=LOG_LEVEL, force=False):
+    """Routes the root logger through a queue to a console handler and a rotating JSON-lines file.
+
+    Workers only enqueue records; a QueueListener thread formats and writes them. Safe to call on
+    every Streamlit rerun: later calls are no-ops unless `force` is set.
+    """
+    global _listener
+    if _listener is not None:
+        if not force:
+            return
+        _listener.stop()
+    else:
+        atexit.register(lambda: _listener.stop())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(_ConsoleFormatter(console_format.replace('%(message)s', '%(url_tag)s%(message)s')))
+    handlers = [console_handler]
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8', delay=True
+        )
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
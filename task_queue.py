@@ -0,0 +1,216 @@
+# task_queue.py
+import concurrent.futures
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from listing_schema import ListingRecord
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_QUEUE_PATH = os.environ.get("LISTINGLENS_QUEUE_DB", "listinglens_queue.db")
+LEASE_SECONDS = 120             # Workers heartbeat well inside this; an expired lease means the worker died
+MAX_TASK_ATTEMPTS = 3           # Leases that expire this many times resolve to a failed record
+QUEUE_POLL_INTERVAL = 0.5
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    task TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    collected INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks (status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_results ON tasks (batch_id, status, collected);
+"""
+
+
+class SQLiteTaskQueue:
+    """Leased work queue in a single SQLite file, shareable between machines over a shared filesystem.
+
+    Tasks are claimed with a time-limited lease that the worker extends while it works; a task whose
+    lease expires (worker crashed, machine lost) is handed to the next worker that asks for work.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            # Rollback journal rather than WAL: WAL needs shared memory (the -shm file), which doesn't
+            # work across machines on a network filesystem.
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, batch_id, task, url):
+        cursor = self._connection().execute(
+            "INSERT INTO tasks (batch_id, task, url, created) VALUES (?, ?, ?, ?)",
+            (batch_id, task, url, time.time())
+        )
+        return cursor.lastrowid
+
+    def lease(self, worker_id, lease_seconds=LEASE_SECONDS):
+        """Claims the oldest available task. Returns (task_id, task, url) or None when the queue is empty."""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exhausted = conn.execute(
+                "SELECT id, url, attempts FROM tasks WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, MAX_TASK_ATTEMPTS)
+            ).fetchall()
+            for task_id, url, attempts in exhausted:
+                logger.error("Task %s (%s) lost its lease %s times; marking it failed.", task_id, url, attempts)
+                record = ListingRecord.failed(url, f"Worker lease expired {attempts} times; giving up.")
+                conn.execute(
+                    "UPDATE tasks SET status = 'done', result = ?, finished = ? WHERE id = ?",
+                    (record.to_json(), now, task_id)
+                )
+            row = conn.execute(
+                "SELECT id, task, url, status FROM tasks"
+                " WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)"
+                " ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            task_id, task, url, previous_status = row
+            if previous_status == 'leased':
+                logger.warning("Requeueing task %s (%s) after its lease expired.", task_id, url)
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now + lease_seconds, task_id)
+            )
+            conn.execute("COMMIT")
+            return task_id, task, url
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def heartbeat(self, task_id, worker_id, lease_seconds=LEASE_SECONDS):
+        """Extends a lease. Returns False if the task was reassigned or cancelled meanwhile."""
+        cursor = self._connection().execute(
+            "UPDATE tasks SET lease_expires = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            (time.time() + lease_seconds, task_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, record):
+        """Stores a task's result; the first completion wins if an expired lease was re-run elsewhere."""
+        self._connection().execute(
+            "UPDATE tasks SET status = 'done', result = ?, finished = ? WHERE id = ? AND status = 'leased'",
+            (record.to_json(), time.time(), task_id)
+        )
+
+    def collect(self, batch_id):
+        """Returns [(task_id, ListingRecord)] for results of `batch_id` not collected before."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, result FROM tasks WHERE batch_id = ? AND status = 'done' AND collected = 0",
+                (batch_id,)
+            ).fetchall()
+            conn.executemany("UPDATE tasks SET collected = 1 WHERE id = ?", [(task_id,) for task_id, _ in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(task_id, ListingRecord.from_json(result)) for task_id, result in rows]
+
+    def cancel_batch(self, batch_id):
+        cursor = self._connection().execute(
+            "UPDATE tasks SET status = 'cancelled' WHERE batch_id = ? AND status IN ('pending', 'leased')",
+            (batch_id,)
+        )
+        return cursor.rowcount
+
+    def purge_batch(self, batch_id):
+        self._connection().execute("DELETE FROM tasks WHERE batch_id = ?", (batch_id,))
+
+
+class QueueExecutor:
+    """Executor-compatible coordinator that hands tasks to `queue_worker.py` processes on any machine.
+
+    Only named tasks from queue_worker.TASKS can be submitted; results stream back through the queue
+    and resolve the returned Futures as they arrive.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self._queue = SQLiteTaskQueue(path)
+        self.batch_id = uuid.uuid4().hex
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._shutdown = threading.Event()
+        self._collector = threading.Thread(target=self._collect_results, name="queue-result-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            # Registered under the lock so the collector can't see the result before the Future exists.
+            task_id = self._queue.enqueue(self.batch_id, fn.__name__, args[0])
+            self._futures[task_id] = (future, args[0])
+        return future
+
+    def _collect_results(self):
+        while not self._shutdown.is_set():
+            try:
+                results = self._queue.collect(self.batch_id)
+            except sqlite3.Error as e:
+                logger.error("Could not read results from task queue %s: %s", self._queue.path, e)
+                results = []
+            for task_id, record in results:
+                with self._lock:
+                    future, url = self._futures.pop(task_id, (None, None))
+                if future is not None:
+                    future.set_result(record)
+            if not results:
+                self._shutdown.wait(QUEUE_POLL_INTERVAL)
+
+    def shutdown(self, wait=True):
+        if wait:
+            while True:
+                with self._lock:
+                    if not self._futures:
+                        break
+                time.sleep(QUEUE_POLL_INTERVAL)
+        self._shutdown.set()
+        self._collector.join()
+        if not wait:
+            self._queue.cancel_batch(self.batch_id)
+        with self._lock:
+            leftover, self._futures = self._futures, {}
+        for future, url in leftover.values():
+            if not future.done():
+                future.set_result(ListingRecord.failed(url, "Queue coordinator shut down."))
+        self._queue.purge_batch(self.batch_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown(wait=exc_type is None)
+        return False
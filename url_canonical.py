@@ -0,0 +1,102 @@
+# url_canonical.py
+import collections
+import dataclasses
+import functools
+import re
+import threading
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from site_profiles import get_profile, normalize_domain
+
+# --- Constants ---
+TRACKING_QUERY_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga', 'ref', 'source'}
+TRACKING_QUERY_PREFIXES = ('utm_',)
+DEDUP_COMPLETED_CACHE_SIZE = 1000  # Finished listings kept to answer late duplicates; older ones are scraped again
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(pattern):
+    return re.compile(pattern)
+
+
+def _keep_query_param(key, keep_params):
+    if keep_params is not None:
+        return key in keep_params
+    return key.lower() not in TRACKING_QUERY_PARAMS and not key.lower().startswith(TRACKING_QUERY_PREFIXES)
+
+
+def canonicalize_url(url):
+    """Normalizes a listing URL: https, bare host (no www./m.), no fragment, no trailing slash, sorted query.
+
+    Tracking parameters (utm_*, fbclid, ...) are dropped and every other parameter is kept, unless the
+    site profile opts in to an allowlist with `keep_query_params`.
+    """
+    parsed = urlparse(url.strip())
+    keep_params = get_profile(url).get("keep_query_params")
+    keep_params = None if keep_params is None else set(keep_params)
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True) if _keep_query_param(key, keep_params)
+    ))
+    path = re.sub(r"/{2,}", "/", parsed.path).rstrip('/') or '/'
+    return urlunparse(('https', normalize_domain(parsed.netloc), path, '', query, ''))
+
+
+def listing_key(url):
+    """Returns '<profile>:<listing id>' when the site profile can extract an ID, else the canonical URL."""
+    profile = get_profile(url)
+    pattern = profile.get("listing_id_pattern")
+    if pattern:
+        match = _compile(pattern).search(urlparse(url).path.rstrip('/') or '/')
+        if match:
+            return f"{profile['name']}:{match.group(1)}"
+    return canonicalize_url(url)
+
+
+class ListingDeduplicator:
+    """Collapses input URLs that point at the same listing so each listing is scraped once,
+    then fans the single result back out to every original input URL.
+
+    Only the most recent DEDUP_COMPLETED_CACHE_SIZE finished records are kept, so memory stays flat on
+    large batches; a duplicate arriving after its listing fell out of that window is admitted again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self._completed = collections.OrderedDict()
+        self._ready = []
+        self.duplicate_count = 0
+
+    def admit(self, url):
+        """Returns the listing key if `url` needs scraping, or None if it duplicates a known listing."""
+        key = listing_key(url)
+        with self._lock:
+            if key in self._aliases:
+                self._aliases[key].append(url)
+            elif key in self._completed:
+                self._completed.move_to_end(key)
+                self._ready.append(dataclasses.replace(self._completed[key], url=url))
+            else:
+                self._aliases[key] = [url]
+                return key
+            self.duplicate_count += 1
+            return None
+
+    def primary_url(self, key):
+        with self._lock:
+            return self._aliases[key][0]
+
+    def complete(self, key, record):
+        """Records the result for `key` and returns one record per original input URL."""
+        with self._lock:
+            urls = self._aliases.pop(key)
+            self._completed[key] = record
+            if len(self._completed) > DEDUP_COMPLETED_CACHE_SIZE:
+                self._completed.popitem(last=False)
+        return [record if url == record.url else dataclasses.replace(record, url=url) for url in urls]
+
+    def drain_ready(self):
+        """Returns records for duplicates that arrived after their listing had already finished."""
+        with self._lock:
+            ready, self._ready = self._ready, []
+        return ready
@@ -0,0 +1,124 @@
+# url_ingest.py
+import csv
+import io
+import logging
+import os
+from collections import Counter
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+SUPPORTED_UPLOAD_TYPES = ['csv', 'txt', 'xlsx']
+INVALID_SAMPLE_LIMIT = 20
+AUTO_COLUMN_HINTS = ('url', 'link', 'href', 'listing')
+
+
+class IngestReport:
+    """Aggregated validation results for a streamed URL source."""
+
+    def __init__(self):
+        self.valid_count = 0
+        self.invalid_count = 0
+        self.invalid_reasons = Counter()
+        self.invalid_samples = []
+
+    def add_invalid(self, value, reason):
+        self.invalid_count += 1
+        self.invalid_reasons[reason] += 1
+        if len(self.invalid_samples) < INVALID_SAMPLE_LIMIT:
+            self.invalid_samples.append(f"'{value[:120]}' ({reason})")
+
+    def summary(self):
+        reasons = ", ".join(f"{count} {reason}" for reason, count in self.invalid_reasons.most_common())
+        return f"{self.invalid_count} input(s) ignored: {reasons}."
+
+
+def _file_kind(filename):
+    return os.path.splitext(filename)[1].lower().lstrip('.')
+
+
+def _text_stream(file):
+    file.seek(0)
+    return io.TextIOWrapper(file, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def _iter_xlsx_rows(file):
+    import openpyxl  # Optional: only needed for Excel uploads
+    file.seek(0)
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ["" if cell is None else str(cell) for cell in row]
+    finally:
+        workbook.close()
+
+
+def _iter_rows(file, filename):
+    kind = _file_kind(filename)
+    if kind == 'xlsx':
+        yield from _iter_xlsx_rows(file)
+        return
+    text = _text_stream(file)
+    try:
+        if kind == 'csv':
+            yield from csv.reader(text)
+        else:
+            for line in text:
+                yield [line]
+    finally:
+        text.detach()
+
+
+def list_columns(file, filename):
+    """Returns the header row of a CSV/XLSX upload so the user can pick the URL column."""
+    if _file_kind(filename) not in ('csv', 'xlsx'):
+        return []
+    rows = _iter_rows(file, filename)
+    header = next(rows, [])
+    rows.close()
+    file.seek(0)
+    return [column.strip() for column in header]
+
+
+def guess_url_column(columns):
+    for index, column in enumerate(columns):
+        if any(hint in column.lower() for hint in AUTO_COLUMN_HINTS):
+            return index
+    return 0
+
+
+def iter_upload_values(file, filename, column=None):
+    """Streams raw cell values from an uploaded CSV/TXT/XLSX file.
+
+    For CSV/XLSX files `column` is the header name or index to read; the header row is skipped
+    when a column name is given. TXT files yield one value per line.
+    """
+    rows = _iter_rows(file, filename)
+    column_index = 0
+    if _file_kind(filename) in ('csv', 'xlsx') and column is not None:
+        if isinstance(column, int):
+            column_index = column
+        else:
+            header = [cell.strip() for cell in next(rows, [])]
+            column_index = header.index(column) if column in header else 0
+    for row in rows:
+        if column_index < len(row):
+            yield row[column_index]
+
+
+def validate_urls(values, report):
+    """Yields the valid http(s) URLs from `values`, recording everything else in `report`."""
+    for value in values:
+        url = value.strip()
+        if not url:
+            continue
+        try:
+            result = urlparse(url)
+            if all([result.scheme in ['http', 'https'], result.netloc]):
+                report.valid_count += 1
+                yield url
+            else:
+                report.add_invalid(url, "invalid format")
+        except ValueError:
+            report.add_invalid(url, "could not parse")
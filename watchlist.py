@@ -0,0 +1,285 @@
+# watchlist.py
+import argparse
+import concurrent.futures
+import csv
+import dataclasses
+import hashlib
+import html
+import json
+import logging
+import re
+import sqlite3
+import sys
+import time
+
+from credentials import load_api_key
+from failures import NO_CONTENT
+from listing_schema import ListingRecord
+from pipeline import COLUMN_ORDER, MAX_CONCURRENT_WORKERS, archive_sections, configure_gemini, driver_manager, extract_from_sections, scrape
+from structured_logging import configure_logging, process_log_file, url_context
+from url_canonical import listing_key
+from url_ingest import IngestReport, validate_urls
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+WATCHLIST_DB = "watchlist.db"
+WATCHLIST_QUEUE_FACTOR = 4
+FEED_COLUMNS = ['checked_at', 'url', 'change', 'field', 'old_value', 'new_value', 'delta']
+DELISTED_MARKERS = ("404", "not found", "no longer available", "has been removed", "listing has expired")
+TRACKED_FIELDS = ('price', 'phone_number')
+
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    listing_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    section_hashes TEXT,
+    record TEXT,
+    phone_numbers TEXT NOT NULL DEFAULT '[]',
+    first_seen REAL NOT NULL,
+    last_checked REAL NOT NULL,
+    last_changed REAL
+);
+"""
+
+
+# --- Helper Functions ---
+def section_text(html_list):
+    """Visible text of a section, so markup churn (class hashes, attribute order) doesn't count as a change."""
+    text = html.unescape(_TAG_PATTERN.sub(" ", "\n".join(html_list)))
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def section_hashes(extracted_data):
+    return {
+        selector: hashlib.sha256(section_text(html_list).encode('utf-8')).hexdigest()
+        for selector, html_list in extracted_data.items() if html_list
+    }
+
+
+def looks_delisted(extracted_data, page_title="", page_text=""):
+    """True when the page carries one of the DELISTED_MARKERS.
+
+    Sections only count when they are short (a removal notice, not a description that happens to say "not
+    found"). When no section matched, the scraper's page title and body sample are checked instead, since a
+    removed listing's error page usually matches none of the listing selectors; bare status codes only count
+    in the title there.
+    """
+    text = " ".join(section_text(html_list) for html_list in extracted_data.values()).lower()
+    if text:
+        return len(text) < 200 and any(marker in text for marker in DELISTED_MARKERS)
+    title, body = (page_title or "").lower(), (page_text or "").lower()
+    return any(marker in title or (not marker.isdigit() and marker in body) for marker in DELISTED_MARKERS)
+
+
+class WatchlistState:
+    """Last known section hashes and record per listing, keyed by url_canonical.listing_key."""
+
+    def __init__(self, path=WATCHLIST_DB):
+        # The harvester calls has() from its fetch thread; all writes stay on the caller's thread.
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key):
+        row = self._conn.execute(
+            "SELECT url, status, section_hashes, record, phone_numbers FROM listings WHERE listing_key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, hashes, record, phone_numbers = row
+        return {
+            "url": url,
+            "status": status,
+            "section_hashes": json.loads(hashes) if hashes else {},
+            "record": ListingRecord.from_json(record) if record else None,
+            "phone_numbers": json.loads(phone_numbers),
+        }
+
+    def has(self, key):
+        return self._conn.execute("SELECT 1 FROM listings WHERE listing_key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, url, status, hashes, record, phone_numbers, changed):
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO listings (listing_key, url, status, section_hashes, record, phone_numbers, first_seen, last_checked, last_changed)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(listing_key) DO UPDATE SET url = excluded.url, status = excluded.status,"
+            " section_hashes = excluded.section_hashes, record = excluded.record, phone_numbers = excluded.phone_numbers,"
+            " last_checked = excluded.last_checked, last_changed = COALESCE(?, listings.last_changed)",
+            (key, url, status, json.dumps(hashes), record.to_json() if record else None, json.dumps(sorted(phone_numbers)),
+             now, now, now if changed else None, now if changed else None)
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def check_listing(url, previous):
+    """Scrapes `url` and only calls the AI step when its section text differs from the previous run.
+
+    Returns (status, section_hashes, record, ai_called).
+    """
+    with url_context(url):
+        return _check_listing(url, previous)
+
+
+def _check_listing(url, previous):
+    check_start_time = time.perf_counter()
+    scrape_result = scrape(url)
+    if scrape_result.get("error"):
+        record = ListingRecord.failed(url, f"Scraping failed: {scrape_result['error']}", scrape_result.get("error_class"))
+        return "unreachable", None, record, False
+    extracted_data = scrape_result.get("extracted_data", {})
+    if looks_delisted(extracted_data, scrape_result.get("page_title"), scrape_result.get("page_text")):
+        return "delisted", {}, ListingRecord.failed(url, "Listing appears to be delisted."), False
+    if not any(extracted_data.values()):
+        # No removal notice either: a selector break or blank render, so a failed check rather than a delisting.
+        record = ListingRecord.failed(url, "No relevant HTML content found on page by selectors.", NO_CONTENT)
+        return "unreachable", None, record, False
+
+    hashes = section_hashes(extracted_data)
+    if previous and previous["record"] is not None and not previous["record"].error and previous["section_hashes"] == hashes:
+        record = dataclasses.replace(previous["record"], url=url)
+        ai_called = False
+    else:
+        archive_sections(url, extracted_data)
+        record = extract_from_sections(url, extracted_data)
+        ai_called = True
+    record.processing_time_seconds = round(time.perf_counter() - check_start_time, 2)
+    return "active", hashes, record, ai_called
+
+
+def diff_listing(url, previous, status, record, checked_at):
+    """Builds change-feed rows for one listing."""
+    rows = []
+
+    def row(change, field='', old_value='', new_value='', delta=''):
+        rows.append({'checked_at': checked_at, 'url': url, 'change': change, 'field': field,
+                     'old_value': old_value, 'new_value': new_value, 'delta': delta})
+
+    if status == "unreachable":
+        return rows
+    if previous is None:
+        row("new_listing" if status == "active" else "delisted")
+        return rows
+    if status == "delisted":
+        if previous["status"] != "delisted":
+            row("delisted")
+        return rows
+    if previous["status"] == "delisted":
+        row("relisted")
+    old_record = previous["record"]
+    if record.error or old_record is None or old_record.error:
+        return rows
+    if record.price != old_record.price:
+        delta = record.price - old_record.price if None not in (record.price, old_record.price) else ''
+        row("price_change", 'price', old_record.price, record.price, delta)
+    if record.phone_number and record.phone_number not in previous["phone_numbers"]:
+        row("new_phone_number", 'phone_number', old_record.phone_number, record.phone_number)
+    for field in COLUMN_ORDER:
+        if field in TRACKED_FIELDS or field in ('url', 'processing_time_seconds', 'duplicate_of', 'partial', 'profile_path', 'error', 'error_class'):
+            continue
+        old_value, new_value = getattr(old_record, field), getattr(record, field)
+        if old_value != new_value:
+            row("field_change", field, old_value, new_value)
+    return rows
+
+
+def run_watchlist(urls, state, feed_writer, results_writer, max_workers=MAX_CONCURRENT_WORKERS):
+    """Checks every watched listing, streaming change-feed rows and current records as results arrive."""
+    stats = {"checked": 0, "ai_calls": 0, "changes": 0, "unreachable": 0}
+    max_in_flight = max_workers * WATCHLIST_QUEUE_FACTOR
+
+    def handle(future, key, url):
+        previous = state.get(key)
+        try:
+            status, hashes, record, ai_called = future.result()
+        except Exception as e:
+            logger.error("Critical exception checking %s: %s", url, e, exc_info=True)
+            status, hashes, record, ai_called = "unreachable", None, ListingRecord.failed(url, f"Critical processing error: {e}"), False
+        checked_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        changes = diff_listing(url, previous, status, record, checked_at)
+        feed_writer.writerows(changes)
+        results_writer.writerow(record.to_dict())
+        stats["checked"] += 1
+        stats["ai_calls"] += ai_called
+        stats["changes"] += len(changes)
+        if status == "unreachable":
+            stats["unreachable"] += 1
+            if previous is not None:
+                return  # Keep the last good state; an outage is not a change
+            hashes = {}
+        phone_numbers = set(previous["phone_numbers"]) if previous else set()
+        if record.phone_number:
+            phone_numbers.add(record.phone_number)
+        stored_record = record if status == "active" else (previous["record"] if previous else None)
+        state.put(key, url, status, hashes or {}, stored_record, phone_numbers, changed=bool(changes))
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = {}
+            seen_keys = set()
+            for url in urls:
+                key = listing_key(url)
+                if key in seen_keys:
+                    continue
+                seen_keys.add(key)
+                in_flight[executor.submit(check_listing, url, state.get(key))] = (key, url)
+                if len(in_flight) >= max_in_flight:
+                    done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        handle(future, *in_flight.pop(future))
+            for future in concurrent.futures.as_completed(in_flight):
+                handle(future, *in_flight[future])
+    finally:
+        # The worker threads are gone; don't leave their reusable browsers running after the run.
+        driver_manager.close_all()
+    return stats
+
+
+def main(argv=None):
+    configure_logging(log_file=process_log_file("watchlist"))
+    parser = argparse.ArgumentParser(description="Re-check a watchlist of listings and write a change feed, calling the AI only for changed pages.")
+    parser.add_argument("urls", help="Text file with one listing URL per line.")
+    parser.add_argument("--db", default=WATCHLIST_DB, help="State database carried between runs.")
+    parser.add_argument("--feed", default="watchlist_changes.csv")
+    parser.add_argument("--out", default="watchlist_current.csv")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENT_WORKERS)
+    args = parser.parse_args(argv)
+
+    api_key = load_api_key()
+    if not api_key:
+        logger.error("GOOGLE_API_KEY not set in the environment or Streamlit secrets.")
+        return 1
+    configure_gemini(api_key)
+
+    run_start_time = time.perf_counter()
+    state = WatchlistState(args.db)
+    ingest_report = IngestReport()
+    try:
+        with open(args.urls, 'r', encoding='utf-8') as urls_file, \
+                open(args.feed, 'a', newline='', encoding='utf-8') as feed_file, \
+                open(args.out, 'w', newline='', encoding='utf-8') as out_file:
+            feed_writer = csv.DictWriter(feed_file, fieldnames=FEED_COLUMNS)
+            if feed_file.tell() == 0:
+                feed_writer.writeheader()
+            results_writer = csv.DictWriter(out_file, fieldnames=COLUMN_ORDER, extrasaction='ignore')
+            results_writer.writeheader()
+            stats = run_watchlist(validate_urls(urls_file, ingest_report), state, feed_writer, results_writer, args.workers)
+    finally:
+        state.close()
+    if ingest_report.invalid_count:
+        logger.warning(ingest_report.summary())
+    logger.info(
+        "Checked %s listings in %.2f seconds: %s AI call(s), %s change(s), %s unreachable -> %s",
+        stats['checked'], time.perf_counter() - run_start_time, stats['ai_calls'], stats['changes'], stats['unreachable'], args.feed
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
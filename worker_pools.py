@@ -0,0 +1,31 @@
+# worker_pools.py
+import concurrent.futures
+import os
+
+# --- Constants ---
+WORKER_MODE = os.environ.get("LISTINGLENS_WORKER_MODE", "thread")  # "thread", "process" or "queue"
+SUBMISSION_WINDOW_FACTOR = 4  # URLs queued ahead of the executor, per worker
+QUEUE_MAX_IN_FLIGHT = 2000  # Queue mode: enough enqueued work to keep every worker node busy
+
+
+def max_in_flight(max_workers, mode=WORKER_MODE):
+    """How many URLs a front end keeps submitted to the pool at once."""
+    return QUEUE_MAX_IN_FLIGHT if mode == "queue" else max_workers * SUBMISSION_WINDOW_FACTOR
+
+
+def make_worker_pool(max_workers, api_key, mode=WORKER_MODE):
+    """The executor every front end (Streamlit page, batch API) runs process_url on."""
+    if mode == "process":
+        from process_workers import ProcessWorkerPool
+        return ProcessWorkerPool(max_workers, api_key)
+    if mode == "queue":
+        # Scraping happens in `queue_worker.py` processes on any number of machines sharing the queue file.
+        from task_queue import QueueExecutor
+        return QueueExecutor()
+    return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+
+def close_thread_drivers(pipeline, mode=WORKER_MODE):
+    if mode not in ("process", "queue"):
+        # Worker threads are gone now; don't leave their reusable browsers running until the watchdog notices.
+        pipeline.driver_manager.close_all()